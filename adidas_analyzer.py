@@ -1,6 +1,14 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+
+import analytics
+import data_store
+import result_cache
+import schema
+import startup
+import thumbnails
+
+# Plotly is imported when the first chart is built, after the title is drawn
+px = startup.LazyModule('plotly.express')
 
 # Set page configuration
 st.set_page_config(
@@ -13,16 +21,52 @@ st.set_page_config(
 st.title("👟 Adidas Shoe Data Analyzer")
 st.markdown("Analyze and explore Adidas shoe data interactively!")
 
-# Load the data
-@st.cache_data
-def load_data():
-    shoes_dim = pd.read_csv('shoes_dim.csv')
-    shoes_fact = pd.read_csv('shoes_fact.csv')
-    country_dim = pd.read_csv('country_dim.csv')
-    return shoes_dim, shoes_fact, country_dim
+# Columns the catalog views read from each table
+SHOE_COLUMNS = ['id', 'name', 'gender', 'best_for_wear', 'image_url', 'dominant_color', 'sub_color1', 'sub_color2']
+# The fact and country tables are only checked for presence here
+PRESENCE_COLUMNS = ['country_code']
+PAGE_SIZES = [12, 24, 48]
+
+# Load the data; ``version`` keys the cache to the files on disk
+@st.cache_resource(max_entries=2)
+def load_data(version):
+    """Tables plus their filter engine and search index, shared by all sessions"""
+    dataset = analytics.Dataset.load({
+        'shoes_dim': SHOE_COLUMNS,
+        'shoes_fact': PRESENCE_COLUMNS,
+        'country_dim': PRESENCE_COLUMNS,
+    }, version=version)
+    missing = dataset.missing_tables()
+    if missing:
+        raise FileNotFoundError(f"{', '.join(missing)} is missing or empty")
+    return dataset
+
+@st.cache_resource
+def get_result_cache():
+    """Bounded cache of computed views, shared by all sessions"""
+    return result_cache.ResultCache(disk_dir=result_cache.DISK_DIR)
+
+@st.cache_resource
+def get_thumbnail_cache():
+    """Thumbnail cache and fetch pool shared by all sessions"""
+    return thumbnails.ThumbnailCache()
+
+def shoe_captions(shoes):
+    """Caption text for each shoe, built column-wise rather than per row"""
+    return (
+        shoes['name'].astype(str)
+        + '\nGender: ' + shoes['gender'].astype(str)
+        + ' · Best for: ' + shoes['best_for_wear'].astype(str)
+        + '\nColors: ' + shoes['dominant_color'].astype(str)
+        + ' / ' + shoes['sub_color1'].astype(str)
+        + ' / ' + shoes['sub_color2'].astype(str)
+    )
 
 try:
-    shoes_dim, shoes_fact, country_dim = load_data()
+    data_version = data_store.dataset_version()
+    dataset = load_data(data_version)
+    shoes_dim = dataset.shoes_dim
+    results = get_result_cache()
     
     # Sidebar filters
     st.sidebar.header("Filters")
@@ -35,12 +79,22 @@ try:
     wear_options = ['All'] + sorted(shoes_dim['best_for_wear'].unique().tolist())
     selected_wear = st.sidebar.selectbox('Best For', wear_options)
     
-    # Apply filters
-    filtered_shoes = shoes_dim.copy()
+    # Color filter over all three color slots, answered by the color index
+    selected_colors = st.sidebar.multiselect(
+        'Contains Color',
+        dataset.column_values(analytics.COLOR_FILTER),
+        help="Shoes with any of these colors as dominant or sub color"
+    )
+    
+    # Apply filters through cached row selections instead of copies
+    shoe_filters = {}
     if selected_gender != 'All':
-        filtered_shoes = filtered_shoes[filtered_shoes['gender'] == selected_gender]
+        shoe_filters['gender'] = [selected_gender]
     if selected_wear != 'All':
-        filtered_shoes = filtered_shoes[filtered_shoes['best_for_wear'] == selected_wear]
+        shoe_filters['best_for_wear'] = [selected_wear]
+    if selected_colors:
+        shoe_filters[analytics.COLOR_FILTER] = selected_colors
+    filtered_shoes = analytics.filter_shoes(dataset, shoe_filters)
     
     # Main content area
     col1, col2 = st.columns(2)
@@ -50,7 +104,10 @@ try:
         st.write(f"Total Shoes: {len(filtered_shoes)}")
         
         # Gender distribution
-        gender_dist = filtered_shoes['gender'].value_counts()
+        gender_dist = results.get_or_compute(
+            data_version, 'gender_distribution', shoe_filters,
+            lambda: analytics.distribution(dataset, 'gender', shoe_filters)
+        )
         fig_gender = px.pie(
             values=gender_dist.values,
             names=gender_dist.index,
@@ -60,7 +117,10 @@ try:
     
     with col2:
         st.subheader("🎯 Usage Categories")
-        wear_dist = filtered_shoes['best_for_wear'].value_counts()
+        wear_dist = results.get_or_compute(
+            data_version, 'wear_distribution', shoe_filters,
+            lambda: analytics.distribution(dataset, 'best_for_wear', shoe_filters)
+        )
         fig_wear = px.bar(
             x=wear_dist.index,
             y=wear_dist.values,
@@ -74,26 +134,67 @@ try:
     # Search functionality
     search_term = st.text_input("Search shoes by name:")
     if search_term:
-        filtered_shoes = filtered_shoes[filtered_shoes['name'].str.contains(search_term, case=False, na=False)]
+        # Ranked index lookup, restricted to the sidebar filters
+        filtered_shoes = results.get_or_compute(
+            data_version, 'search', dict(shoe_filters, query=search_term),
+            lambda: analytics.search_shoes(dataset, search_term, shoe_filters)
+        )
+    
+    # One row per model, listed under several ids, names or colorways
+    if len(filtered_shoes) > 0 and st.checkbox("Collapse variants"):
+        filtered_shoes = analytics.collapse_variants(dataset, filtered_shoes)
+        st.caption(f"{len(filtered_shoes)} models")
     
     # Display the data
     st.dataframe(
-        filtered_shoes[['name', 'gender', 'best_for_wear', 'dominant_color', 'sub_color1', 'sub_color2']],
+        filtered_shoes[[column for column in ['name', 'gender', 'best_for_wear', 'dominant_color', 'sub_color1',
+                                              'sub_color2', 'variants'] if column in filtered_shoes.columns]],
         use_container_width=True
     )
     
+    # Shoes with a matching palette, ranked by shared colors
+    if len(filtered_shoes) > 0 and st.checkbox("Find shoes with a similar palette"):
+        reference = st.selectbox(
+            "Reference shoe",
+            filtered_shoes.index,
+            format_func=lambda row: f"{shoes_dim.at[row, 'name']} ({shoes_dim.at[row, 'id']})"
+        )
+        position = shoes_dim.index.get_loc(reference)
+        similar = results.get_or_compute(
+            data_version, 'similar_palettes', dict(shoe_filters, shoe=int(position)),
+            lambda: analytics.similar_palettes(dataset, position, shoe_filters)
+        )
+        st.dataframe(
+            similar[['name', 'gender', 'dominant_color', 'sub_color1', 'sub_color2', 'similarity']],
+            use_container_width=True
+        )
+    
     # Show selected shoe details
     if st.checkbox("Show detailed view of shoes"):
-        for _, shoe in filtered_shoes.iterrows():
-            col1, col2 = st.columns([1, 2])
-            with col1:
-                st.image(shoe['image_url'], width=200)
-            with col2:
-                st.write(f"**{shoe['name']}**")
-                st.write(f"Gender: {shoe['gender']}")
-                st.write(f"Best for: {shoe['best_for_wear']}")
-                st.write(f"Colors: {shoe['dominant_color']} / {shoe['sub_color1']} / {shoe['sub_color2']}")
-            st.divider()
+        # Render one page at a time; only its images are fetched
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox("Shoes per page", PAGE_SIZES)
+        page_count = max(1, -(-len(filtered_shoes) // page_size))
+        with col2:
+            page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+        st.caption(f"Page {page} of {page_count} · {len(filtered_shoes)} shoes")
+        
+        start = (page - 1) * page_size
+        page_shoes = filtered_shoes.iloc[start:start + page_size]
+        if len(page_shoes) > 0:
+            thumbnail_cache = get_thumbnail_cache()
+            image_urls = schema.image_urls(page_shoes).tolist()
+            # Fall back to the remote image when a thumbnail could not be built
+            images = [
+                path or url
+                for path, url in zip(thumbnail_cache.get_many(image_urls), image_urls)
+            ]
+            st.image(images, caption=shoe_captions(page_shoes).tolist(), width=200)
+            
+            # Warm the cache for the next page while this one is being viewed
+            next_shoes = filtered_shoes.iloc[start + page_size:start + 2 * page_size]
+            thumbnail_cache.prefetch(schema.image_urls(next_shoes).tolist())
 
 except Exception as e:
     st.error(f"Error loading data: {str(e)}")
@@ -0,0 +1,170 @@
+"""Run the dashboard reports from the command line, without Streamlit.
+
+Reports come from analytics.py and read the columnar store directly, so
+they can be timed, scheduled or diffed between versions.
+
+Usage:
+    python adidas_cli.py summary prices --gender M W --price-min 50
+    python adidas_cli.py geography --wear Running --currency euro
+    python adidas_cli.py prices --reporting-currency usd --price-min 100
+    python adidas_cli.py all --format json --timings
+    python adidas_cli.py quality --repeat 5 --timings
+    python adidas_cli.py variants --wear Running
+    python adidas_cli.py all --trace traces.jsonl --profile
+    python adidas_cli.py all --backend arrow --data-dir bench_data
+"""
+import argparse
+import json
+import sys
+import time
+
+import pandas as pd
+
+import analytics
+import backends
+import instrumentation
+
+
+def filter_state(args, dataset):
+    """Filter state in filters.py format from the parsed arguments"""
+    state = {}
+    if args.gender:
+        state['gender'] = args.gender
+    if args.wear:
+        state['best_for_wear'] = args.wear
+    if args.color:
+        state[analytics.COLOR_FILTER] = args.color
+    if args.category:
+        state['category'] = args.category
+    if args.country:
+        state['country_code'] = args.country
+    if args.currency:
+        state['currency'] = args.currency
+    if args.reporting_currency:
+        state[analytics.REPORTING_CURRENCY] = args.reporting_currency
+    if args.price_min is not None or args.price_max is not None:
+        # An open end of the range is closed at the data's own extreme
+        low, high = dataset.value_range('price', args.reporting_currency)
+        state['price'] = (
+            low if args.price_min is None else args.price_min,
+            high if args.price_max is None else args.price_max,
+        )
+    return analytics.canonical_state(dataset, state)
+
+
+def add_filter_arguments(parser):
+    """Add the filter options read by ``filter_state``; returns their destinations"""
+    actions = [
+        parser.add_argument('--gender', nargs='+', help="Keep these genders"),
+        parser.add_argument('--wear', nargs='+', help="Keep these best-for-wear categories"),
+        parser.add_argument('--color', nargs='+', help="Keep shoes with any of these colors in any color slot"),
+        parser.add_argument('--category', nargs='+', help="Keep these fact categories"),
+        parser.add_argument('--country', nargs='+', help="Keep these country codes"),
+        parser.add_argument('--currency', nargs='+', help="Keep countries with these currencies"),
+        parser.add_argument('--price-min', type=float, help="Lowest price to keep"),
+        parser.add_argument('--price-max', type=float, help="Highest price to keep"),
+        parser.add_argument('--reporting-currency',
+                            help="Convert prices (and the price range) to this currency, e.g. usd"),
+    ]
+    return [action.dest for action in actions]
+
+
+def print_report(name, result):
+    print(f"== {name} ==")
+    for key, value in result.items():
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            print(f"{key}:")
+            print(value.to_string())
+        elif isinstance(value, dict):
+            print(f"{key}:")
+            for sub_key, sub_value in value.items():
+                if isinstance(sub_value, (pd.DataFrame, pd.Series)):
+                    sub_value = '\n' + sub_value.to_string()
+                print(f"  {sub_key}: {sub_value}")
+        else:
+            print(f"{key}: {value}")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Adidas data reports headlessly")
+    parser.add_argument('reports', nargs='*', default=['summary'],
+                        help=f"Reports to run: {', '.join(analytics.REPORTS)} or all")
+    parser.add_argument('--data-dir', default='.', help="Directory holding the dataset CSVs")
+    add_filter_arguments(parser)
+    parser.add_argument('--backend', choices=list(backends.BACKENDS),
+                        help=f"Fact table execution backend (default: ${backends.BACKEND_ENV}, "
+                             "else arrow when the fact table exceeds half the RAM)")
+    parser.add_argument('--format', choices=['text', 'json'], default='text', help="Output format")
+    parser.add_argument('--repeat', type=int, default=1, help="Run each report this many times")
+    parser.add_argument('--timings', action='store_true', help="Report load and per-report times")
+    parser.add_argument('--trace', help="Append the run's spans to this JSON-lines file")
+    parser.add_argument('--profile', action='store_true', help="Print cProfile statistics to stderr")
+    args = parser.parse_args(argv)
+
+    names = list(analytics.REPORTS) if 'all' in args.reports else args.reports
+    unknown = [name for name in names if name not in analytics.REPORTS]
+    if unknown:
+        parser.error(f"unknown report(s): {', '.join(unknown)}")
+
+    tracer = instrumentation.Tracer().activate()
+    profiler = instrumentation.Profiler(cpu=args.profile).start()
+    started = time.perf_counter()
+    try:
+        with tracer.span('load'):
+            backend = args.backend or backends.default_backend(args.data_dir)
+            dataset = analytics.Dataset.load(data_dir=args.data_dir, backend=backend)
+    except (OSError, ValueError) as e:
+        print(f"Failed to load data: {e}", file=sys.stderr)
+        return 1
+    missing = dataset.missing_tables()
+    if missing:
+        print(f"Missing or empty data files: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    timings = {'load': time.perf_counter() - started}
+
+    if args.reporting_currency:
+        known = dataset.fx.currencies if dataset.fx is not None else []
+        if args.reporting_currency not in known:
+            print(f"No exchange rate for {args.reporting_currency!r}; known: {', '.join(known) or 'none'}",
+                  file=sys.stderr)
+            return 1
+    state = filter_state(args, dataset)
+    results = {}
+    for name in names:
+        # The first run includes building cubes and indexes; later runs hit their caches
+        runs = []
+        for _ in range(max(1, args.repeat)):
+            started = time.perf_counter()
+            with tracer.span(name):
+                results[name] = analytics.run_report(dataset, name, state)
+            runs.append(time.perf_counter() - started)
+        timings[name] = {'first': runs[0], 'best': min(runs)} if len(runs) > 1 else runs[0]
+
+    profiler.stop()
+    if profiler.stats_text:
+        print(profiler.stats_text, file=sys.stderr)
+    if args.trace:
+        tracer.export_jsonl(args.trace)
+
+    if args.format == 'json':
+        output = {'version': dataset.version, 'filters': state, 'reports': results}
+        if args.timings:
+            output['timings'] = timings
+        json.dump(analytics.to_jsonable(output), sys.stdout, indent=2)
+        print()
+    else:
+        for name, result in results.items():
+            print_report(name, result)
+        if args.timings:
+            print("== timings (seconds) ==")
+            for name, elapsed in timings.items():
+                if isinstance(elapsed, dict):
+                    print(f"{name}: first {elapsed['first']:.4f}, best {elapsed['best']:.4f}")
+                else:
+                    print(f"{name}: {elapsed:.4f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
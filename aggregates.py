@@ -0,0 +1,345 @@
+"""Precomputed aggregate cubes for the dashboard tabs.
+
+A cube groups a table once by a fixed set of dimensions and keeps a row
+count plus sum/min/max/count for each measure. Filtered views are answered
+by rolling up the matching cells, so their cost depends on the number of
+cells and not on the number of raw rows.
+
+Two cubes are built: a product cube over the shoe attributes (one row per
+shoe in ``shoes_dim``) and a fact cube over the fact dimensions. The fact
+cube also carries ``gender`` through the shoe ``id``; the wear and color
+attributes stay in the product cube because adding them to the fact cube
+would multiply its cells back towards the fact table's size.
+
+For the same reason the fact cube is a ``CubeSet``: one cube per group of
+dimensions in ``FACT_CUBE_GROUPS`` rather than one over all of them, whose
+cells would grow with every date and price. A view is answered by the
+smallest group covering its filters and grouping columns, and a group whose
+cells would not stay well below the fact rows is left out, so its views
+scan the facts instead.
+
+Cubes are persisted next to the columnar tables, tagged with the dataset
+version they were built from, and can be merged: ingesting a new fact
+snapshot only builds a cube over the new rows and folds it in.
+"""
+import contextlib
+import json
+import os
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import data_store
+
+CUBE_DIR = 'aggregates'
+# Bump when the cell layout or dimension dtypes change, to discard saved cubes
+CUBE_FORMAT = 3
+
+PRODUCT_DIMENSIONS = ['gender', 'best_for_wear', 'dominant_color']
+FACT_DIMENSIONS = ['gender', 'category', 'country_code', 'price_bucket', 'date']
+FACT_MEASURES = ['price', 'availability']
+
+# Dimension groups of the fact cube set; every group holds the shoe keys
+FACT_CUBE_GROUPS = [
+    ['gender', 'category', 'country_code'],
+    ['gender', 'category', 'country_code', 'date'],
+    ['gender', 'category', 'country_code', 'price_bucket'],
+]
+# Cells the fact cube set may hold, as a share of the fact rows
+MAX_CELL_SHARE = 0.1
+
+# One bucket per cent, so price-range filters on the cube stay exact
+PRICE_BUCKET_SCALE = 100
+
+# Range filters on a measure that the cube answers through a bucket dimension
+RANGE_DIMENSIONS = {'price': 'price_bucket'}
+
+
+def price_buckets(prices):
+    """Map prices to integer cent buckets (nullable for missing prices)"""
+    return (prices.astype('float64') * PRICE_BUCKET_SCALE).round().astype('Int64')
+
+
+def _is_filter(allowed):
+    """Whether a filter value restricts anything (None and empty collections do not)"""
+    return allowed is not None and not (isinstance(allowed, (list, set, frozenset)) and not allowed)
+
+
+def filtered_columns(filters):
+    """Columns of ``filters`` that restrict anything"""
+    return [column for column, allowed in filters.items() if _is_filter(allowed)]
+
+
+class AggregateCube:
+    """Row counts and measure statistics grouped by a set of dimensions"""
+
+    def __init__(self, cells, dimensions, measures):
+        self.cells = cells
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+
+    @classmethod
+    def build(cls, df, dimensions, measures=()):
+        dimensions = [d for d in dimensions if d in df.columns]
+        measures = [m for m in measures if m in df.columns]
+        grouped = df.groupby(dimensions, observed=True, dropna=False, sort=False)
+        cells = grouped.size().rename('count').to_frame()
+        for measure in measures:
+            stats = grouped[measure].agg(['sum', 'min', 'max', 'count'])
+            stats.columns = [f"{measure}_{stat}" for stat in stats.columns]
+            cells = cells.join(stats)
+        return cls(cells.reset_index(), dimensions, measures)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def merge(self, other):
+        """Combine two cubes over the same dimensions into a new cube"""
+        cells = [self.cells, other.cells]
+        for dimension in self.dimensions:
+            values = [c[dimension] for c in cells]
+            if any(isinstance(v.dtype, pd.CategoricalDtype) for v in values):
+                # Categoricals with different vocabularies would concat to object
+                union = union_categoricals([v.astype('category') for v in values])
+                dtype = pd.CategoricalDtype(union.categories)
+                cells = [c.assign(**{dimension: c[dimension].astype(dtype)}) for c in cells]
+        combined = pd.concat(cells, ignore_index=True)
+
+        agg = {'count': 'sum'}
+        for measure in self.measures:
+            agg.update({
+                f"{measure}_sum": 'sum',
+                f"{measure}_min": 'min',
+                f"{measure}_max": 'max',
+                f"{measure}_count": 'sum',
+            })
+        merged = combined.groupby(self.dimensions, observed=True, dropna=False, sort=False).agg(agg)
+        return AggregateCube(merged.reset_index(), self.dimensions, self.measures)
+
+    def mask(self, **filters):
+        """Boolean mask over the cells.
+
+        Filters use the same state as ``filters.FilterEngine``: a collection
+        of allowed values or a single value per dimension, or a ``(low, high)``
+        range for ``price`` which is answered through the price buckets. None
+        or an empty collection means no filter.
+        """
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dimension, allowed in filters.items():
+            if not _is_filter(allowed):
+                continue
+            if not isinstance(allowed, (list, set, frozenset, tuple)):
+                allowed = [allowed]
+            dimension = RANGE_DIMENSIONS.get(dimension, dimension)
+            if dimension not in self.dimensions:
+                raise KeyError(f"{dimension!r} is not a dimension of this cube")
+            values = self.cells[dimension]
+            if dimension == 'price_bucket':
+                low, high = allowed
+                bounds = price_buckets(pd.Series([low, high]))
+                mask &= (values >= bounds[0]).fillna(False).to_numpy(bool)
+                mask &= (values <= bounds[1]).fillna(False).to_numpy(bool)
+            else:
+                mask &= values.isin(allowed).to_numpy()
+        return mask
+
+    def rollup(self, by=(), **filters):
+        """Aggregate the matching cells by the given dimensions.
+
+        Returns a frame with ``count`` and, per measure, ``<m>_sum``,
+        ``<m>_min``, ``<m>_max`` and ``<m>_count`` (non-null rows), plus
+        ``<m>_mean``. With no ``by`` a single-row frame is returned.
+        """
+        cells = self.cells[self.mask(**filters)]
+        agg = {'count': 'sum'}
+        for measure in self.measures:
+            agg.update({
+                f"{measure}_sum": 'sum',
+                f"{measure}_min": 'min',
+                f"{measure}_max": 'max',
+                f"{measure}_count": 'sum',
+            })
+        if by:
+            result = cells.groupby(list(by), observed=True, sort=True)[list(agg)].agg(agg)
+        else:
+            result = pd.DataFrame({column: [cells[column].agg(how)] for column, how in agg.items()})
+        for measure in self.measures:
+            result[f"{measure}_mean"] = result[f"{measure}_sum"] / result[f"{measure}_count"]
+        return result
+
+    def totals(self, **filters):
+        """Grand totals of the matching cells as a dict, keeping each dtype"""
+        result = self.rollup(**filters)
+        return {column: result[column].iloc[0] for column in result.columns}
+
+    def counts(self, by, **filters):
+        """Row counts per value of one dimension, largest first"""
+        counts = self.rollup([by], **filters)['count']
+        return counts[counts > 0].sort_values(ascending=False)
+
+    def crosstab(self, index, columns, **filters):
+        """Equivalent of pd.crosstab over the raw rows"""
+        counts = self.rollup([index, columns], **filters)['count']
+        return counts.unstack(fill_value=0)
+
+
+class CubeSet:
+    """Cubes over several dimension groups of one table, smallest first"""
+
+    def __init__(self, cubes):
+        self.cubes = sorted(cubes, key=len)
+
+    @property
+    def dimensions(self):
+        return [d for d in FACT_DIMENSIONS if any(d in cube.dimensions for cube in self.cubes)]
+
+    def __len__(self):
+        return sum(len(cube) for cube in self.cubes)
+
+    def cube_for(self, columns):
+        """The smallest cube holding every one of ``columns``, None if no cube does"""
+        needed = {RANGE_DIMENSIONS.get(column, column) for column in columns}
+        for cube in self.cubes:
+            if needed <= set(cube.dimensions):
+                return cube
+        return None
+
+    def within(self, max_cells):
+        """The cube set without the largest groups that would take it over ``max_cells``"""
+        kept, cells = [], 0
+        for cube in self.cubes:
+            if cells + len(cube) > max_cells:
+                break
+            kept.append(cube)
+            cells += len(cube)
+        return CubeSet(kept)
+
+    def merge(self, other):
+        """Merge the groups both sets hold; other groups are dropped"""
+        others = {tuple(cube.dimensions): cube for cube in other.cubes}
+        return CubeSet([cube.merge(others[tuple(cube.dimensions)])
+                        for cube in self.cubes if tuple(cube.dimensions) in others])
+
+    def rollup(self, by=(), **filters):
+        """``AggregateCube.rollup`` on the smallest cube that can answer it"""
+        columns = list(by) + filtered_columns(filters)
+        cube = self.cube_for(columns)
+        if cube is None:
+            raise KeyError(f"No cube holds all of {columns}")
+        return cube.rollup(by, **filters)
+
+
+def build_product_cube(shoes_dim):
+    """Cube over the shoe attributes, one count per shoe row"""
+    return AggregateCube.build(shoes_dim, PRODUCT_DIMENSIONS)
+
+
+def build_fact_cube(shoes_fact, shoes_dim=None, max_share=MAX_CELL_SHARE):
+    """Cube set over the fact table, with gender attached through the shoe id.
+
+    Groups are kept smallest first while all cells stay within ``max_share``
+    of the fact rows; None keeps every group (e.g. for a delta to merge).
+    """
+    columns = [c for c in FACT_DIMENSIONS + FACT_MEASURES if c in shoes_fact.columns]
+    facts = shoes_fact[columns].copy(deep=False)
+    if 'price' in shoes_fact.columns:
+        # Sum in float64; the float32 storage dtype would lose cents over many rows
+        facts['price'] = shoes_fact['price'].astype('float64')
+        facts['price_bucket'] = price_buckets(shoes_fact['price'])
+    if shoes_dim is not None and 'id' in shoes_fact.columns and 'gender' in shoes_dim.columns:
+        # A shoe id can repeat in shoes_dim (one row per colorway); its first gender wins
+        genders = shoes_dim.drop_duplicates('id').set_index('id')['gender']
+        facts['gender'] = shoes_fact['id'].map(genders)
+    cubes, seen = [], set()
+    for group in FACT_CUBE_GROUPS:
+        dimensions = tuple(d for d in group if d in facts.columns)
+        if dimensions and dimensions not in seen:
+            seen.add(dimensions)
+            cubes.append(AggregateCube.build(facts, dimensions, FACT_MEASURES))
+    cube_set = CubeSet(cubes)
+    if max_share is None:
+        return cube_set
+    return cube_set.within(max(1, int(max_share * len(shoes_fact))))
+
+
+def _cube_dir(data_dir='.'):
+    return os.path.join(data_store.store_path(data_dir), CUBE_DIR)
+
+
+def _replace_with(path, write):
+    """Write a file through a temporary name next to it, then move it into place"""
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def save_cube(cube, name, version, data_dir='.'):
+    """Persist a cube or cube set together with the dataset version it describes.
+
+    The cells go to new files and the metadata naming those files replaces
+    the old metadata last, so a reader sees the old cube or the new one,
+    never new cells with stale metadata.
+    """
+    directory = _cube_dir(data_dir)
+    os.makedirs(directory, exist_ok=True)
+    token = uuid.uuid4().hex[:12]
+    cubes = []
+    for number, part in enumerate(getattr(cube, 'cubes', [cube])):
+        cells_file = f"{name}-{token}-{number}.parquet"
+        _replace_with(os.path.join(directory, cells_file), lambda path: part.cells.to_parquet(path, index=False))
+        cubes.append({'cells': cells_file, 'dimensions': part.dimensions, 'measures': part.measures})
+    meta = {
+        'version': version,
+        'format': CUBE_FORMAT,
+        'set': isinstance(cube, CubeSet),
+        'cubes': cubes,
+    }
+
+    def write_meta(path):
+        with open(path, 'w') as f:
+            json.dump(meta, f)
+    _replace_with(os.path.join(directory, f"{name}.json"), write_meta)
+
+    # Cells of earlier saves; a reader still holding their metadata gets None and rebuilds
+    for entry in os.scandir(directory):
+        if entry.name.startswith(f"{name}-") and entry.name.endswith('.parquet') and token not in entry.name:
+            with contextlib.suppress(OSError):
+                os.remove(entry.path)
+
+
+def load_cube(name, version, data_dir='.'):
+    """Load a persisted cube or cube set, or None if it is missing or from another version"""
+    directory = _cube_dir(data_dir)
+    try:
+        with open(os.path.join(directory, f"{name}.json")) as f:
+            meta = json.load(f)
+        if meta['version'] != version or meta.get('format') != CUBE_FORMAT:
+            return None
+        cubes = [
+            AggregateCube(pd.read_parquet(os.path.join(directory, part['cells'])), part['dimensions'], part['measures'])
+            for part in meta['cubes']
+        ]
+    except (OSError, ValueError, KeyError, ImportError):
+        return None
+    return CubeSet(cubes) if meta['set'] else cubes[0]
+
+
+def load_fact_cube(shoes_fact, shoes_dim, version, data_dir='.'):
+    """The persisted fact cube for this version, building and saving it if needed"""
+    cube = load_cube('fact_cube', version, data_dir)
+    if cube is None:
+        cube = build_fact_cube(shoes_fact, shoes_dim)
+        try:
+            save_cube(cube, 'fact_cube', version, data_dir)
+        except (OSError, ImportError):
+            pass
+    return cube
@@ -0,0 +1,1002 @@
+"""Headless analytics shared by the dashboards, the notebook and the CLI.
+
+Every report is a plain function of a ``Dataset`` and a filter state and
+returns a compact result (a number, a Series or a small DataFrame) with
+no Streamlit calls, so reports can be cached, timed and run in batch
+jobs. Rendering stays with the callers.
+
+The filter state is a dict in the format of ``filters.py``. Keys in
+``PRODUCT_FILTERS`` select shoes (product cube, shoe table), keys in
+``FACT_FILTERS`` select fact rows (fact cube, fact table) and keys in
+``COUNTRY_FILTERS`` select countries; any other key is ignored. Fact
+views honour filters on all three tables and are answered by the
+dataset's execution backend (see backends.py): in memory from the fact
+cube or the star join (see star_join.py), or streamed from the Parquet
+store when the fact table does not fit in memory.
+
+Prices are listed in each country's currency. Setting
+``REPORTING_CURRENCY`` in the state converts every price view, and the
+price range filter, into that currency (see currency.py); canonical
+states then also carry the FX table's version.
+
+``COLOR_FILTER`` keeps shoes having any of the given colors in any of
+their three color slots; it is answered by the color index (see
+color_index.py), which also serves the color counts, co-occurrence and
+similar-palette views.
+
+Shoes listed under several ids, names or colorways are grouped into model
+clusters (see near_duplicates.py) for counting or collapsing variants.
+
+The dashboard's tabs are declared in ``DASHBOARD_VIEWS`` as lazy views
+(see lazy_views.py), each with the state keys and tables it reads.
+
+For exploration, setting ``APPROXIMATE_MODE`` in the state estimates the
+dashboard's price views, distinct products and top colors from
+per-partition sketches instead (see approximate.py), at a cost
+independent of the fact table's size.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+import approximate
+import backends
+import chart_data
+import color_index
+import currency
+import data_quality
+import data_store
+import filters
+import instrumentation
+import lazy_views
+import near_duplicates
+import schema
+import search
+import shared_data
+import star_join
+import timeseries
+
+# Shoes with any of the given colors in any color slot
+COLOR_FILTER = 'any_color'
+
+PRODUCT_FILTERS = ['gender', 'best_for_wear', 'dominant_color', COLOR_FILTER]
+FACT_FILTERS = ['price', 'category', 'country_code']
+COUNTRY_FILTERS = ['currency', 'shoe_metric']
+
+# Filters the partition sketches can answer
+APPROXIMATE_FILTERS = approximate.PARTITION_KEYS + COUNTRY_FILTERS + ['price']
+
+# State keys that change how prices are reported rather than which rows are kept
+REPORTING_CURRENCY = 'reporting_currency'
+FX_VERSION = 'fx_version'
+
+# State key asking for sketch-based estimates where the sketches can answer
+APPROXIMATE_MODE = 'approximate_mode'
+
+COLOR_COLUMNS = {'Dominant': 'dominant_color', 'Sub1': 'sub_color1', 'Sub2': 'sub_color2'}
+
+# Window of the trend line's moving average, in days
+TREND_WINDOW = 7
+
+# Columns ``dashboard_payload`` reads; None keeps every column
+DASHBOARD_COLUMNS = {
+    'shoes_dim': ['id', 'gender', 'best_for_wear', 'dominant_color', 'sub_color1', 'sub_color2'],
+    'shoes_fact': ['id', 'price', 'category', 'availability', 'date', 'country_code'],
+    'country_dim': ['country_code', 'currency', 'shoe_metric'],
+}
+
+
+def product_filters(state):
+    return {k: v for k, v in state.items() if k in PRODUCT_FILTERS}
+
+
+def fact_filters(state):
+    return {k: v for k, v in state.items() if k in FACT_FILTERS}
+
+
+def country_filters(state):
+    return {k: v for k, v in state.items() if k in COUNTRY_FILTERS}
+
+
+def star_filters(state):
+    """Filters on any of the three tables, for the star join"""
+    return {**fact_filters(state), **product_filters(state), **country_filters(state)}
+
+
+def reporting_currency(state):
+    """Currency the state's prices are reported in, None for listed prices"""
+    return state.get(REPORTING_CURRENCY)
+
+
+def _delta_pct(value, reference):
+    """Relative difference in percent, NaN when there is nothing to compare to"""
+    if not reference or pd.isna(reference) or pd.isna(value):
+        return float('nan')
+    return (value - reference) / reference * 100
+
+
+class Dataset:
+    """The three tables plus the engines, cubes and indexes built from them.
+
+    Derived structures are built on first use and kept; a Dataset is
+    read-only, so one instance can serve many threads or sessions.
+    """
+
+    def __init__(self, shoes_dim, shoes_fact, country_dim, version=None, data_dir='.', backend='pandas'):
+        self.shoes_dim = shoes_dim
+        self.shoes_fact = shoes_fact
+        self.country_dim = country_dim
+        self.version = version
+        self.data_dir = data_dir
+        self.backend_name = backend
+        # Reentrant, so a build may use other cached structures
+        self._lock = threading.RLock()
+        self._built = {}
+
+    @classmethod
+    def load(cls, columns_by_table=None, data_dir='.', version=None, backend='pandas'):
+        """Map the tables from the host's shared Arrow files; None columns read everything.
+
+        Backends that do not run in memory leave the fact table on disk and
+        load only the dimension tables.
+        """
+        columns_by_table = dict(columns_by_table or dict.fromkeys(data_store.TABLE_FILES))
+        if version is None:
+            version = data_store.dataset_version(data_dir)
+        in_memory = backends.BACKENDS[backend].in_memory if backend in backends.BACKENDS else True
+        with instrumentation.span('load tables'):
+            if in_memory:
+                tables = shared_data.load_tables(columns_by_table, version, data_dir)
+            else:
+                columns_by_table.pop('shoes_fact', None)
+                tables = data_store.load_tables(columns_by_table, data_dir)
+        return cls(tables.get('shoes_dim'), tables.get('shoes_fact'), tables.get('country_dim'),
+                   version=version, data_dir=data_dir, backend=backend)
+
+    @property
+    def backend(self):
+        """Execution backend for fact queries, created on first use"""
+        return self._cached('backend', lambda: backends.create(self.backend_name, self))
+
+    @property
+    def fact_columns(self):
+        """Columns of the fact table, wherever it is held"""
+        return self.backend.columns
+
+    def table_version(self, name):
+        """Version of one table, None when the dataset is unversioned"""
+        if self.version is None:
+            return None
+        return dict(zip(data_store.TABLE_FILES, self.version.split('/'))).get(name)
+
+    def table_rows(self, name):
+        """Row count of a table, wherever it is held"""
+        if name == 'shoes_fact':
+            return self.backend.row_count()
+        return len(getattr(self, name))
+
+    def missing_tables(self):
+        """File names of the tables that could not be loaded"""
+        return [
+            data_store.TABLE_FILES[name]
+            for name in data_store.TABLE_FILES
+            if not (self.backend.loaded() if name == 'shoes_fact' else getattr(self, name) is not None)
+        ]
+
+    def _cached(self, name, build):
+        with self._lock:
+            if name not in self._built:
+                label = name if isinstance(name, str) else ' '.join(name)
+                with instrumentation.span(f"build {label}"):
+                    self._built[name] = build()
+            return self._built[name]
+
+    @property
+    def dim_engine(self):
+        return self._cached(
+            'dim_engine',
+            lambda: filters.FilterEngine(self.shoes_dim, indexes={COLOR_FILTER: self.color_index})
+        )
+
+    @property
+    def color_index(self):
+        return self._cached('color_index', lambda: color_index.ColorIndex.build(self.shoes_dim))
+
+    @property
+    def variants(self):
+        """Model clusters and colorway variants of the shoes (see near_duplicates.py)"""
+        return self._cached(
+            'variants',
+            lambda: near_duplicates.VariantClusters.build(self.shoes_dim, self.color_index.palettes)
+        )
+
+    @property
+    def fact_engine(self):
+        return self._cached('fact_engine', lambda: filters.FilterEngine(self.shoes_fact))
+
+    @property
+    def country_engine(self):
+        return self._cached('country_engine', lambda: filters.FilterEngine(self.country_dim))
+
+    @property
+    def star_join(self):
+        """Fact-to-dimension row index, built once per dataset"""
+        return self._cached(
+            'star_join',
+            lambda: star_join.StarJoin(self.fact_engine, self.dim_engine, self.country_engine)
+        )
+
+    @property
+    def product_cube(self):
+        return self._cached('product_cube', lambda: aggregates.build_product_cube(self.shoes_dim))
+
+    @property
+    def fact_cube(self):
+        """The fact cube, persisted per dataset version when one is known"""
+        def build():
+            if self.version is None:
+                return aggregates.build_fact_cube(self.shoes_fact, self.shoes_dim)
+            return aggregates.load_fact_cube(self.shoes_fact, self.shoes_dim, self.version, self.data_dir)
+        return self._cached('fact_cube', build)
+
+    def _table_for(self, column):
+        """Dimension table holding a filter column, None for fact columns"""
+        if column in PRODUCT_FILTERS:
+            return self.shoes_dim
+        if column in COUNTRY_FILTERS:
+            return self.country_dim
+        return None
+
+    def column_values(self, column):
+        """Sorted distinct non-missing values of a filter column"""
+        def build():
+            if column == COLOR_FILTER:
+                return list(self.color_index.colors)
+            table = self._table_for(column)
+            if table is None:
+                return self.backend.values(column)
+            return sorted(schema.value_counts(table[column]).index.tolist(), key=str)
+        return self._cached(('values', column), build)
+
+    def value_range(self, column, target=None):
+        """(min, max) of a numeric filter column, as floats; prices optionally converted"""
+        if column == 'price' and target is not None:
+            return self._cached(
+                ('range', column, self.rates().version, target),
+                lambda: self.backend.value_range(column, target)
+            )
+
+        def build():
+            table = self._table_for(column)
+            if table is None:
+                return self.backend.value_range(column)
+            values = table[column]
+            return float(values.min()), float(values.max())
+        return self._cached(('range', column), build)
+
+    @property
+    def fx(self):
+        """Exchange rates stored with the data, reloaded when they change; None if absent"""
+        return currency.load_rates(self.data_dir)
+
+    def rates(self):
+        """The exchange rates, for converting prices; ValueError when there are none"""
+        fx = self.fx
+        if fx is None:
+            raise ValueError(f"No exchange rates ({currency.FX_FILE}) to convert prices with")
+        return fx
+
+    def currency_factors(self, target):
+        """Multiplier into ``target`` per country_dim row"""
+        fx = self.rates()
+        return self._cached(
+            ('factors', fx.version, target),
+            lambda: fx.factors(self.country_dim['currency'], target)
+        )
+
+    def country_factors(self, target):
+        """Multiplier into ``target`` per country code"""
+        factors = self.currency_factors(target)
+        return pd.Series(factors, index=self.country_dim['country_code'].astype(object))
+
+    def normalized_prices(self, target):
+        """Fact prices in ``target``, kept per (FX table version, currency).
+
+        A gather of the per-country factors through the star join's row
+        index; float32 like the stored prices.
+        """
+        fx, factors, rows = self.rates(), self.currency_factors(target), self.star_join.country_rows
+        return self._cached(
+            ('prices', fx.version, target),
+            lambda: currency.convert(self.shoes_fact['price'], rows, factors).astype(np.float32)
+        )
+
+    def price_engine(self, target):
+        """Filter engine over the converted prices, for price ranges in ``target``"""
+        prices = self.normalized_prices(target)
+        return self._cached(
+            ('price_engine', self.rates().version, target),
+            lambda: filters.FilterEngine(pd.DataFrame({'price': prices}))
+        )
+
+    @property
+    def fact_sketches(self):
+        """Per-partition sketches of the facts, persisted per dataset version when one is known"""
+        def build():
+            if self.version is None:
+                return approximate.FactSketches.build(self.star_join)
+            return approximate.load_fact_sketches(self.star_join, self.version, self.data_dir)
+        return self._cached('fact_sketches', build)
+
+    @property
+    def search_index(self):
+        return self._cached(
+            'search_index',
+            lambda: search.SearchIndex.build(self.shoes_dim['name'], ids=self.shoes_dim['id'])
+        )
+
+
+def canonical_state(dataset, state):
+    """Drop filters that keep every row, so equivalent states compare equal.
+
+    Selecting every gender, or the full price range, is the same view as
+    not filtering at all; precomputed and cached results are keyed by the
+    canonical form. A reporting currency is kept together with the version
+    of the rates it converts with, and is dropped when no rates exist.
+    Approximate mode is kept when set.
+    """
+    target = reporting_currency(state) if dataset.fx is not None else None
+    canonical = {}
+    for column, value in state.items():
+        if value is None or column not in PRODUCT_FILTERS + FACT_FILTERS + COUNTRY_FILTERS:
+            continue
+        if isinstance(value, (list, set, frozenset)):
+            if not value or set(value) >= set(dataset.column_values(column)):
+                continue
+            canonical[column] = sorted(value, key=str)
+        elif isinstance(value, tuple):
+            low, high = dataset.value_range(column, target)
+            if value[0] <= low and value[1] >= high:
+                continue
+            canonical[column] = (float(value[0]), float(value[1]))
+        else:
+            canonical[column] = value
+    if target is not None:
+        canonical[REPORTING_CURRENCY] = target
+        canonical[FX_VERSION] = dataset.fx.version
+    if state.get(APPROXIMATE_MODE):
+        canonical[APPROXIMATE_MODE] = True
+    return canonical
+
+
+@instrumentation.traced()
+def filter_shoes(dataset, state, columns=None):
+    """Shoe rows matching the product filters"""
+    return dataset.dim_engine.select(columns, **product_filters(state))
+
+
+def _country_codes(dataset, state):
+    """Country codes allowed by the state's country and country_code filters, None if unfiltered"""
+    countries = country_filters(state)
+    if not countries:
+        return None
+    engine = dataset.country_engine
+    positions = engine.indices(**countries)
+    codes = engine.df['country_code']
+    codes = (codes if positions is None else codes.take(positions)).dropna().tolist()
+    allowed = state.get('country_code')
+    if allowed is not None:
+        allowed = set(allowed) if isinstance(allowed, (list, set, frozenset)) else {allowed}
+        codes = [code for code in codes if code in allowed]
+    return codes
+
+
+def fact_query(dataset, state, by=()):
+    """The backend request for the fact rows matching a state, grouped by ``by``.
+
+    Country attributes are translated into the allowed country codes.
+    """
+    return backends.FactQuery(
+        by,
+        facts=fact_filters(state),
+        products=product_filters(state),
+        country_codes=_country_codes(dataset, state),
+        currency=reporting_currency(state),
+    )
+
+
+@instrumentation.traced()
+def filter_facts(dataset, state, columns=None, limit=None):
+    """Fact rows matching the filters on any table; ``columns`` may name dimension columns.
+
+    With a reporting currency, ``price`` holds converted prices. Out-of-core
+    backends read the rows from disk, so pass a ``limit`` on large tables.
+    """
+    return dataset.backend.select(fact_query(dataset, state), columns, limit)
+
+
+@instrumentation.traced()
+def fact_count(dataset, state):
+    """Number of fact rows matching the filters on any table"""
+    return dataset.backend.count(fact_query(dataset, state))
+
+
+def _fact_rollup(dataset, by, state):
+    """Roll-up of the matching facts by ``by`` in listed prices, from the backend"""
+    return dataset.backend.rollup(fact_query(dataset, state, by))
+
+
+def _price_factors(dataset, country_codes, target):
+    """Conversion factor for each of ``country_codes``, NaN where the currency is unknown"""
+    factors = dataset.country_factors(target)
+    return pd.Series(country_codes).astype(object).map(factors).to_numpy(dtype=np.float64)
+
+
+def fact_rollup(dataset, by, state):
+    """Roll-up of the matching facts by ``by`` in the fact cube's layout.
+
+    With a reporting currency the cells are rolled up per country first,
+    their price measures converted, and then combined; prices of countries
+    without a known currency are left out.
+    """
+    target = reporting_currency(state)
+    if target is None:
+        return _fact_rollup(dataset, by, state)
+    by = list(by)
+    keys = by if 'country_code' in by else by + ['country_code']
+    cells = _fact_rollup(dataset, keys, state).reset_index()
+    measures = [m for m in aggregates.FACT_MEASURES if f"{m}_sum" in cells.columns]
+    if 'price' in measures:
+        factor = _price_factors(dataset, cells['country_code'], target)
+        known = ~np.isnan(factor)
+        cells['price_sum'] = np.where(known, cells['price_sum'] * factor, 0.0)
+        cells['price_min'] = cells['price_min'] * factor
+        cells['price_max'] = cells['price_max'] * factor
+        cells['price_count'] = np.where(known, cells['price_count'], 0)
+    return aggregates.AggregateCube(cells, keys, measures).rollup(by)
+
+
+@instrumentation.traced()
+def search_shoes(dataset, query, state, limit=None):
+    """Shoes whose name or id matches ``query``, best match first, within the filters"""
+    hits = dataset.search_index.search(query, limit=limit)
+    positions = dataset.dim_engine.indices(**product_filters(state))
+    if positions is not None:
+        hits = hits[np.isin(hits, positions, assume_unique=True)]
+    return dataset.shoes_dim.take(hits)
+
+
+def _product_cube(dataset, state):
+    """Product cube and the filters to roll it up with.
+
+    The color filter is not a cube dimension; with one, a cube is built
+    over the (small) selection of matching shoes instead.
+    """
+    products = product_filters(state)
+    colors = products.pop(COLOR_FILTER, None)
+    if not colors:
+        return dataset.product_cube, products
+    shoes = dataset.dim_engine.select(None, **{COLOR_FILTER: colors})
+    return aggregates.build_product_cube(shoes), products
+
+
+@instrumentation.traced()
+def summary_metrics(dataset, state):
+    """Headline numbers for the filtered view and their change from the whole data"""
+    cube, products = _product_cube(dataset, state)
+    total_products = int(cube.totals(**products)['count'])
+    metrics = {
+        'total_products': total_products,
+        'product_delta': _delta_pct(total_products, len(dataset.shoes_dim)),
+        'total_countries': len(dataset.country_dim),
+    }
+    fact_totals = fact_rollup(dataset, [], state).iloc[0]
+    overall = fact_rollup(dataset, [], {REPORTING_CURRENCY: reporting_currency(state)}).iloc[0]
+    metrics['fact_rows'] = int(fact_totals['count'])
+    if 'price_mean' in fact_totals:
+        metrics['avg_price'] = float(fact_totals['price_mean'])
+        metrics['price_delta'] = _delta_pct(fact_totals['price_mean'], overall['price_mean'])
+    if 'availability_sum' in fact_totals:
+        metrics['available'] = int(fact_totals['availability_sum'])
+        metrics['availability_delta'] = _delta_pct(fact_totals['availability_sum'], overall['availability_sum'])
+    return metrics
+
+
+@instrumentation.traced()
+def distribution(dataset, column, state):
+    """Row counts per value of one attribute, largest first.
+
+    Shoe attributes count shoes, fact attributes count fact rows.
+    """
+    if column in dataset.product_cube.dimensions:
+        cube, products = _product_cube(dataset, state)
+        return cube.counts(column, **products)
+    counts = fact_rollup(dataset, [column], state)['count']
+    return counts[counts > 0].sort_values(ascending=False)
+
+
+@instrumentation.traced()
+def crosstab(dataset, index, columns, state, normalize=None):
+    """Shoe counts for two attributes; ``normalize='columns'`` gives column percentages"""
+    cube, products = _product_cube(dataset, state)
+    table = cube.crosstab(index, columns, **products)
+    if normalize == 'columns':
+        table = table.div(table.sum(axis=0), axis=1) * 100
+    return table
+
+
+@instrumentation.traced()
+def color_distributions(dataset, state, top=None):
+    """Value counts of the dominant and both sub colors, side by side"""
+    counts = dataset.color_index.slot_counts(dataset.dim_engine.indices(**product_filters(state)))
+    colors = counts.rename(columns={column: label for label, column in COLOR_COLUMNS.items()})
+    if top is not None:
+        colors = colors.sort_values(colors.columns[0], ascending=False).head(top)
+    return colors
+
+
+@instrumentation.traced()
+def color_cooccurrence(dataset, state, top=15):
+    """Shoes having both colors in their palette, for the ``top`` most common colors"""
+    positions = dataset.dim_engine.indices(**product_filters(state))
+    return dataset.color_index.cooccurrence_frame(positions, top)
+
+
+@instrumentation.traced()
+def similar_palettes(dataset, position, state, limit=10):
+    """Shoes within the filters whose palettes best match the shoe at row ``position``.
+
+    Similarity is the Jaccard index of the two color sets.
+    """
+    candidates = dataset.dim_engine.indices(**product_filters(state))
+    positions, scores = dataset.color_index.similar(position, limit, candidates)
+    return dataset.shoes_dim.take(positions).assign(similarity=scores)
+
+
+@instrumentation.traced()
+def near_duplicate_report(dataset, state, top=20):
+    """Model clusters among the filtered shoes: counts and the ``top`` largest clusters"""
+    positions = dataset.dim_engine.indices(**product_filters(state))
+    variants = dataset.variants
+    return {
+        'summary': variants.summary(positions),
+        'clusters': variants.cluster_frame(dataset.shoes_dim, positions, top),
+    }
+
+
+def collapse_variants(dataset, shoes):
+    """One row per model cluster of a shoe selection, with the number of rows it stands for"""
+    positions = dataset.shoes_dim.index.get_indexer(shoes.index)
+    kept, counts = dataset.variants.collapse(positions)
+    return dataset.shoes_dim.take(kept).assign(variants=counts)
+
+
+@instrumentation.traced()
+def country_summary(dataset):
+    """Number of countries per currency and per shoe-size system"""
+    return pd.DataFrame({
+        'Currency': schema.value_counts(dataset.country_dim['currency']),
+        'Shoe Metric': schema.value_counts(dataset.country_dim['shoe_metric']),
+    })
+
+
+@instrumentation.traced()
+def daily_counts(dataset, state):
+    """Fact rows per calendar day as a ``DailySeries``"""
+    cells = fact_rollup(dataset, ['date'], state)['count']
+    return timeseries.DailySeries.from_counts(cells.index, cells.to_numpy())
+
+
+def period_counts(series, resolution):
+    """Counts per day, week or month as a date/count frame"""
+    dates, counts = series.resample(resolution)
+    return pd.DataFrame({'date': dates, 'count': counts})
+
+
+def trend_frame(series, resolution, window=TREND_WINDOW):
+    """Average daily count and its moving average, per period"""
+    dates, counts = series.resample(resolution, series.counts, how='mean')
+    _, average = series.resample(resolution, series.moving_average(window), how='mean')
+    return pd.DataFrame({'date': dates, 'count': counts, f"{window}_day_avg": average})
+
+
+def daily_statistics(series):
+    """Mean and peak over the days with products, plus trailing-window totals"""
+    active = series.counts[series.counts > 0]
+    return {
+        'average_daily': float(active.mean()) if len(active) else 0.0,
+        'maximum_daily': int(active.max()) if len(active) else 0,
+        'active_days': series.active_days,
+        'window_totals': series.window_totals(),
+    }
+
+
+@instrumentation.traced()
+def price_histogram(dataset, state, bins=chart_data.HISTOGRAM_BINS):
+    """Binned price distribution, computed from the cube's cent buckets"""
+    target = reporting_currency(state)
+    if target is None:
+        cells = fact_rollup(dataset, ['price_bucket'], state)['count']
+        prices = cells.index.to_numpy(dtype=float, na_value=np.nan) / aggregates.PRICE_BUCKET_SCALE
+        return chart_data.histogram(prices, bins=bins, weights=cells.to_numpy())
+    # Each (bucket, country) cell converts at its country's rate
+    cells = fact_rollup(dataset, ['price_bucket', 'country_code'], state)['count']
+    buckets = cells.index.get_level_values('price_bucket')
+    prices = buckets.to_numpy(dtype=float, na_value=np.nan) / aggregates.PRICE_BUCKET_SCALE
+    prices = prices * _price_factors(dataset, cells.index.get_level_values('country_code'), target)
+    return chart_data.histogram(prices, bins=bins, weights=cells.to_numpy())
+
+
+def _weighted_describe(values, weights, name='price'):
+    """``Series.describe()`` of ``values`` each repeated ``weights`` times"""
+    valid = ~np.isnan(values) & (weights > 0)
+    order = np.argsort(values[valid], kind='stable')
+    values, weights = values[valid][order], weights[valid][order]
+    count = weights.sum()
+    index = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+    if count == 0:
+        return pd.Series([0.0] + [np.nan] * 7, index=index, name=name)
+    mean = (values * weights).sum() / count
+    std = np.sqrt((weights * (values - mean) ** 2).sum() / (count - 1)) if count > 1 else np.nan
+    # Linear interpolation between the values at the neighbouring ranks, as pandas does
+    ends = np.cumsum(weights)
+    positions = np.array([0.0, 0.25, 0.5, 0.75, 1.0]) * (count - 1)
+    below = values[np.searchsorted(ends, np.floor(positions), side='right')]
+    above = values[np.minimum(np.searchsorted(ends, np.ceil(positions), side='right'), len(values) - 1)]
+    quantiles = below + (positions - np.floor(positions)) * (above - below)
+    return pd.Series([float(count), mean, std, *quantiles], index=index, name=name)
+
+
+@instrumentation.traced()
+def price_statistics(dataset, state):
+    """``describe()`` of the filtered prices, from the cube's cent buckets"""
+    target = reporting_currency(state)
+    by = ['price_bucket'] if target is None else ['price_bucket', 'country_code']
+    cells = fact_rollup(dataset, by, state)['count']
+    buckets = cells.index.get_level_values('price_bucket')
+    prices = buckets.to_numpy(dtype=float, na_value=np.nan) / aggregates.PRICE_BUCKET_SCALE
+    if target is not None:
+        prices = prices * _price_factors(dataset, cells.index.get_level_values('country_code'), target)
+    return _weighted_describe(prices, cells.to_numpy(dtype=np.float64))
+
+
+@instrumentation.traced()
+def average_price_by_category(dataset, state):
+    """Mean price per category, most expensive first"""
+    means = fact_rollup(dataset, ['category'], state)['price_mean']
+    return means.dropna().rename('price').sort_values(ascending=False)
+
+
+@instrumentation.traced()
+def price_by_gender_country(dataset, state):
+    """Average price per country (rows) and gender (columns)"""
+    cells = fact_rollup(dataset, ['country_code', 'gender'], state)
+    return cells['price_mean'].unstack('gender')
+
+
+@instrumentation.traced()
+def distinct_products(dataset, state):
+    """Number of distinct shoes among the matching fact rows"""
+    return dataset.backend.distinct_products(fact_query(dataset, state))
+
+
+@instrumentation.traced()
+def stocked_colors(dataset, state, top=10):
+    """Fact rows per dominant color of their shoe, most common first"""
+    counts = fact_rollup(dataset, ['dominant_color'], state)['count']
+    return counts[counts > 0].sort_values(ascending=False).head(top)
+
+
+def approximable(state):
+    """Whether the partition sketches can answer a state"""
+    return all(column in APPROXIMATE_FILTERS for column in star_filters(state))
+
+
+def _sketch_views(dataset, state):
+    """Views of the partition sketches matching a state, and the partitions' keys"""
+    fact_sketches = dataset.fact_sketches
+    selected = {k: v for k, v in state.items() if k in approximate.PARTITION_KEYS}
+    codes = _country_codes(dataset, state)
+    if codes is not None:
+        selected['country_code'] = codes
+    # An empty list would mean "no filter" to the selection
+    positions = np.empty(0, dtype=np.intp) if codes == [] else fact_sketches.select(**selected)
+    keys = fact_sketches.keys.iloc[positions]
+    target = reporting_currency(state)
+    factors = None
+    if target is not None and 'country_code' in keys.columns:
+        factors = _price_factors(dataset, keys['country_code'], target)
+    return fact_sketches.views(positions, factors, state.get('price')), keys
+
+
+@instrumentation.traced()
+def approximate_report(dataset, state, bins=chart_data.HISTOGRAM_BINS, top=10):
+    """Price views, distinct products and top colors estimated from the partition sketches.
+
+    Results use the keys of ``dashboard_payload``; ``error_bounds`` holds
+    their error bounds. Distinct products and colors are left out when
+    the state has a price range.
+    """
+    views, keys = _sketch_views(dataset, state)
+    combined = approximate.combine(views)
+    prices = combined.prices
+    report = {
+        'price_histogram': approximate.histogram(prices, bins),
+        'price_statistics': approximate.describe(prices),
+    }
+    bounds = {'rank_error': prices.rank_error()}
+    if 'category' in keys.columns:
+        means, errors = approximate.stratified_means(views, keys['category'])
+        report['average_price_by_category'] = means.sort_values(ascending=False)
+        bounds['average_price_by_category'] = errors
+    if combined.products is not None:
+        report['distinct_products'] = combined.products.count()
+        bounds['distinct_products'] = approximate.distinct_error(combined.products)
+        report['stocked_colors'] = dataset.fact_sketches.color_counts(combined, top)
+        bounds['stocked_colors'] = combined.colors.error()
+    report['error_bounds'] = bounds
+    return report
+
+
+@instrumentation.traced()
+def release_timeline(dataset, state):
+    """Shoes per release date and usage category"""
+    shoes = filter_shoes(dataset, state, ['release_date', 'best_for_wear'])
+    return shoes.groupby(['release_date', 'best_for_wear'], observed=True).size().reset_index(name='count')
+
+
+@instrumentation.traced()
+def quality_report(dataset, state):
+    """Quality profile of the filtered shoe table"""
+    return data_quality.profile_frame(filter_shoes(dataset, state))
+
+
+@instrumentation.traced()
+def table_quality_report(table_name, data_dir='.'):
+    """Quality profile of a whole stored table, streamed from disk"""
+    return data_quality.profile_table(table_name, data_dir=data_dir)
+
+
+def approximate_view(dataset, state):
+    """Sketch-based estimates for a state in approximate mode, None for exact views.
+
+    The sketches are built from the in-memory facts, so other backends
+    stay exact.
+    """
+    if not (state.get(APPROXIMATE_MODE) and dataset.backend.in_memory and approximable(state)
+            and 'price' in dataset.fact_columns):
+        return None
+    return approximate_report(dataset, state)
+
+
+def basic_statistics_view(dataset, state, approximate=None):
+    """Metrics, distributions and daily counts of the Basic Statistics tab"""
+    dim_columns, fact_columns = dataset.shoes_dim.columns, dataset.fact_columns
+    view = {'summary': summary_metrics(dataset, state), 'approximate': approximate is not None}
+    if 'gender' in dim_columns:
+        view['gender_distribution'] = distribution(dataset, 'gender', state)
+    if 'category' in fact_columns:
+        view['category_distribution'] = distribution(dataset, 'category', state)
+    if 'date' in fact_columns:
+        view['daily_counts'] = daily_counts(dataset, state)
+    if approximate is not None:
+        view['error_bounds'] = approximate['error_bounds']
+        for name in ['distinct_products', 'stocked_colors']:
+            if name in approximate:
+                view[name] = approximate[name]
+    else:
+        view['distinct_products'] = distinct_products(dataset, state)
+        if 'dominant_color' in dim_columns:
+            view['stocked_colors'] = stocked_colors(dataset, state)
+    return view
+
+
+def price_view(dataset, state, approximate=None):
+    """Price histogram, statistics and category averages of the Price Analysis tab"""
+    fact_columns = dataset.fact_columns
+    view = {'approximate': approximate is not None}
+    if approximate is not None:
+        view['error_bounds'] = approximate['error_bounds']
+        for name in ['price_histogram', 'price_statistics', 'average_price_by_category']:
+            if name in approximate:
+                view[name] = approximate[name]
+    elif 'price' in fact_columns:
+        view['price_histogram'] = price_histogram(dataset, state)
+        view['price_statistics'] = price_statistics(dataset, state)
+        if 'category' in fact_columns:
+            view['average_price_by_category'] = average_price_by_category(dataset, state)
+    return view
+
+
+def geography_view(dataset, state, country_summary=None):
+    """Country counts and prices by gender and country for the Geographic Analysis tab"""
+    view = {'country_summary': country_summary}
+    if ('price' in dataset.fact_columns and 'country_code' in dataset.fact_columns
+            and 'gender' in dataset.shoes_dim.columns):
+        view['price_by_gender_country'] = price_by_gender_country(dataset, state)
+    return view
+
+
+def market_view(dataset, state):
+    """Crosstabs and color co-occurrence of the Market Insights tab"""
+    dim_columns = dataset.shoes_dim.columns
+    view = {}
+    if 'gender' in dim_columns and 'best_for_wear' in dim_columns:
+        view['gender_usage'] = crosstab(dataset, 'gender', 'best_for_wear', state)
+    if 'gender' in dim_columns and 'dominant_color' in dim_columns:
+        view['color_gender'] = crosstab(dataset, 'dominant_color', 'gender', state)
+    if 'dominant_color' in dim_columns:
+        view['color_cooccurrence'] = color_cooccurrence(dataset, state)
+    return view
+
+
+# State keys read by views over the facts: every filter and how prices are reported
+FACT_VIEW_KEYS = PRODUCT_FILTERS + FACT_FILTERS + COUNTRY_FILTERS + [REPORTING_CURRENCY, FX_VERSION]
+ALL_TABLES = list(data_store.TABLE_FILES)
+
+# The dashboard's views with the state keys and tables each reads (see lazy_views.py)
+DASHBOARD_VIEWS = [
+    lazy_views.ViewNode('approximate', approximate_view, FACT_VIEW_KEYS + [APPROXIMATE_MODE], ALL_TABLES),
+    lazy_views.ViewNode('basic_statistics', basic_statistics_view, FACT_VIEW_KEYS, ALL_TABLES,
+                        depends=['approximate']),
+    lazy_views.ViewNode('data_quality', quality_report, PRODUCT_FILTERS, ['shoes_dim']),
+    lazy_views.ViewNode('near_duplicates', near_duplicate_report, PRODUCT_FILTERS, ['shoes_dim']),
+    lazy_views.ViewNode('price_analysis', price_view, FACT_VIEW_KEYS, ALL_TABLES, depends=['approximate']),
+    lazy_views.ViewNode('country_summary', lambda dataset, state: country_summary(dataset),
+                        tables=['country_dim']),
+    lazy_views.ViewNode('geographic_analysis', geography_view, FACT_VIEW_KEYS, ALL_TABLES,
+                        depends=['country_summary']),
+    lazy_views.ViewNode('market_insights', market_view, PRODUCT_FILTERS, ['shoes_dim']),
+    lazy_views.ViewNode('release_timeline', release_timeline, PRODUCT_FILTERS, ['shoes_dim']),
+]
+
+# Views making up the dashboard payload; they read only the columns in DASHBOARD_COLUMNS
+PAYLOAD_VIEWS = ['basic_statistics', 'price_analysis', 'geographic_analysis', 'market_insights']
+
+
+def dashboard_views(dataset, state, names=PAYLOAD_VIEWS):
+    """Results of the named dashboard views for one state, by view name"""
+    graph = lazy_views.ViewGraph(DASHBOARD_VIEWS)
+    return {name: graph.get(name, dataset, state) for name in names}
+
+
+@instrumentation.traced()
+def dashboard_payload(dataset, state, approximate_mode=False):
+    """Results behind data_cleaner.py's metrics, distributions, charts and crosstabs.
+
+    The payload views merged into one dict. Everything is small (cube
+    roll-ups and binned distributions). In ``approximate_mode`` the
+    row-level views come from the partition sketches when they can answer
+    the state; ``approximate`` records whether they did.
+    """
+    if approximate_mode:
+        state = {**state, APPROXIMATE_MODE: True}
+    payload = {}
+    for view in dashboard_views(dataset, state).values():
+        payload.update(view)
+    return payload
+
+
+# Report bundles for batch use (CLI, precomputation, exports)
+
+def _quality_summary(report):
+    return {
+        'rows': report.rows,
+        'completeness': report.completeness,
+        'duplicate_rows': report.duplicate_rows,
+        'duplicates_exact': report.duplicates_exact,
+        'columns': report.column_frame(),
+        'invalid_samples': report.invalid_samples,
+    }
+
+
+def summary_report(dataset, state):
+    return summary_metrics(dataset, state)
+
+
+def distribution_report(dataset, state):
+    report = {
+        column: distribution(dataset, column, state)
+        for column in ['gender', 'best_for_wear']
+        if column in dataset.shoes_dim.columns
+    }
+    if 'category' in dataset.fact_columns:
+        report['category'] = distribution(dataset, 'category', state)
+    return report
+
+
+def time_series_report(dataset, state):
+    series = daily_counts(dataset, state)
+    report = daily_statistics(series)
+    report['periods'] = period_counts(series, series.auto_resolution())
+    return report
+
+
+def price_report(dataset, state):
+    return {
+        'statistics': price_statistics(dataset, state),
+        'histogram': price_histogram(dataset, state),
+        'by_category': average_price_by_category(dataset, state),
+    }
+
+
+def crosstab_report(dataset, state):
+    return {
+        'gender_by_usage': crosstab(dataset, 'gender', 'best_for_wear', state),
+        'color_by_gender': crosstab(dataset, 'dominant_color', 'gender', state),
+    }
+
+
+def color_report(dataset, state):
+    return {
+        'colors': color_distributions(dataset, state),
+        'cooccurrence': color_cooccurrence(dataset, state),
+    }
+
+
+def geography_report(dataset, state):
+    report = {'countries': country_summary(dataset)}
+    if 'price' in dataset.fact_columns:
+        report['price_by_gender_country'] = price_by_gender_country(dataset, state)
+    return report
+
+
+def quality_summary_report(dataset, state):
+    return _quality_summary(quality_report(dataset, state))
+
+
+def variant_report(dataset, state):
+    return near_duplicate_report(dataset, state)
+
+
+def table_quality_summary_report(dataset, state):
+    return {
+        name: _quality_summary(table_quality_report(name, dataset.data_dir))
+        for name in data_store.TABLE_FILES
+    }
+
+
+REPORTS = {
+    'summary': summary_report,
+    'distributions': distribution_report,
+    'time_series': time_series_report,
+    'prices': price_report,
+    'crosstabs': crosstab_report,
+    'colors': color_report,
+    'geography': geography_report,
+    'quality': quality_summary_report,
+    'variants': variant_report,
+    'table_quality': table_quality_summary_report,
+}
+
+
+def run_report(dataset, name, state=None):
+    """Run one named report from ``REPORTS``"""
+    return REPORTS[name](dataset, state or {})
+
+
+def to_jsonable(value):
+    """Convert report results to JSON-serializable Python objects"""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, pd.DataFrame):
+        return {
+            'index': [to_jsonable(v) for v in value.index],
+            'columns': [str(c) for c in value.columns],
+            'data': [[to_jsonable(v) for v in row] for row in value.itertuples(index=False)],
+        }
+    if isinstance(value, pd.Series):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        return to_jsonable(value.item())
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
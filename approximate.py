@@ -0,0 +1,264 @@
+"""Approximate fact statistics from per-partition sketches.
+
+The fact table is split into partitions by ``PARTITION_KEYS`` (gender,
+category and country; a few hundred at most) and each partition is
+summarized once per dataset version by a fixed-size ``PartitionSketch``:
+
+* a KLL quantile sketch of its prices (``describe()`` and histograms),
+* a HyperLogLog of its product ids (distinct products),
+* a Count-Min sketch of its dominant colors (top colors),
+* a uniform reservoir sample of its prices (stratified chart estimates).
+
+A filter state on the partition keys selects partitions and merges their
+sketches, so answering it costs the same whatever the size of the fact
+table. Price ranges and currency conversion are applied to the price
+sketch and the sample; distinct products and colors cannot be restricted
+by price and are left out then. Sketches are persisted next to the fact
+cube, tagged with the dataset version.
+"""
+import math
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import filters
+import sketches
+
+SKETCH_DIR = 'sketches'
+# Bump when the sketch layout changes, to discard saved sketches
+SKETCH_FORMAT = 2
+
+PARTITION_KEYS = ['gender', 'category', 'country_code']
+
+# Rows added to a sketch at a time, bounding the build's working memory
+CHUNK_ROWS = 1_000_000
+
+SAMPLE_SIZE = 512
+# Normal quantile of the 95% confidence intervals
+Z_95 = 1.96
+
+
+class PartitionSketch:
+    """Fixed-size summary of one set of fact rows"""
+
+    def __init__(self, seed=None):
+        self.prices = sketches.KllSketch(seed=seed)
+        self.products = sketches.HyperLogLog(precision=12)
+        self.colors = sketches.CountMinSketch()
+        self.sample = sketches.Reservoir(SAMPLE_SIZE, seed=seed)
+
+    def update(self, prices, product_hashes, color_hashes):
+        self.prices.update(prices)
+        self.sample.update(prices)
+        self.products.update(product_hashes)
+        self.colors.update(color_hashes)
+
+    def merge(self, other):
+        self.prices.merge(other.prices)
+        self.sample.merge(other.sample)
+        if other.products is None:
+            self.products = self.colors = None
+        elif self.products is not None:
+            self.products.merge(other.products)
+            self.colors.merge(other.colors)
+        return self
+
+    def priced(self, factor=1.0, price_range=None):
+        """View with prices converted by ``factor`` and restricted to ``price_range``.
+
+        A NaN factor (unknown currency) drops the prices. The distinct
+        product and color sketches do not survive a price range.
+        """
+        view = PartitionSketch.__new__(PartitionSketch)
+        view.products, view.colors = self.products, self.colors
+        if np.isnan(factor):
+            view.prices, view.sample = sketches.KllSketch(), sketches.Reservoir(SAMPLE_SIZE)
+            return view
+        view.prices, view.sample = self.prices, self.sample
+        if factor != 1.0:
+            view.prices, view.sample = self.prices.scaled(factor), self.sample.scaled(factor)
+        if price_range is not None:
+            low, high = price_range
+            view.prices = view.prices.restricted(low, high)
+            view.sample = view.sample.restricted(low, high, view.prices.n)
+            view.products = view.colors = None
+        return view
+
+
+class FactSketches:
+    """One ``PartitionSketch`` per partition of the fact table"""
+
+    def __init__(self, keys, partitions, colors):
+        self.keys = keys
+        self.partitions = partitions
+        # Vocabulary of the Count-Min sketches' color codes
+        self.colors = colors
+        self.engine = filters.FilterEngine(keys)
+
+    def __len__(self):
+        return len(self.partitions)
+
+    @classmethod
+    def build(cls, star, chunk_rows=CHUNK_ROWS, seed=0):
+        """Sketch the facts behind a ``star_join.StarJoin``, partition by partition"""
+        columns = star.fact_engine.df.columns.union(star.dim_engine.df.columns)
+        keys = pd.DataFrame({key: star.column(key) for key in PARTITION_KEYS if key in columns})
+        grouped = keys.groupby(list(keys.columns), observed=True, dropna=False, sort=True)
+        group = grouped.ngroup().to_numpy()
+        order = np.argsort(group, kind='stable')
+        bounds = np.searchsorted(group[order], np.arange(grouped.ngroups + 1))
+
+        prices = star.column('price').to_numpy(dtype=np.float64, na_value=np.nan)
+        # Integer keys hash much faster than the id strings; -1 marks unknown ids
+        product_keys = star.product_keys.astype(np.int64)
+        product_hashes = sketches.hash_values(pd.Series(product_keys))
+        colors = sorted(star.dim_engine.df['dominant_color'].dropna().unique().tolist(), key=str)
+        color_codes = pd.Categorical(star.column('dominant_color'), categories=colors).codes.astype(np.int64)
+        color_hashes = sketches.hash_values(pd.Series(color_codes))
+
+        partitions = []
+        for number in range(grouped.ngroups):
+            rows = order[bounds[number]:bounds[number + 1]]
+            sketch = PartitionSketch(seed=seed + number)
+            for start in range(0, len(rows), chunk_rows):
+                chunk = rows[start:start + chunk_rows]
+                sketch.update(
+                    prices[chunk],
+                    product_hashes[chunk][product_keys[chunk] >= 0],
+                    color_hashes[chunk][color_codes[chunk] >= 0],
+                )
+            partitions.append(sketch)
+        return cls(grouped.size().index.to_frame(index=False), partitions, colors)
+
+    def select(self, **state):
+        """Positions of the partitions matching filters on the partition keys"""
+        positions = self.engine.indices(**{k: v for k, v in state.items() if k in PARTITION_KEYS})
+        return np.arange(len(self)) if positions is None else positions
+
+    def views(self, positions, factors=None, price_range=None):
+        """Price-converted, range-restricted views of the partitions at ``positions``"""
+        factors = np.ones(len(positions)) if factors is None else factors
+        return [self.partitions[p].priced(f, price_range) for p, f in zip(positions, factors)]
+
+    def color_counts(self, sketch, top=None):
+        """Estimated fact rows per dominant color, most common first"""
+        hashes = sketches.hash_values(pd.Series(np.arange(len(self.colors), dtype=np.int64)))
+        counts = pd.Series(sketch.colors.estimate(hashes), index=pd.Index(self.colors, name='dominant_color'))
+        counts = counts[counts > 0].sort_values(ascending=False)
+        return counts if top is None else counts.head(top)
+
+
+def combine(views):
+    """Merge partition views into one sketch of their union"""
+    combined = PartitionSketch()
+    for view in views:
+        combined.merge(view)
+    return combined
+
+
+def describe(prices):
+    """``Series.describe()`` estimated from a quantile sketch"""
+    quantiles = prices.quantiles([0.0, 0.25, 0.5, 0.75, 1.0])
+    return pd.Series(
+        [prices.n, prices.mean(), prices.std(), *quantiles],
+        index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+        name='price',
+    )
+
+
+def histogram(prices, bins):
+    """Equal-width histogram from a quantile sketch, in chart_data's layout plus an ``error`` column"""
+    if prices.n == 0:
+        edges = np.linspace(0.0, 1.0, bins + 1)
+        counts = np.zeros(bins)
+    else:
+        edges = np.linspace(prices.min, prices.max, bins + 1)
+        counts = np.diff(np.concatenate([[0.0], prices.cdf(edges[1:-1]), [1.0]])) * prices.n
+    return pd.DataFrame({
+        'bin_start': edges[:-1],
+        'bin_end': edges[1:],
+        'bin_center': (edges[:-1] + edges[1:]) / 2,
+        'count': np.round(counts).astype(np.int64),
+        'error': np.full(bins, prices.rank_error(pmf=True) * prices.n),
+    })
+
+
+def stratified_means(views, labels):
+    """Mean price per label and its 95% confidence half-width.
+
+    Each partition is a stratum: its sample mean is weighted by its row
+    count, and the variance adds up over strata with the finite-population
+    correction, so a partition sampled in full contributes no error.
+    """
+    rows = []
+    for view, label in zip(views, labels):
+        values, population = view.sample.values, view.prices.n
+        if population == 0 or len(values) == 0:
+            continue
+        variance = values.var(ddof=1) if len(values) > 1 else 0.0
+        correction = max(0.0, 1 - len(values) / population)
+        rows.append((label, population, values.mean(), variance * correction / len(values)))
+    strata = pd.DataFrame(rows, columns=['label', 'population', 'mean', 'variance'])
+    if strata.empty:
+        return pd.Series(dtype=float), pd.Series(dtype=float)
+    totals = strata.groupby('label', observed=True)['population'].transform('sum')
+    share = strata['population'] / totals
+    strata['weighted_mean'] = share * strata['mean']
+    strata['weighted_variance'] = share ** 2 * strata['variance']
+    grouped = strata.groupby('label', observed=True)
+    means = grouped['weighted_mean'].sum()
+    errors = Z_95 * np.sqrt(grouped['weighted_variance'].sum())
+    return means, errors
+
+
+def distinct_error(sketch):
+    """Relative standard error of a HyperLogLog count"""
+    return 1.04 / math.sqrt(len(sketch.registers))
+
+
+def _sketch_path(data_dir='.'):
+    return os.path.join(data_store.store_path(data_dir), SKETCH_DIR, 'fact_sketches.pkl')
+
+
+def save_sketches(fact_sketches, version, data_dir='.'):
+    """Persist the partition sketches together with the dataset version they describe"""
+    path = _sketch_path(data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    state = {
+        'version': version,
+        'format': SKETCH_FORMAT,
+        'keys': fact_sketches.keys,
+        'partitions': fact_sketches.partitions,
+        'colors': fact_sketches.colors,
+    }
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_sketches(version, data_dir='.'):
+    """Load the persisted sketches, or None if they are missing or from another version"""
+    try:
+        with open(_sketch_path(data_dir), 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if state.get('version') != version or state.get('format') != SKETCH_FORMAT:
+        return None
+    return FactSketches(state['keys'], state['partitions'], state['colors'])
+
+
+def load_fact_sketches(star, version, data_dir='.'):
+    """The persisted sketches for this version, building and saving them if needed"""
+    fact_sketches = load_sketches(version, data_dir)
+    if fact_sketches is None:
+        fact_sketches = FactSketches.build(star)
+        try:
+            save_sketches(fact_sketches, version, data_dir)
+        except OSError:
+            pass
+    return fact_sketches
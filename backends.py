@@ -0,0 +1,434 @@
+"""Execution backends for the fact-table computations.
+
+Every fact view in analytics.py reduces to a few requests on the matching
+fact rows: a roll-up (row count plus sum/min/max/count per measure,
+grouped by some columns), a row count, the number of distinct products,
+or the rows themselves. A backend answers those requests, described by a
+``FactQuery``:
+
+* ``pandas`` holds the fact table in memory (memory-mapped from the
+  shared Arrow files) and answers from the fact cube or the star join.
+* ``arrow`` never loads the fact table. It streams the Parquet store
+  through pyarrow's Acero engine. Filters are pushed into the scan (which
+  skips country partitions and row groups that cannot match), and rows
+  are aggregated batch by batch. Memory therefore depends on the number
+  of groups and the scan's read-ahead, not on the size of the table.
+
+Dimension tables are small and are always held in memory; filters on
+their columns become ``id`` or ``country_code`` sets on the facts.
+Backends are registered in ``BACKENDS``.
+"""
+import functools
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.acero as acero
+    import pyarrow.compute as pc
+except ImportError:
+    acero = None
+
+import aggregates
+import data_store
+import schema
+
+# Environment variable naming the backend the dashboards and tools use by default
+BACKEND_ENV = 'ADIDAS_BACKEND'
+
+# Above this share of physical memory the fact table is scanned instead of loaded
+MEMORY_SHARE = 0.5
+
+# Rows per scanned batch and batches read ahead, the arrow backend's memory ceiling
+BATCH_ROWS = 1 << 17
+READAHEAD = 4
+
+
+class FactQuery:
+    """A request on the fact rows matching a filter state.
+
+    ``facts`` and ``products`` are the state's filters on fact and shoe
+    columns, ``country_codes`` the countries allowed by its country
+    filters (None when there are none; empty when none match), and
+    ``currency`` the reporting currency its price range is given in.
+    """
+
+    def __init__(self, by=(), facts=None, products=None, country_codes=None, currency=None):
+        self.by = list(by)
+        self.facts = dict(facts or {})
+        self.products = dict(products or {})
+        self.country_codes = country_codes
+        self.currency = currency
+
+    def grouped(self, by):
+        return FactQuery(by, self.facts, self.products, self.country_codes, self.currency)
+
+
+class PandasBackend:
+    """Fact table in memory; roll-ups from the fact cube or the star join"""
+
+    name = 'pandas'
+    in_memory = True
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    @property
+    def columns(self):
+        return self.dataset.shoes_fact.columns
+
+    def loaded(self):
+        return self.dataset.shoes_fact is not None
+
+    def row_count(self):
+        return len(self.dataset.shoes_fact)
+
+    def positions(self, query):
+        """Positions of the matching fact rows, None for all"""
+        dataset = self.dataset
+        star = {**query.facts, **query.products}
+        if query.country_codes is not None:
+            if not query.country_codes:
+                return np.empty(0, dtype=np.int64)
+            star['country_code'] = query.country_codes
+        if query.currency is None or 'price' not in star:
+            return dataset.star_join.fact_indices(**star)
+        # A range in the reporting currency applies to the converted prices
+        in_range = dataset.price_engine(query.currency).indices(price=star.pop('price'))
+        positions = dataset.star_join.fact_indices(**star)
+        return in_range if positions is None else np.intersect1d(positions, in_range, assume_unique=True)
+
+    def rollup(self, query):
+        """A fact cube answers when one holds every filtered and grouping column"""
+        dataset, by = self.dataset, query.by
+        if query.country_codes == [] or (query.currency is not None and 'price' in query.facts):
+            return dataset.star_join.rollup_rows(by, self.positions(query))
+        cube_filters = dict(query.facts)
+        if query.country_codes is not None:
+            cube_filters['country_code'] = query.country_codes
+        cube_filters.update(query.products)
+        cube = dataset.fact_cube.cube_for(list(by) + aggregates.filtered_columns(cube_filters))
+        if cube is not None:
+            return cube.rollup(by, **cube_filters)
+        return dataset.star_join.rollup_rows(by, self.positions(query))
+
+    def count(self, query):
+        positions = self.positions(query)
+        return self.row_count() if positions is None else len(positions)
+
+    def distinct_products(self, query):
+        keys = self.dataset.star_join.product_keys
+        positions = self.positions(query)
+        if positions is not None:
+            keys = keys[positions]
+        return int(np.count_nonzero(np.bincount(keys[keys >= 0])))
+
+    def select(self, query, columns=None, limit=None):
+        """Matching rows; ``columns`` may name dimension columns. Prices are converted with a currency."""
+        dataset = self.dataset
+        fact_only = columns is None or all(column in self.columns for column in columns)
+        if query.currency is None and not query.products and query.country_codes is None and fact_only:
+            frame = dataset.fact_engine.select(columns, **query.facts)
+            return frame if limit is None else frame.head(limit)
+        positions = self.positions(query)
+        if positions is None:
+            positions = np.arange(self.row_count())
+        if limit is not None:
+            positions = positions[:limit]
+        if query.currency is None and columns is None:
+            return dataset.shoes_fact.take(positions)
+        frame = dataset.star_join.rows(list(columns or self.columns), positions)
+        if query.currency is not None and 'price' in frame.columns:
+            frame['price'] = dataset.normalized_prices(query.currency)[positions]
+        return frame
+
+    def values(self, column):
+        return sorted(schema.value_counts(self.dataset.shoes_fact[column]).index.tolist(), key=str)
+
+    def value_range(self, column, target=None):
+        if column == 'price' and target is not None:
+            prices = self.dataset.normalized_prices(target)
+            return float(np.nanmin(prices)), float(np.nanmax(prices))
+        values = self.dataset.shoes_fact[column]
+        return float(values.min()), float(values.max())
+
+
+def _clause(column, value):
+    """Filter expression for one entry of a filter state (see filters.py)"""
+    if isinstance(value, (list, set, frozenset)):
+        values = [v.item() if isinstance(v, np.generic) else v for v in value]
+        return pc.field(column).isin(values)
+    if isinstance(value, tuple):
+        low, high = value
+        return (pc.field(column) >= low) & (pc.field(column) <= high)
+    return pc.field(column) == value
+
+
+def _all_of(clauses):
+    return functools.reduce(operator.and_, clauses) if clauses else None
+
+
+def _aggregate_name(function, keys):
+    # Grouped aggregations use the hash_ variant of each function
+    return f"hash_{function}" if keys else function
+
+
+class ArrowBackend:
+    """Fact table scanned from the Parquet store by pyarrow's Acero engine, never loaded"""
+
+    name = 'arrow'
+    in_memory = False
+
+    def __init__(self, dataset, batch_rows=BATCH_ROWS, readahead=READAHEAD):
+        if acero is None:
+            raise ImportError("The arrow backend needs pyarrow")
+        self.dataset = dataset
+        self.batch_rows = batch_rows
+        self.readahead = readahead
+        self.facts = data_store.arrow_dataset('shoes_fact', dataset.data_dir)
+        self._rows = None
+
+    @property
+    def columns(self):
+        return pd.Index([] if self.facts is None else self.facts.schema.names)
+
+    def loaded(self):
+        return self.facts is not None and self.row_count() > 0
+
+    def row_count(self):
+        if self._rows is None:
+            # Parquet footers hold the row counts; no data is read
+            self._rows = self.facts.count_rows()
+        return self._rows
+
+    def _product_ids(self, products):
+        """Ids whose first shoes_dim row matches the shoe filters, like the star join"""
+        shoes = self.dataset.shoes_dim
+        positions = self.dataset.dim_engine.indices(**products)
+        if positions is None:
+            return None
+        selected = np.zeros(len(shoes), dtype=bool)
+        selected[positions] = True
+        first = ~shoes['id'].duplicated().to_numpy()
+        return shoes['id'][selected & first].dropna().astype(str).tolist()
+
+    def _converted_range(self, price_range, target):
+        """Listed-price ranges, one per country, equivalent to a range in ``target``"""
+        low, high = price_range
+        clauses = [
+            (pc.field('country_code') == str(code))
+            & (pc.field('price') >= low / factor) & (pc.field('price') <= high / factor)
+            for code, factor in self.dataset.country_factors(target).items()
+            if not pd.isna(code) and factor > 0
+        ]
+        return functools.reduce(operator.or_, clauses) if clauses else pc.scalar(False)
+
+    def _filter(self, query):
+        """Filter expression and the columns it reads"""
+        clauses, columns = [], set()
+        names = self.facts.schema.names
+        for column, value in query.facts.items():
+            if value is None or column not in names:
+                continue
+            if isinstance(value, (list, set, frozenset)) and not value:
+                continue
+            if column == 'price' and query.currency is not None:
+                clauses.append(self._converted_range(value, query.currency))
+                columns.add('country_code')
+            else:
+                clauses.append(_clause(column, value))
+            columns.add(column)
+        if query.products:
+            ids = self._product_ids(query.products)
+            if ids is not None:
+                clauses.append(pc.field('id').isin(ids) if ids else pc.scalar(False))
+                columns.add('id')
+        if query.country_codes is not None:
+            codes = [str(code) for code in query.country_codes]
+            clauses.append(pc.field('country_code').isin(codes) if codes else pc.scalar(False))
+            columns.add('country_code')
+        return _all_of(clauses), columns
+
+    def _plan(self, query, projections):
+        """Scan, filter and project the matching rows.
+
+        ``projections`` maps output names to (expression, fact column it
+        reads) pairs.
+        """
+        expression, columns = self._filter(query)
+        columns |= {column for _, column in projections.values()}
+        nodes = [acero.Declaration('scan', acero.ScanNodeOptions(
+            self.facts,
+            columns=sorted(columns),
+            filter=expression,
+            batch_size=self.batch_rows,
+            batch_readahead=self.readahead,
+            fragment_readahead=1,
+        ))]
+        # The scan only uses the filter to skip data; the filter node applies it
+        if expression is not None:
+            nodes.append(acero.Declaration('filter', acero.FilterNodeOptions(expression)))
+        nodes.append(acero.Declaration('project', acero.ProjectNodeOptions(
+            [expression for expression, _ in projections.values()], list(projections)
+        )))
+        return nodes
+
+    def _aggregate(self, query, projections, aggregations, keys=()):
+        """Run a scan-filter-project-aggregate plan; returns a pandas frame"""
+        keys = list(keys)
+        nodes = self._plan(query, projections)
+        nodes.append(acero.Declaration('aggregate', acero.AggregateNodeOptions(
+            [(target, _aggregate_name(function, keys), options, name)
+             for target, function, options, name in aggregations],
+            keys=keys,
+        )))
+        table = acero.Declaration.from_sequence(nodes).to_table(use_threads=True)
+        return table.to_pandas(date_as_object=False)
+
+    def _lookup(self, frame, key, table, columns):
+        """Attach dimension columns to grouped cells through their key, first row per key"""
+        rows = table.drop_duplicates(key)
+        index = pd.Index(rows[key].astype(object).astype(str))
+        positions = index.get_indexer(frame[key].astype(object).astype(str))
+        for column in columns:
+            frame[column] = rows[column].array.take(positions, allow_fill=True)
+        return frame
+
+    def rollup(self, query):
+        """Roll-up in the fact cube's layout; shoe and country columns are joined onto the cells"""
+        by, names = query.by, self.facts.schema.names
+        shoe_columns = [c for c in by if c not in names and c in self.dataset.shoes_dim.columns]
+        country_columns = [c for c in by if c not in names and c in self.dataset.country_dim.columns
+                           and c not in shoe_columns]
+        unknown = [c for c in by if c not in names + ['price_bucket'] + shoe_columns + country_columns]
+        if unknown:
+            raise KeyError(f"Unknown column(s): {', '.join(unknown)}")
+
+        keys = [c for c in by if c not in shoe_columns + country_columns]
+        if shoe_columns and 'id' not in keys:
+            keys.append('id')
+        if country_columns and 'country_code' not in keys:
+            keys.append('country_code')
+        projections = {
+            key: (pc.round(pc.multiply(pc.field('price'), aggregates.PRICE_BUCKET_SCALE)).cast(pa.int64()), 'price')
+            if key == 'price_bucket' else (pc.field(key), key)
+            for key in keys
+        }
+        measures = [m for m in aggregates.FACT_MEASURES if m in names]
+        aggregations = [([], 'count_all', None, 'count')]
+        for measure in measures:
+            field = pc.field(measure)
+            projections[measure] = (field.cast(pa.float64()) if measure == 'price' else field, measure)
+            aggregations += [
+                (measure, 'sum', None, f"{measure}_sum"),
+                (measure, 'min', None, f"{measure}_min"),
+                (measure, 'max', None, f"{measure}_max"),
+                (measure, 'count', pc.CountOptions(mode='only_valid'), f"{measure}_count"),
+            ]
+        cells = self._aggregate(query, projections, aggregations, keys)
+
+        if 'price_bucket' in cells.columns:
+            cells['price_bucket'] = cells['price_bucket'].astype('Int64')
+        for column in schema.DATE_COLUMNS.get('shoes_fact', []):
+            if column in cells.columns:
+                cells[column] = cells[column].astype('datetime64[s]')
+        if shoe_columns:
+            cells = self._lookup(cells, 'id', self.dataset.shoes_dim, shoe_columns)
+        if country_columns:
+            cells = self._lookup(cells, 'country_code', self.dataset.country_dim, country_columns)
+        return aggregates.AggregateCube(cells, by, measures).rollup(by)
+
+    def count(self, query):
+        cells = self._aggregate(query, {}, [([], 'count_all', None, 'count')])
+        return int(cells['count'].iloc[0])
+
+    def distinct_products(self, query):
+        cells = self._aggregate(query, {'id': (pc.field('id'), 'id')}, [([], 'count_all', None, 'count')], ['id'])
+        known = set(self.dataset.shoes_dim['id'].dropna().astype(str))
+        return int(cells['id'].astype(str).isin(known).sum())
+
+    def select(self, query, columns=None, limit=None):
+        """Matching rows, read into memory; keep ``limit`` small on large tables"""
+        names = self.facts.schema.names
+        columns = list(columns or names)
+        shoe_columns = [c for c in columns if c not in names and c in self.dataset.shoes_dim.columns]
+        country_columns = [c for c in columns if c not in names and c in self.dataset.country_dim.columns]
+        read = [c for c in columns if c in names]
+        if shoe_columns and 'id' not in read:
+            read.append('id')
+        if (country_columns or query.currency is not None) and 'country_code' not in read:
+            read.append('country_code')
+        expression, _ = self._filter(query)
+        scanner = self.facts.scanner(columns=read, filter=expression, batch_size=self.batch_rows)
+        table = scanner.to_table() if limit is None else scanner.head(limit)
+        frame = table.to_pandas(date_as_object=False)
+        if shoe_columns:
+            frame = self._lookup(frame, 'id', self.dataset.shoes_dim, shoe_columns)
+        if country_columns:
+            frame = self._lookup(frame, 'country_code', self.dataset.country_dim, country_columns)
+        if query.currency is not None and 'price' in frame.columns:
+            factors = self.dataset.country_factors(query.currency)
+            factors.index = factors.index.astype(str)
+            frame['price'] = frame['price'] * frame['country_code'].astype(str).map(factors).to_numpy(dtype=np.float64)
+        return frame[columns]
+
+    def values(self, column):
+        projections = {column: (pc.field(column), column)}
+        cells = self._aggregate(FactQuery(), projections, [([], 'count_all', None, 'count')], [column])
+        return sorted(cells[column].dropna().tolist(), key=str)
+
+    def value_range(self, column, target=None):
+        if column == 'price' and target is not None:
+            cells = self.rollup(FactQuery(['country_code']))
+            factors = cells.index.astype(object).map(self.dataset.country_factors(target)).to_numpy(dtype=np.float64)
+            return (float(np.nanmin(cells['price_min'].to_numpy() * factors)),
+                    float(np.nanmax(cells['price_max'].to_numpy() * factors)))
+        cells = self._aggregate(FactQuery(), {column: (pc.field(column), column)}, [
+            (column, 'min', None, 'min'),
+            (column, 'max', None, 'max'),
+        ])
+        return float(cells['min'].iloc[0]), float(cells['max'].iloc[0])
+
+
+BACKENDS = {
+    'pandas': PandasBackend,
+    'arrow': ArrowBackend,
+}
+
+
+def available():
+    """Names of the backends that can run here"""
+    return [name for name in BACKENDS if name != 'arrow' or acero is not None]
+
+
+def physical_memory():
+    """Bytes of RAM on this host, None when unknown"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_backend(data_dir='.'):
+    """``ADIDAS_BACKEND`` if set, else arrow when the fact table would not fit comfortably in memory"""
+    name = os.environ.get(BACKEND_ENV)
+    if name:
+        return name
+    memory = physical_memory()
+    try:
+        size = os.path.getsize(data_store.source_path('shoes_fact', data_dir))
+    except OSError:
+        return 'pandas'
+    if memory and size > memory * MEMORY_SHARE and 'arrow' in available():
+        return 'arrow'
+    return 'pandas'
+
+
+def create(name, dataset):
+    """Backend ``name`` over a dataset; ValueError for unknown names"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; available: {', '.join(available())}")
+    return BACKENDS[name](dataset)
@@ -0,0 +1,356 @@
+"""Headless benchmark of the dashboards' data path.
+
+Times loading the tables, building the engines, cubes and sketches,
+filtering, each dashboard tab's computations, their sketch-based
+estimates (approximate mode) and catalog search against one data
+directory (typically written by synthetic_data.py), for a fixed set of
+filter states. It also measures the JSON size of each chart's data,
+which is roughly what a figure ships to the browser, and the process's
+peak resident set size.
+
+Results are written as JSON. Passing ``--baseline`` compares a run with
+a stored result and exits non-zero when a step got slower, or memory
+or a chart payload grew, by more than the tolerance. A run also fails
+when the fact cube holds more than ``aggregates.MAX_CELL_SHARE`` of the
+fact rows in cells, since its views would then be no faster than a scan.
+
+Usage:
+    python synthetic_data.py bench_data --facts 10000000
+    python benchmark.py bench_data --output baseline.json
+    python benchmark.py bench_data --baseline baseline.json --tolerance 0.2
+    python benchmark.py bench_data --backend arrow --output arrow.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import aggregates
+import analytics
+import backends
+import chart_data
+import data_store
+import instrumentation
+
+SEARCH_QUERIES = ['ultraboost', 'running shoes', 'samba og', 'laufschuh', 'HQ42']
+
+# Steps faster than this are never reported as regressions; their timings are mostly noise
+MIN_REGRESSION_MS = 2.0
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes"""
+    if resource is None:
+        return instrumentation.current_rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def benchmark_states(dataset):
+    """Representative filter states: everything, one of each filter and two combinations"""
+    gender = analytics.distribution(dataset, 'gender', {}).index[0]
+    wear = analytics.distribution(dataset, 'best_for_wear', {}).index[0]
+    category = analytics.distribution(dataset, 'category', {}).index[0]
+    currency = dataset.column_values('currency')[0]
+    low, high = dataset.value_range('price')
+    prices = (low + (high - low) / 4, high - (high - low) / 4)
+    return {
+        'all': {},
+        'gender': {'gender': [gender]},
+        'wear': {'best_for_wear': [wear]},
+        'category': {'category': [category]},
+        'price': {'price': prices},
+        'combined': {'gender': [gender], 'category': [category], 'price': prices},
+        'joined': {'best_for_wear': [wear], 'currency': [currency]},
+    }
+
+
+def filter_rows(dataset, state):
+    return {
+        'shoes': len(analytics.filter_shoes(dataset, state)),
+        'facts': analytics.fact_count(dataset, state),
+    }
+
+
+# Tab computations, mirroring what data_cleaner.py and adidas_analyzer.py draw
+
+def basic_statistics(dataset, state):
+    series = analytics.daily_counts(dataset, state)
+    resolution = series.auto_resolution()
+    trend = analytics.trend_frame(series, resolution)
+    return {
+        'summary': analytics.summary_metrics(dataset, state),
+        'gender_distribution': analytics.distribution(dataset, 'gender', state),
+        'category_distribution': analytics.distribution(dataset, 'category', state),
+        'products_over_time': chart_data.downsample(analytics.period_counts(series, resolution), 'date', 'count'),
+        'daily_statistics': analytics.daily_statistics(series),
+        'trend': chart_data.downsample(trend, 'date', ['count', f"{analytics.TREND_WINDOW}_day_avg"]),
+    }
+
+
+def data_quality(dataset, state):
+    return {
+        'quality': analytics.quality_report(dataset, state).column_frame(),
+        'near_duplicates': analytics.near_duplicate_report(dataset, state)['clusters'],
+    }
+
+
+def price_analysis(dataset, state):
+    return {
+        'price_histogram': analytics.price_histogram(dataset, state),
+        'price_statistics': analytics.price_statistics(dataset, state),
+        'average_price_by_category': analytics.average_price_by_category(dataset, state),
+    }
+
+
+def geographic_analysis(dataset, state):
+    return {
+        'country_summary': analytics.country_summary(dataset),
+        'price_by_gender_country': analytics.price_by_gender_country(dataset, state),
+    }
+
+
+def market_insights(dataset, state):
+    return {
+        'gender_usage': analytics.crosstab(dataset, 'gender', 'best_for_wear', state),
+        'color_gender': analytics.crosstab(dataset, 'dominant_color', 'gender', state).head(10),
+    }
+
+
+def color_analysis(dataset, state):
+    return {
+        'colors': analytics.color_distributions(dataset, state, top=10),
+        'color_cooccurrence': analytics.color_cooccurrence(dataset, state),
+    }
+
+
+def approximate_analysis(dataset, state):
+    """The sketch-based estimates of approximate mode, for the states they cover"""
+    if not dataset.backend.in_memory or not analytics.approximable(state):
+        return {}
+    report = analytics.approximate_report(dataset, state)
+    return {f"approximate {name}": value for name, value in report.items() if name != 'error_bounds'}
+
+
+def catalog_search(dataset, state):
+    return {
+        f"search {query}": analytics.search_shoes(dataset, query, state, limit=50)[['id', 'name']]
+        for query in SEARCH_QUERIES
+    }
+
+
+STEPS = {
+    'filter': filter_rows,
+    'Basic Statistics': basic_statistics,
+    'Data Quality': data_quality,
+    'Price Analysis': price_analysis,
+    'Geographic Analysis': geographic_analysis,
+    'Market Insights': market_insights,
+    'Color Analysis': color_analysis,
+    'Approximate': approximate_analysis,
+    'search': catalog_search,
+}
+
+
+def payload_size(value):
+    """Bytes of a chart's data serialized as JSON"""
+    return len(json.dumps(analytics.to_jsonable(value), default=str))
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _step_stats(runs):
+    return {
+        'first_ms': runs[0],
+        'median_ms': statistics.median(runs[1:] or runs),
+        'min_ms': min(runs),
+    }
+
+
+def run_benchmark(data_dir, repeat=5, cold=False, backend='pandas'):
+    """Time every step over the benchmark states; returns a JSON-ready result"""
+    if cold:
+        shutil.rmtree(data_store.store_path(data_dir), ignore_errors=True)
+    steps = {}
+    tracer = instrumentation.current() or instrumentation.Tracer()
+
+    # Cold runs include converting the CSVs and exporting the shared tables
+    with tracer.span('load'):
+        dataset, elapsed = _timed(analytics.Dataset.load, None, data_dir, None, backend)
+    steps['load'] = _step_stats([elapsed])
+    missing = dataset.missing_tables()
+    if missing:
+        raise FileNotFoundError(f"Missing or empty data files: {', '.join(missing)}")
+
+    def build():
+        if not dataset.backend.in_memory:
+            return (dataset.color_index, dataset.dim_engine, dataset.product_cube, dataset.search_index,
+                    dataset.variants)
+        return (dataset.color_index, dataset.dim_engine, dataset.fact_engine, dataset.product_cube,
+                dataset.fact_cube, dataset.fact_sketches, dataset.search_index, dataset.variants)
+    with tracer.span('build'):
+        _, elapsed = _timed(build)
+    steps['build'] = _step_stats([elapsed])
+
+    # Each step's time is the total over all states; payloads are measured unfiltered
+    states = benchmark_states(dataset)
+    payloads = {}
+    for name, func in STEPS.items():
+        runs = []
+        with tracer.span(name):
+            for _ in range(max(1, repeat)):
+                total = 0.0
+                for state_name, state in states.items():
+                    result, elapsed = _timed(func, dataset, state)
+                    total += elapsed
+                    if state_name == 'all':
+                        payloads.update(result)
+                runs.append(total)
+        steps[name] = _step_stats(runs)
+
+    return {
+        'meta': {
+            'data_dir': os.path.abspath(data_dir),
+            'version': dataset.version,
+            'rows': {
+                name: dataset.table_rows(name)
+                for name in data_store.TABLE_FILES
+            },
+            'backend': backend,
+            'states': list(states),
+            'repeat': repeat,
+            'cold': cold,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'steps': steps,
+        'payload_bytes': {
+            name: payload_size(value)
+            for name, value in payloads.items()
+            if isinstance(value, (pd.DataFrame, pd.Series))
+        },
+        'peak_rss_mb': peak_rss() / 2**20,
+        'cube_cells': len(dataset.fact_cube) if dataset.backend.in_memory else None,
+    }
+
+
+def cube_too_large(result):
+    """Whether the fact cube's cells are not well below the fact rows"""
+    cells = result.get('cube_cells')
+    return cells is not None and cells > aggregates.MAX_CELL_SHARE * result['meta']['rows']['shoes_fact']
+
+
+def compare(result, baseline, tolerance=0.2):
+    """Rows of (metric, baseline, current, ratio, regressed) for a result and its baseline"""
+    rows = []
+
+    def add(metric, old, new, min_delta=0.0):
+        if old is None or new is None:
+            return
+        ratio = new / old if old else float('inf') if new else 1.0
+        regressed = ratio > 1 + tolerance and new - old > min_delta
+        rows.append((metric, old, new, ratio, regressed))
+
+    for name, stats in result['steps'].items():
+        old = baseline.get('steps', {}).get(name)
+        if old is not None:
+            add(f"{name} (ms)", old['median_ms'], stats['median_ms'], MIN_REGRESSION_MS)
+    add('peak RSS (MB)', baseline.get('peak_rss_mb'), result['peak_rss_mb'])
+    for name, size in result['payload_bytes'].items():
+        add(f"{name} payload (bytes)", baseline.get('payload_bytes', {}).get(name), size)
+    return rows
+
+
+def print_result(result):
+    meta = result['meta']
+    rows = ', '.join(f"{name} {count:,}" for name, count in meta['rows'].items())
+    print(f"Data: {rows} rows ({meta['repeat']} repeats over {len(meta['states'])} filter states)")
+    print(f"{'step':<22}{'first ms':>12}{'median ms':>12}{'min ms':>12}")
+    for name, stats in result['steps'].items():
+        print(f"{name:<22}{stats['first_ms']:>12.1f}{stats['median_ms']:>12.1f}{stats['min_ms']:>12.1f}")
+    print(f"Chart payloads: {sum(result['payload_bytes'].values()):,} bytes in {len(result['payload_bytes'])} charts")
+    print(f"Peak RSS: {result['peak_rss_mb']:.1f} MB")
+    if result.get('cube_cells') is not None:
+        print(f"Fact cube: {result['cube_cells']:,} cells")
+
+
+def print_comparison(rows):
+    print(f"{'metric':<40}{'baseline':>14}{'current':>14}{'ratio':>8}")
+    for metric, old, new, ratio, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{metric:<40}{old:>14,.1f}{new:>14,.1f}{ratio:>8.2f}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboards' computations headlessly")
+    parser.add_argument('data_dir', help="Directory holding the dataset CSVs")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs of each step")
+    parser.add_argument('--cold', action='store_true',
+                        help="Delete the columnar store first, so load includes conversion")
+    parser.add_argument('--output', help="Write the result as JSON to this file")
+    parser.add_argument('--baseline', help="Compare with a result stored by an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed relative slowdown or growth before a metric counts as a regression")
+    parser.add_argument('--backend', choices=list(backends.BACKENDS), default='pandas',
+                        help="Fact table execution backend")
+    parser.add_argument('--trace', help="Append the run's spans to this JSON-lines file")
+    args = parser.parse_args(argv)
+
+    tracer = instrumentation.Tracer().activate()
+    try:
+        result = run_benchmark(args.data_dir, args.repeat, args.cold, args.backend)
+    except (OSError, ValueError) as e:
+        print(f"Benchmark failed: {e}", file=sys.stderr)
+        return 1
+    if args.trace:
+        tracer.export_jsonl(args.trace)
+    print_result(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    status = 0
+    if cube_too_large(result):
+        print(f"The fact cube holds more than {aggregates.MAX_CELL_SHARE:.0%} of the fact rows in cells",
+              file=sys.stderr)
+        status = 1
+
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cannot read baseline: {e}", file=sys.stderr)
+            return 1
+        if baseline.get('meta', {}).get('rows') != result['meta']['rows']:
+            print("Warning: the baseline was measured on data of a different size", file=sys.stderr)
+        rows = compare(result, baseline, args.tolerance)
+        print()
+        print_comparison(rows)
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Server-side data reduction for Plotly figures.
+
+Figures should ship a bounded payload to the browser no matter how many
+rows sit behind them. Distributions are binned here with ``np.histogram``
+and sent as bars; line series are thinned to a fixed point budget with
+Largest-Triangle-Three-Buckets (shape preserving) or min/max bucketing
+(peak preserving).
+"""
+import numpy as np
+import pandas as pd
+
+HISTOGRAM_BINS = 30
+
+# Maximum number of points a single figure sends, across all of its traces
+MAX_POINTS = 2000
+
+# Trace that sums the groups beyond a line chart's point budget
+OTHER_GROUP = "Other"
+
+
+def histogram(values, bins=HISTOGRAM_BINS, weights=None):
+    """Equal-width histogram as a frame of bin edges, centers and counts.
+
+    ``weights`` lets pre-aggregated values (e.g. cube cells) count more
+    than once.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[valid]
+    counts, edges = np.histogram(values[valid], bins=bins, weights=weights)
+    return pd.DataFrame({
+        'bin_start': edges[:-1],
+        'bin_end': edges[1:],
+        'bin_center': (edges[:-1] + edges[1:]) / 2,
+        'count': counts.astype(np.int64),
+    })
+
+
+def _numeric(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb_indices(x, y, max_points):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps"""
+    n = len(x)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    x, y = _numeric(x), np.nan_to_num(_numeric(y))
+    # The first and last points are always kept; the rest is split into buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        # Average of the next bucket is the third triangle vertex
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def minmax_indices(x, y, max_points):
+    """Indices of each bucket's minimum and maximum, in x order"""
+    n = len(x)
+    if n <= max_points or max_points < 2:
+        return np.arange(n)
+    y = _numeric(y)
+    buckets = max(1, max_points // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    kept = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        segment = y[start:end]
+        kept.extend((start + np.nanargmin(segment), start + np.nanargmax(segment)))
+    return np.unique(kept)
+
+
+def downsample(df, x, y, max_points=MAX_POINTS, method='lttb', group=None):
+    """Thin a line chart's frame to at most ``max_points`` rows.
+
+    ``y`` may be a list of columns drawn against the same x; the points are
+    chosen on the first one and kept for all. With ``group`` (one trace per
+    value) the budget is shared evenly between the traces; when there are
+    more traces than fit at three points each, the smallest are summed per
+    x into one ``OTHER_GROUP`` trace, so ``y`` should be additive (counts).
+    """
+    select = lttb_indices if method == 'lttb' else minmax_indices
+    first_y = y[0] if isinstance(y, (list, tuple)) else y
+    if group is None:
+        if len(df) <= max_points:
+            return df
+        ordered = df.sort_values(x)
+        return ordered.iloc[select(ordered[x].to_numpy(), ordered[first_y].to_numpy(), max_points)]
+
+    groups = df.groupby(group, observed=True, sort=False)
+    if groups.ngroups == 0 or len(df) <= max_points:
+        return df
+    sizes = groups.size()
+    traces = max(1, max_points // 3)
+    if len(sizes) > traces:
+        keep = sizes.nlargest(traces - 1, keep='first').index
+        rest = df[group].notna() & ~df[group].isin(keep)
+        columns = list(y) if isinstance(y, (list, tuple)) else [y]
+        other = df[rest].groupby(x, sort=True)[columns].sum().reset_index()
+        other[group] = OTHER_GROUP
+        kept = df[~rest].assign(**{group: df.loc[~rest, group].astype(object)})
+        groups = pd.concat([kept, other], ignore_index=True).groupby(group, observed=True, sort=False)
+    budget = max(1, max_points // groups.ngroups)
+    parts = []
+    for _, part in groups:
+        part = part.sort_values(x)
+        parts.append(part.iloc[select(part[x].to_numpy(), part[first_y].to_numpy(), budget)])
+    return pd.concat(parts)
@@ -0,0 +1,225 @@
+"""Accuracy checks for the sketches behind approximate mode.
+
+Builds one ``approximate.PartitionSketch`` per partition of seeded
+synthetic fact rows, selects and merges partitions the way a filter state
+does, and compares the estimates with exact pandas results:
+
+* ``describe()``: count, mean, std, min and max exactly, and each
+  quartile within the sketch's reported rank error;
+* ``histogram()``: every bin within its ``error`` column;
+* the same for prices converted per partition (``scaled``) and restricted
+  to a price range (``restricted``);
+* ``stratified_means()``: the share of exact category means inside their
+  95% confidence intervals;
+* distinct products and color counts within the HyperLogLog and
+  Count-Min bounds, and distinct products never above the row count.
+
+Selections cover all partitions, one gender and the smallest partition,
+where few rows make an overestimate above the row count most likely.
+
+Data and sketches are seeded, so a run is deterministic. Exits non-zero
+when a check fails.
+
+Usage:
+    python check_sketches.py
+    python check_sketches.py --rows 2000000 --seeds 5
+"""
+import argparse
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+import approximate
+import chart_data
+import sketches
+
+GENDERS = ['M', 'W', 'U', 'K']
+CATEGORIES = ['Running', 'Originals', 'Football', 'Tennis', 'Golf', 'Outdoor']
+COLORS = 30
+
+# Rows added to a sketch per update; small, so compaction runs across updates
+UPDATE_ROWS = 7_000
+
+# Currency factors the scaled check draws from, one per partition
+FACTORS = [1.0, 0.86, 1.09, 149.5]
+
+
+def synthetic_partitions(rows, seed):
+    """Fact rows of every gender x category partition, with skewed sizes and prices"""
+    rng = np.random.default_rng(seed)
+    keys = pd.MultiIndex.from_product([GENDERS, CATEGORIES], names=['gender', 'category']).to_frame(index=False)
+    sizes = rng.dirichlet(np.full(len(keys), 0.8)) * rows
+    color_weights = 1.0 / np.arange(1, COLORS + 1)
+    partitions = []
+    for number, size in enumerate(np.maximum(sizes.astype(np.int64), 50)):
+        # Listed prices are rounded to cents, so ties are common
+        prices = np.round(rng.lognormal(rng.uniform(3.5, 5.0), rng.uniform(0.2, 0.7), size), 2)
+        products = rng.integers(0, rng.integers(50, 5_000), size) + number * 10_000
+        colors = rng.choice(COLORS, size, p=color_weights / color_weights.sum())
+        partitions.append({'prices': prices, 'products': products, 'colors': colors})
+    return keys, partitions
+
+
+def build_sketches(partitions, seed):
+    built = []
+    for number, part in enumerate(partitions):
+        sketch = approximate.PartitionSketch(seed=seed * 1000 + number)
+        product_hashes = sketches.hash_values(pd.Series(part['products']))
+        color_hashes = sketches.hash_values(pd.Series(part['colors']))
+        for start in range(0, len(part['prices']), UPDATE_ROWS):
+            stop = start + UPDATE_ROWS
+            sketch.update(part['prices'][start:stop], product_hashes[start:stop], color_hashes[start:stop])
+        built.append(sketch)
+    return built
+
+
+def rank_deviation(exact, estimates, fractions):
+    """How far each estimate's rank in ``exact`` (sorted) lies from its target fraction"""
+    below = np.searchsorted(exact, estimates, side='left') / len(exact)
+    at_or_below = np.searchsorted(exact, estimates, side='right') / len(exact)
+    return np.maximum(0.0, np.maximum(below - fractions, fractions - at_or_below))
+
+
+def exact_histogram(exact, edges):
+    """Counts per bin with the sketch's convention: (start, end], the first bin closed"""
+    inner = np.searchsorted(exact, edges[1:-1], side='right')
+    return np.diff(np.concatenate([[0], inner, [len(exact)]]))
+
+
+class Checks:
+    """Observed errors against their bounds, worst case per check"""
+
+    def __init__(self):
+        self.results = {}
+
+    def add(self, name, observed, bound):
+        worst = self.results.get(name)
+        margin = observed - bound
+        if worst is None or margin > worst[0] - worst[1]:
+            self.results[name] = (float(observed), float(bound))
+
+    @property
+    def failed(self):
+        return [name for name, (observed, bound) in self.results.items() if observed > bound]
+
+
+def check_prices(checks, label, prices, exact, moments=True):
+    """describe() and histogram() of a price sketch against the exact values"""
+    exact = np.sort(exact)
+    stats = approximate.describe(prices)
+    fractions = np.array([0.25, 0.5, 0.75])
+    quartiles = stats[['25%', '50%', '75%']].to_numpy(dtype=np.float64)
+    checks.add(f"{label}: quartile rank error", rank_deviation(exact, quartiles, fractions).max(),
+               prices.rank_error())
+    if moments:
+        checks.add(f"{label}: count", abs(stats['count'] - len(exact)), 0)
+        checks.add(f"{label}: mean, std (relative)", max(
+            abs(stats['mean'] - exact.mean()) / exact.mean(),
+            abs(stats['std'] - exact.std(ddof=1)) / exact.std(ddof=1),
+        ), 1e-9)
+        checks.add(f"{label}: min, max", max(abs(stats['min'] - exact[0]), abs(stats['max'] - exact[-1])), 0)
+    else:
+        # The count of a restricted sketch is itself an estimate
+        checks.add(f"{label}: count", abs(stats['count'] - len(exact)), prices.rank_error(pmf=True) * prices.n)
+
+    bins = approximate.histogram(prices, chart_data.HISTOGRAM_BINS)
+    edges = np.concatenate([bins['bin_start'].to_numpy(), bins['bin_end'].to_numpy()[-1:]])
+    deviation = np.abs(bins['count'].to_numpy() - exact_histogram(exact, edges))
+    # Every bin has the same bound; counts are rounded to whole rows
+    checks.add(f"{label}: histogram bin error", deviation.max(), bins['error'].max() + 0.5)
+
+
+def check_frequencies(checks, combined, parts):
+    products = np.unique(np.concatenate([part['products'] for part in parts]))
+    relative = abs(combined.products.count() - len(products)) / len(products)
+    checks.add("distinct products (relative)", relative, 3 * approximate.distinct_error(combined.products))
+    rows = sum(len(part['products']) for part in parts)
+    checks.add("distinct products above rows", combined.products.count() - rows, 0)
+
+    colors = np.bincount(np.concatenate([part['colors'] for part in parts]), minlength=COLORS)
+    estimates = combined.colors.estimate(sketches.hash_values(pd.Series(np.arange(COLORS))))
+    checks.add("color counts: undercount", (colors - estimates).max(), 0)
+    checks.add("color counts: overcount", (estimates - colors).max(), combined.colors.error())
+
+
+def run_checks(rows, seeds):
+    checks = Checks()
+    covered = intervals = 0
+    for seed in range(seeds):
+        keys, parts = synthetic_partitions(rows, seed)
+        partition_sketches = build_sketches(parts, seed)
+        rng = np.random.default_rng(seed)
+        selections = {
+            'all partitions': np.arange(len(parts)),
+            'one gender': np.flatnonzero(keys['gender'] == GENDERS[seed % len(GENDERS)]),
+            'smallest partition': np.array([np.argmin([len(part['prices']) for part in parts])]),
+        }
+        for name, positions in selections.items():
+            selected = [parts[p] for p in positions]
+            exact = np.concatenate([part['prices'] for part in selected])
+            views = [partition_sketches[p].priced() for p in positions]
+            combined = approximate.combine(views)
+            check_prices(checks, name, combined.prices, exact)
+            check_frequencies(checks, combined, selected)
+
+            # Prices converted into a reporting currency, partition by partition
+            factors = rng.choice(FACTORS, len(positions))
+            scaled = approximate.combine([partition_sketches[p].priced(f) for p, f in zip(positions, factors)])
+            converted = np.concatenate([part['prices'] * f for part, f in zip(selected, factors)])
+            check_prices(checks, f"{name}, converted", scaled.prices, converted)
+
+            # A price range, as the price slider sets it
+            low, high = np.quantile(exact, [0.2, 0.8])
+            ranged_views = [partition_sketches[p].priced(price_range=(low, high)) for p in positions]
+            ranged = approximate.combine(ranged_views)
+            check_prices(checks, f"{name}, price range", ranged.prices,
+                         exact[(exact >= low) & (exact <= high)], moments=False)
+
+            # Category means from the partitions' samples
+            labels = keys['category'].to_numpy()[positions]
+            for label_views, values in [
+                (views, [part['prices'] for part in selected]),
+                (ranged_views, [part['prices'][(part['prices'] >= low) & (part['prices'] <= high)]
+                                for part in selected]),
+            ]:
+                means, errors = approximate.stratified_means(label_views, labels)
+                exact_means = pd.Series(np.concatenate(values)).groupby(
+                    np.repeat(labels, [len(v) for v in values])).mean()
+                inside = (means - exact_means.reindex(means.index)).abs() <= errors
+                covered += int(inside.sum())
+                intervals += len(inside)
+    return checks, covered, intervals
+
+
+def print_result(checks, coverage, intervals):
+    print(f"{'check':<52}{'worst':>14}{'bound':>14}")
+    for name, (observed, bound) in checks.results.items():
+        flag = '  FAIL' if observed > bound else ''
+        print(f"{name:<52}{observed:>14.6g}{bound:>14.6g}{flag}")
+    print(f"Stratified means: {coverage:.1%} of {intervals} exact means inside their 95% intervals")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the approximate-mode sketches against exact results")
+    parser.add_argument('--rows', type=int, default=500_000, help="Synthetic fact rows per seed")
+    parser.add_argument('--seeds', type=int, default=3, help="Data sets to check, each with its own seed")
+    parser.add_argument('--min-coverage', type=float, default=0.85,
+                        help="Share of exact means that must fall inside their 95% intervals")
+    args = parser.parse_args(argv)
+
+    checks, covered, intervals = run_checks(args.rows, args.seeds)
+    coverage = covered / intervals if intervals else math.nan
+    print_result(checks, coverage, intervals)
+    failed = checks.failed
+    if not coverage >= args.min_coverage:
+        failed.append('stratified means coverage')
+    if failed:
+        print(f"Failed: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Color index over the shoe palettes.
+
+Every shoe has up to three colors (``dominant_color``, ``sub_color1`` and
+``sub_color2``). The index maps each color name to an integer id once and
+stores each shoe's palette two ways:
+
+* the id triple, one column per slot (-1 for a missing color),
+* a bitset with one bit per color, packed into 64-bit words.
+
+From these it precomputes a posting list per color (the shoes that have
+the color in any slot) and the color co-occurrence matrix (shoes that
+have both colors). Color filters, co-occurrence counts and similar-palette
+queries then reduce to bit operations and integer lookups instead of
+string scans over the three columns.
+"""
+import numpy as np
+import pandas as pd
+
+import schema
+
+COLOR_COLUMNS = ['dominant_color', 'sub_color1', 'sub_color2']
+
+WORD_BITS = 64
+
+
+def _distinct_per_row(codes):
+    """Codes with repeats within a row set to -1, so a color counts once per shoe"""
+    codes = np.sort(codes, axis=1)
+    repeated = np.zeros(codes.shape, dtype=bool)
+    repeated[:, 1:] = codes[:, 1:] == codes[:, :-1]
+    return np.where(repeated, -1, codes)
+
+
+def _pair_counts(codes, size):
+    """size x size matrix of rows holding both colors; the diagonal counts rows per color"""
+    codes = _distinct_per_row(codes)
+    counts = np.zeros(size * size, dtype=np.int64)
+    slots = codes.shape[1]
+    for first in range(slots):
+        for second in range(slots):
+            a, b = codes[:, first], codes[:, second]
+            valid = (a >= 0) & (b >= 0)
+            counts += np.bincount(a[valid] * size + b[valid], minlength=size * size)
+    return counts.reshape(size, size)
+
+
+# Set bits per byte value, for NumPy releases before 2.0 (no np.bitwise_count)
+_BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1, dtype=np.uint8)
+
+
+def _popcount(words):
+    """Set bits per row of uint64 words"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return _BYTE_BITS[np.ascontiguousarray(words).view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+class ColorIndex:
+    """Integer ids, bitset palettes, posting lists and co-occurrence counts for the shoe colors"""
+
+    def __init__(self, colors, codes, columns):
+        self.colors = colors
+        self.codes = codes
+        self.columns = list(columns)
+        size = len(colors)
+
+        # Palette bitsets: bit c of word c // 64 is set when the shoe has color c
+        self.words = max(1, -(-size // WORD_BITS))
+        self.palettes = np.zeros((len(codes), self.words), dtype=np.uint64)
+        for slot in range(codes.shape[1]):
+            rows = np.flatnonzero(codes[:, slot] >= 0)
+            color = codes[rows, slot]
+            bits = np.left_shift(np.uint64(1), (color % WORD_BITS).astype(np.uint64))
+            np.bitwise_or.at(self.palettes, (rows, color // WORD_BITS), bits)
+
+        # Posting lists in CSR layout: shoes with color c are postings[offsets[c]:offsets[c + 1]]
+        distinct = _distinct_per_row(codes)
+        rows = np.repeat(np.arange(len(codes)), distinct.shape[1])
+        flat = distinct.ravel()
+        order = np.argsort(flat, kind='stable')
+        order = order[flat[order] >= 0]
+        self.postings = rows[order]
+        self.offsets = np.searchsorted(flat[order], np.arange(size + 1))
+
+        self.cooccurrence = _pair_counts(codes, size)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, shoes_dim, columns=COLOR_COLUMNS):
+        """Index the color columns of a shoe table that are present"""
+        columns = [c for c in columns if c in shoes_dim.columns]
+        colors = set()
+        for column in columns:
+            colors.update(schema.value_counts(shoes_dim[column]).index.tolist())
+        colors = pd.Index(sorted(colors, key=str), name='color')
+        codes = np.column_stack([
+            colors.get_indexer(shoes_dim[column].astype(object)) for column in columns
+        ]).astype(np.int32) if columns else np.empty((len(shoes_dim), 0), dtype=np.int32)
+        return cls(colors, codes, columns)
+
+    def color_ids(self, colors):
+        """Ids of the known colors among ``colors``"""
+        ids = self.colors.get_indexer(pd.Index(list(colors), dtype=object))
+        return ids[ids >= 0]
+
+    def bitset(self, colors):
+        """Palette bitset holding ``colors``"""
+        words = np.zeros(self.words, dtype=np.uint64)
+        for color in self.color_ids(colors):
+            words[color // WORD_BITS] |= np.uint64(1) << np.uint64(color % WORD_BITS)
+        return words
+
+    def posting(self, color):
+        """Positions of the shoes with ``color`` in any slot"""
+        ids = self.color_ids([color])
+        if not len(ids):
+            return np.empty(0, dtype=np.int64)
+        return self.postings[self.offsets[ids[0]]:self.offsets[ids[0] + 1]]
+
+    def mask(self, colors, match='any'):
+        """Boolean mask of the shoes having any (or all) of ``colors`` in some slot"""
+        query = self.bitset(colors)
+        if match == 'all':
+            return ((self.palettes & query) == query).all(axis=1) & bool(query.any())
+        return (self.palettes & query).any(axis=1)
+
+    def indices(self, colors, match='any'):
+        return np.flatnonzero(self.mask(colors, match))
+
+    def slot_counts(self, positions=None):
+        """Shoes per color in each slot, one column per slot; colors that never occur are dropped"""
+        codes = self.codes if positions is None else self.codes[positions]
+        counts = pd.DataFrame({
+            column: np.bincount(codes[:, slot][codes[:, slot] >= 0], minlength=len(self.colors))
+            for slot, column in enumerate(self.columns)
+        }, index=self.colors)
+        return counts[counts.any(axis=1)]
+
+    def pair_counts(self, positions=None):
+        """Co-occurrence matrix of the shoes at ``positions``; the precomputed one for all shoes"""
+        if positions is None:
+            return self.cooccurrence
+        return _pair_counts(self.codes[positions], len(self.colors))
+
+    def cooccurrence_frame(self, positions=None, top=None):
+        """Co-occurrence counts as a frame over the ``top`` most frequent colors"""
+        counts = self.pair_counts(positions)
+        totals = np.diag(counts)
+        order = np.argsort(-totals, kind='stable')
+        order = order[totals[order] > 0]
+        if top is not None:
+            order = order[:top]
+        return pd.DataFrame(counts[np.ix_(order, order)], index=self.colors[order], columns=self.colors[order])
+
+    def similar(self, position, limit=10, positions=None):
+        """Shoes whose palettes are closest to the shoe at ``position`` (Jaccard over colors).
+
+        Returns positions and similarities, best first, leaving out the shoe
+        itself; ``positions`` restricts the candidates.
+        """
+        query = self.palettes[position]
+        candidates = np.arange(len(self)) if positions is None else np.asarray(positions)
+        candidates = candidates[candidates != position]
+        palettes = self.palettes[candidates]
+        shared = _popcount(palettes & query)
+        union = _popcount(palettes | query)
+        scores = np.divide(shared, union, out=np.zeros(len(candidates)), where=union > 0)
+        order = np.lexsort((candidates, -scores))
+        order = order[scores[order] > 0][:limit]
+        return candidates[order], scores[order]
@@ -0,0 +1,89 @@
+"""Price normalization into one reporting currency.
+
+Fact prices are listed in each country's own currency (``country_dim``
+maps ``country_code`` to ``currency``), so they cannot be compared or
+averaged across countries as they are. ``fx_rates.csv`` holds dated
+snapshots of the value of one unit of each currency in US dollars; the
+latest snapshot is used unless an earlier date is asked for.
+
+Conversion is one factor per country_dim row, gathered onto the fact
+rows through the star join's integer row index. Facts whose country has
+no known currency get NaN.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+FX_FILE = 'fx_rates.csv'
+BASE_CURRENCY = 'usd'
+
+SYMBOLS = {'usd': '$', 'euro': '€', 'pounds': '£'}
+
+
+class FxTable:
+    """One snapshot of exchange rates, as units of the base currency per unit"""
+
+    def __init__(self, rates, as_of, version):
+        self.rates = rates
+        self.as_of = as_of
+        self.version = version
+
+    @classmethod
+    def load(cls, path=FX_FILE, as_of=None):
+        """Rates of the latest snapshot on or before ``as_of`` (default: the latest)"""
+        with open(path, 'rb') as f:
+            content = f.read()
+        table = pd.read_csv(path, dtype={'as_of': str, 'currency': str})
+        dates = table['as_of'] if as_of is None else table['as_of'][table['as_of'] <= as_of]
+        if dates.empty:
+            raise ValueError(f"No exchange rates on or before {as_of} in {path}")
+        snapshot = table[table['as_of'] == dates.max()]
+        rates = snapshot.set_index('currency')['usd_per_unit'].astype('float64')
+        # The snapshot date plus a content hash, so edited rates get a new version
+        version = f"{dates.max()}-{hashlib.sha1(content).hexdigest()[:8]}"
+        return cls(rates, dates.max(), version)
+
+    @property
+    def currencies(self):
+        return sorted(self.rates.index)
+
+    def factors(self, currencies, target):
+        """Multipliers from each of ``currencies`` into ``target``, NaN where unknown"""
+        if target not in self.rates.index:
+            raise KeyError(f"No exchange rate for {target!r}")
+        return pd.Series(currencies).map(self.rates).to_numpy(dtype=np.float64) / self.rates[target]
+
+
+_loaded = {}
+
+
+def load_rates(data_dir='.', as_of=None):
+    """The FX table next to the data, reloaded when the file changes; None if absent"""
+    path = os.path.join(data_dir, FX_FILE)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, as_of)
+    if key not in _loaded:
+        for stale in [k for k in _loaded if k[0] == key[0]]:
+            del _loaded[stale]
+        _loaded[key] = FxTable.load(path, as_of)
+    return _loaded[key]
+
+
+def convert(prices, rows, factors):
+    """Prices times the factor of their dimension row; row -1 (no match) gives NaN"""
+    # Position -1 picks the appended NaN
+    gathered = np.append(np.asarray(factors, dtype=np.float64), np.nan)[rows]
+    return np.asarray(prices, dtype=np.float64) * gathered
+
+
+def format_price(value, currency=None):
+    """A price with its currency symbol; plain when prices are in mixed currencies"""
+    if currency is None:
+        return f"{value:,.2f}"
+    symbol = SYMBOLS.get(currency)
+    return f"{symbol}{value:,.2f}" if symbol else f"{value:,.2f} {currency}"
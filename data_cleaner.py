@@ -1,10 +1,26 @@
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import time
+
+# Time to first paint is measured from here
+run_started = time.perf_counter()
+
 import streamlit as st
-from datetime import datetime
 import os
-import numpy as np
+import pandas as pd
+
+import analytics
+import backends
+import chart_data
+import currency
+import data_store
+import instrumentation
+import lazy_views
+import precompute
+import result_cache
+import startup
+import timeseries
+
+# Plotly is imported when the first chart is built, after the header is drawn
+px = startup.LazyModule('plotly.express')
 
 # Set page configuration
 st.set_page_config(
@@ -14,17 +30,19 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-def load_data(file_path, file_name):
-    """Load data with error handling"""
+# Columns each table contributes to the tabs; None keeps every column
+TABLE_COLUMNS = {
+    'shoes_dim': None,  # Data Quality profiles every column
+    'shoes_fact': ['id', 'price', 'category', 'availability', 'date', 'country_code'],
+    'country_dim': ['country_code', 'currency', 'shoe_metric'],
+}
+
+def load_data(columns_by_table, version, backend):
+    """Load data with error handling; returns the dataset and the error message, if any"""
     try:
-        if not os.path.exists(file_path):
-            return None
-        df = pd.read_csv(file_path)
-        if df.empty:
-            return None
-        return df
+        return analytics.Dataset.load(columns_by_table, version=version, backend=backend), None
     except Exception as e:
-        return None
+        return analytics.Dataset(None, None, None, version=version), f"{type(e).__name__}: {e}"
 
 # Add custom CSS to improve the UI
 st.markdown("""
@@ -45,42 +63,90 @@ st.markdown("""
     div[data-testid="stMetricDelta"] {
         font-size: 1rem;
     }
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-    }
-    .stTabs [data-baseweb="tab"] {
-        padding: 8px 16px;
-        border-radius: 4px;
-    }
-    .stTabs [aria-selected="true"] {
-        background-color: #4CAF50;
-        color: white;
-    }
     </style>
     """, unsafe_allow_html=True)
 
-@st.cache_data(show_spinner=False)
-def get_data():
-    shoes_dim = load_data('shoes_dim.csv', 'shoes_dim.csv')
-    shoes_fact = load_data('shoes_fact.csv', 'shoes_fact.csv')
-    country_dim = load_data('country_dim.csv', 'country_dim.csv')
-    return shoes_dim, shoes_fact, country_dim
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_dataset(version, backend):
+    """Tables, filter engines and aggregate cubes, shared read-only by all sessions.
 
-# Load data silently
-shoes_dim, shoes_fact, country_dim = get_data()
+    ``version`` keys the cache to the data on disk; the fact cube is
+    persisted and updated incrementally by ingest.py. Out-of-core backends
+    keep the fact table on disk.
+    """
+    return load_data(TABLE_COLUMNS, version, backend)
 
-# Check if data loading was successful
-if shoes_dim is None or shoes_fact is None or country_dim is None:
-    st.error("Failed to load one or more required datasets. Please ensure all data files are present in the correct location.")
-    st.stop()
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    """Bounded cache of computed views, shared by all sessions"""
+    return result_cache.ResultCache(disk_dir=result_cache.DISK_DIR)
+
+@st.cache_resource(show_spinner=False)
+def get_views():
+    """The tabs' lazy views, memoized per view and shared by all sessions.
+
+    Common filter states are served from the payloads stored by precompute.py.
+    """
+    return lazy_views.ViewGraph(analytics.DASHBOARD_VIEWS, stored=precompute.load_view)
+
+def chart(build, *args, **kwargs):
+    """Build a Plotly Express figure, timed as its own step"""
+    with instrumentation.span('figure'):
+        return build(*args, **kwargs)
+
+def show_chart(fig):
+    """Render a figure; the time includes serializing it for the browser"""
+    with instrumentation.span('render'):
+        st.plotly_chart(fig, use_container_width=True)
+
+# Instrument this run; the switches live in the sidebar's Performance panel
+previous_profiler = st.session_state.pop('active_profiler', None)
+if previous_profiler is not None:
+    # A run that stopped early never reached the end of the script
+    previous_profiler.stop()
+tracer = instrumentation.Tracer().activate()
+profiler = instrumentation.Profiler(
+    cpu=st.session_state.get('profile_cpu', False),
+    memory=st.session_state.get('profile_memory', False)
+).start()
+st.session_state['active_profiler'] = profiler
 
-# Create header with logo and title
+# Draw the header before anything slow runs; the logo is served locally
 col1, col2 = st.columns([1, 4])
 with col1:
-    st.image("https://upload.wikimedia.org/wikipedia/commons/2/20/Adidas_Logo.svg", width=100)
+    st.image(startup.LOGO_PATH, width=100)
 with col2:
     st.title("👟 Adidas Data Analysis Dashboard")
     st.markdown("### Comprehensive Data Analysis and Insights")
+first_paint_ms = tracer.mark('first paint', run_started)
+# Only the first run of a fresh server process includes its startup
+if 'process_first_paint' not in st.session_state:
+    st.session_state['process_first_paint'] = startup.process_uptime()
+
+# Fact tables larger than memory are scanned from disk instead of loaded
+backend_options = backends.available()
+default_backend = backends.default_backend()
+backend_name = st.sidebar.selectbox(
+    "Execution Backend",
+    options=backend_options,
+    index=backend_options.index(default_backend) if default_backend in backend_options else 0,
+    help="pandas keeps the fact table in memory; arrow streams it from the Parquet store"
+)
+
+# Load data silently; new snapshots change the version and refresh the caches
+with tracer.span('load'), st.spinner("Loading data..."):
+    data_version = data_store.dataset_version()
+    dataset, load_error = get_dataset(data_version, backend_name)
+    results = get_result_cache()
+shoes_dim, country_dim = dataset.shoes_dim, dataset.country_dim
+
+# Check if data loading was successful
+if load_error is not None or dataset.missing_tables():
+    st.error("Failed to load one or more required datasets. Please ensure all data files are present in the correct location.")
+    if load_error is not None:
+        st.error(load_error)
+    st.stop()
+fact_columns = dataset.fact_columns
 
 # Display dataset information in sidebar
 with st.sidebar:
@@ -93,7 +159,7 @@ with st.sidebar:
     cols[1].write(f"{shoes_dim.shape[0]} rows")
     cols = st.columns(2)
     cols[0].write("Shoes Facts")
-    cols[1].write(f"{shoes_fact.shape[0]} rows")
+    cols[1].write(f"{dataset.table_rows('shoes_fact'):,} rows")
     cols = st.columns(2)
     cols[0].write("Country Dimension")
     cols[1].write(f"{country_dim.shape[0]} rows")
@@ -111,105 +177,164 @@ with st.sidebar:
             default=sorted(shoes_dim['gender'].unique())
         )
     
-    # Price range filter
-    if 'price' in shoes_fact.columns:
+    # Prices are listed in each country's currency; converting makes them comparable
+    reporting_currency = None
+    if 'price' in fact_columns and dataset.fx is not None:
+        currency_options = ["Listed prices"] + dataset.fx.currencies
+        currency_choice = st.selectbox(
+            "Reporting Currency",
+            options=currency_options,
+            help=f"Convert all prices at the rates of {dataset.fx.as_of}"
+        )
+        if currency_choice != "Listed prices":
+            reporting_currency = currency_choice
+    price_unit = currency.SYMBOLS.get(reporting_currency, reporting_currency or "listed")
+    
+    # Price range filter, in the reporting currency
+    if 'price' in fact_columns:
+        price_min, price_max = dataset.value_range('price', reporting_currency)
         price_range = st.slider(
-            "Price Range ($)",
-            min_value=float(shoes_fact['price'].min()),
-            max_value=float(shoes_fact['price'].max()),
-            value=(float(shoes_fact['price'].min()), float(shoes_fact['price'].max()))
+            f"Price Range ({price_unit})",
+            min_value=price_min,
+            max_value=price_max,
+            value=(price_min, price_max)
         )
     
     # Category filter
-    if 'category' in shoes_fact.columns:
+    if 'category' in fact_columns:
         selected_categories = st.multiselect(
             "Category",
-            options=sorted(shoes_fact['category'].unique()),
-            default=sorted(shoes_fact['category'].unique())
+            options=dataset.column_values('category'),
+            default=dataset.column_values('category')
         )
     
+    # Usage category filter; empty keeps every usage category
+    if 'best_for_wear' in shoes_dim.columns:
+        selected_wear = st.multiselect(
+            "Best For",
+            options=dataset.column_values('best_for_wear'),
+            help="Leave empty to include all usage categories"
+        )
+    
+    # Matches a color in any of the three slots, answered by the color index
+    if 'dominant_color' in shoes_dim.columns:
+        selected_colors = st.multiselect(
+            "Contains Color",
+            options=dataset.column_values(analytics.COLOR_FILTER),
+            help="Keep shoes with any of these colors as dominant or sub color; leave empty for all"
+        )
+    
+    # Country attributes reach the facts through the star join
+    if 'currency' in country_dim.columns:
+        selected_currencies = st.multiselect(
+            "Currency",
+            options=dataset.column_values('currency'),
+            help="Leave empty to include every country"
+        )
+    
+    # Sketch-based estimates keep the heavy views fast on very large fact tables;
+    # the sketches are built from the in-memory facts
+    approximate_mode = st.checkbox(
+        "Approximate mode",
+        disabled=not dataset.backend.in_memory,
+        help="Estimate price statistics, distinct products and top colors from precomputed sketches, with error bounds"
+    )
+    
     st.markdown("---")
     
     # Add data preview section
     if st.checkbox("Show Data Preview"):
         st.subheader("Data Preview")
-        dataset = st.selectbox(
+        preview_table = st.selectbox(
             "Select Dataset",
             ["Shoes Dimension", "Shoes Facts", "Country Dimension"]
         )
         
-        if dataset == "Shoes Dimension":
+        if preview_table == "Shoes Dimension":
             st.dataframe(shoes_dim.head(), use_container_width=True)
-        elif dataset == "Shoes Facts":
-            st.dataframe(shoes_fact.head(), use_container_width=True)
+        elif preview_table == "Shoes Facts":
+            st.dataframe(analytics.filter_facts(dataset, {}, limit=5), use_container_width=True)
         else:
             st.dataframe(country_dim.head(), use_container_width=True)
 
-# Apply filters
-filtered_shoes_dim = shoes_dim.copy()
-filtered_shoes_fact = shoes_fact.copy()
-
+# Collect the filter state; every report below takes it as its only input
+filter_state = {}
 if 'gender' in shoes_dim.columns and selected_genders:
-    filtered_shoes_dim = filtered_shoes_dim[filtered_shoes_dim['gender'].isin(selected_genders)]
+    filter_state['gender'] = selected_genders
+if 'price' in fact_columns:
+    filter_state['price'] = price_range
+if 'category' in fact_columns and selected_categories:
+    filter_state['category'] = selected_categories
+if 'best_for_wear' in shoes_dim.columns and selected_wear:
+    filter_state['best_for_wear'] = selected_wear
+if 'dominant_color' in shoes_dim.columns and selected_colors:
+    filter_state[analytics.COLOR_FILTER] = selected_colors
+if 'currency' in country_dim.columns and selected_currencies:
+    filter_state['currency'] = selected_currencies
+if reporting_currency is not None:
+    filter_state[analytics.REPORTING_CURRENCY] = reporting_currency
+if approximate_mode:
+    filter_state[analytics.APPROXIMATE_MODE] = True
 
-if 'price' in shoes_fact.columns:
-    filtered_shoes_fact = filtered_shoes_fact[
-        (filtered_shoes_fact['price'] >= price_range[0]) &
-        (filtered_shoes_fact['price'] <= price_range[1])
-    ]
+with tracer.span('filter'):
+    # Equivalent selections (e.g. every gender ticked) share one cache key
+    filter_state = analytics.canonical_state(dataset, filter_state)
+    
+    # Filtered shoes are row selections, not copies; charts read the cubes
+    filtered_shoes_dim = analytics.filter_shoes(dataset, filter_state)
+
+# Each tab is a lazy view: only the selected tab runs, and only when the
+# filters and tables it reads changed
+views = get_views()
+TABS = {
+    "📊 Basic Statistics": "Basic Statistics",
+    "🔍 Data Quality": "Data Quality",
+    "💰 Price Analysis": "Price Analysis",
+    "🌍 Geographic Analysis": "Geographic Analysis",
+    "🎯 Market Insights": "Market Insights",
+}
 
-if 'category' in shoes_fact.columns and selected_categories:
-    filtered_shoes_fact = filtered_shoes_fact[filtered_shoes_fact['category'].isin(selected_categories)]
+if approximate_mode and not analytics.approximable(filter_state):
+    st.info("Approximate mode covers filters on gender, category, country, currency and price; this view is exact.")
 
 try:
-    # Create tabs for different analyses
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📊 Basic Statistics", 
-        "🔍 Data Quality", 
-        "💰 Price Analysis", 
-        "🌍 Geographic Analysis",
-        "🎯 Market Insights"
-    ])
-
-    with tab1:
+    active_tab = st.radio("View", list(TABS), horizontal=True, label_visibility="collapsed", key='active_tab')
+    tab_started = time.perf_counter()
+    
+    if active_tab == "📊 Basic Statistics":
         st.header("Basic Statistics")
+        payload = views.get('basic_statistics', dataset, filter_state)
+        summary = payload['summary']
+        error_bounds = payload.get('error_bounds', {})
         
         # Add summary metrics at the top
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            total_products = len(filtered_shoes_dim)
-            delta_products = ((total_products - len(shoes_dim)) / len(shoes_dim)) * 100
+            total_products = summary['total_products']
             st.metric(
                 "Total Products",
                 f"{total_products:,}",
-                f"{delta_products:.1f}% from total"
+                f"{summary['product_delta']:.1f}% from total"
             )
             
         with col2:
-            total_countries = len(country_dim)
-            st.metric("Total Countries", f"{total_countries:,}")
+            st.metric("Total Countries", f"{summary['total_countries']:,}")
             
         with col3:
-            if 'price' in filtered_shoes_fact.columns:
-                avg_price = filtered_shoes_fact['price'].mean()
-                overall_avg = shoes_fact['price'].mean()
-                price_delta = ((avg_price - overall_avg) / overall_avg) * 100
+            if 'avg_price' in summary:
                 st.metric(
                     "Average Price",
-                    f"${avg_price:.2f}",
-                    f"{price_delta:+.1f}% from overall"
+                    currency.format_price(summary['avg_price'], reporting_currency),
+                    f"{summary['price_delta']:+.1f}% from overall"
                 )
                 
         with col4:
-            if 'availability' in filtered_shoes_fact.columns:
-                available = filtered_shoes_fact['availability'].sum()
-                total_available = shoes_fact['availability'].sum()
-                avail_delta = ((available - total_available) / total_available) * 100
+            if 'available' in summary:
                 st.metric(
                     "Available Products",
-                    f"{available:,}",
-                    f"{avail_delta:+.1f}% from total"
+                    f"{summary['available']:,}",
+                    f"{summary['availability_delta']:+.1f}% from total"
                 )
         
         st.markdown("---")
@@ -219,8 +344,9 @@ try:
         with col1:
             if 'gender' in filtered_shoes_dim.columns:
                 st.subheader("Gender Distribution")
-                gender_dist = filtered_shoes_dim['gender'].value_counts()
-                fig_gender = px.pie(
+                gender_dist = payload['gender_distribution']
+                fig_gender = chart(
+                    px.pie,
                     values=gender_dist.values,
                     names=gender_dist.index,
                     title="Gender Distribution",
@@ -228,18 +354,19 @@ try:
                     color_discrete_sequence=px.colors.qualitative.Set3
                 )
                 fig_gender.update_traces(textinfo='percent+label')
-                st.plotly_chart(fig_gender, use_container_width=True)
+                show_chart(fig_gender)
                 
                 # Add gender statistics
                 st.markdown("**Gender Breakdown:**")
                 for gender, count in gender_dist.items():
-                    st.write(f"- {gender}: {count:,} ({count/len(filtered_shoes_dim)*100:.1f}%)")
+                    st.write(f"- {gender}: {count:,} ({count/total_products*100:.1f}%)")
             
         with col2:
-            if 'category' in filtered_shoes_fact.columns:
+            if 'category' in fact_columns:
                 st.subheader("Category Distribution")
-                cat_dist = filtered_shoes_fact['category'].value_counts()
-                fig_cat = px.pie(
+                cat_dist = payload['category_distribution']
+                fig_cat = chart(
+                    px.pie,
                     values=cat_dist.values,
                     names=cat_dist.index,
                     title="Category Distribution",
@@ -247,36 +374,69 @@ try:
                     color_discrete_sequence=px.colors.qualitative.Set3
                 )
                 fig_cat.update_traces(textinfo='percent+label')
-                st.plotly_chart(fig_cat, use_container_width=True)
+                show_chart(fig_cat)
                 
                 # Add category statistics
                 st.markdown("**Category Breakdown:**")
                 for cat, count in cat_dist.items():
-                    st.write(f"- {cat}: {count:,} ({count/len(filtered_shoes_fact)*100:.1f}%)")
+                    st.write(f"- {cat}: {count:,} ({count/summary['fact_rows']*100:.1f}%)")
+        
+        st.markdown("---")
+        
+        # Stock across the catalog: distinct shoes and fact rows per color
+        col1, col2 = st.columns([1, 2])
+        
+        with col1:
+            if 'distinct_products' in payload:
+                prefix = "≈ " if payload['approximate'] else ""
+                st.metric(
+                    "Products in Stock",
+                    f"{prefix}{payload['distinct_products']:,}",
+                    help="Distinct shoes among the filtered fact rows"
+                )
+                if 'distinct_products' in error_bounds:
+                    st.caption(f"±{error_bounds['distinct_products']:.1%} (one standard error)")
+            elif payload['approximate']:
+                st.caption("Distinct products and colors are not estimated within a price range.")
+        
+        with col2:
+            if 'stocked_colors' in payload:
+                stocked_colors = payload['stocked_colors']
+                fig_stock = chart(
+                    px.bar,
+                    x=stocked_colors.index,
+                    y=stocked_colors.values,
+                    title="Top Colors in Stock",
+                    labels={'x': 'Color', 'y': 'Fact Rows'}
+                )
+                show_chart(fig_stock)
+                if 'stocked_colors' in error_bounds:
+                    st.caption(f"Estimates exceed the true counts by at most {error_bounds['stocked_colors']:,.0f} rows (98% confidence)")
         
         st.markdown("---")
         
         # Time series analysis if date is available
-        if 'date' in filtered_shoes_fact.columns:
+        if 'date' in fact_columns:
             st.subheader("Products Over Time")
             
             try:
-                # Convert date to datetime using ISO format
-                filtered_shoes_fact['date'] = pd.to_datetime(
-                    filtered_shoes_fact['date'],
-                    format='%Y-%m-%d'  # ISO format YYYY-MM-DD
-                )
+                # Daily counts from the cube, spread onto a dense calendar grid
+                daily_series = payload['daily_counts']
                 
-                # Group by date and count products
-                daily_products = filtered_shoes_fact.groupby('date').size().reset_index(name='count')
-                daily_products = daily_products.sort_values('date')
+                # Wide ranges are down-sampled to weekly or monthly totals
+                resolutions = {"Auto": None, "Daily": 'D', "Weekly": 'W', "Monthly": 'M'}
+                resolution_choice = st.radio("Resolution", list(resolutions), horizontal=True)
+                resolution = resolutions[resolution_choice] or daily_series.auto_resolution()
+                period_name = {'D': "Daily", 'W': "Weekly", 'M': "Monthly"}[resolution]
+                period_products = chart_data.downsample(analytics.period_counts(daily_series, resolution), 'date', 'count')
                 
                 # Create time series plot
-                fig_time = px.line(
-                    daily_products,
+                fig_time = chart(
+                    px.line,
+                    period_products,
                     x='date',
                     y='count',
-                    title="Daily Product Count",
+                    title=f"{period_name} Product Count",
                     labels={'count': 'Number of Products', 'date': 'Date'}
                 )
                 
@@ -308,37 +468,45 @@ try:
                     )
                 )
                 
-                st.plotly_chart(fig_time, use_container_width=True)
+                show_chart(fig_time)
                 
-                # Add summary statistics
+                # Add summary statistics over the days that have products
                 st.markdown("**Time Series Statistics:**")
+                daily_stats = analytics.daily_statistics(daily_series)
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
                     st.metric(
                         "Average Daily Products",
-                        f"{daily_products['count'].mean():.0f}"
+                        f"{daily_stats['average_daily']:.0f}"
                     )
                 
                 with col2:
                     st.metric(
                         "Maximum Daily Products",
-                        f"{daily_products['count'].max():.0f}"
+                        f"{daily_stats['maximum_daily']:.0f}"
                     )
                 
                 with col3:
                     st.metric(
                         "Total Days",
-                        f"{len(daily_products):,}"
+                        f"{daily_stats['active_days']:,}"
                     )
                 
+                # Totals for the range-selector windows, from the cumulative sum
+                window_cols = st.columns(len(timeseries.WINDOWS))
+                for window_col, (label, total) in zip(window_cols, daily_stats['window_totals'].items()):
+                    window_col.metric(f"Products in last {label}", f"{total:,}")
+                
                 # Add trend analysis
-                if len(daily_products) > 1:
+                if daily_stats['active_days'] > 1:
                     st.markdown("**Trend Analysis:**")
-                    # Calculate rolling average
-                    daily_products['7_day_avg'] = daily_products['count'].rolling(window=7).mean()
+                    # Calendar-day moving average, averaged per period when down-sampled
+                    daily_products = analytics.trend_frame(daily_series, resolution)
+                    daily_products = chart_data.downsample(daily_products, 'date', ['count', '7_day_avg'])
                     
-                    fig_trend = px.line(
+                    fig_trend = chart(
+                        px.line,
                         daily_products,
                         x='date',
                         y=['count', '7_day_avg'],
@@ -364,7 +532,7 @@ try:
                         plot_bgcolor='white',
                         legend_title="Metric"
                     )
-                    st.plotly_chart(fig_trend, use_container_width=True)
+                    show_chart(fig_trend)
                 
             except Exception as e:
                 st.error(f"Error processing time series data: {str(e)}")
@@ -372,114 +540,183 @@ try:
         else:
             st.warning("Date information not available in the dataset")
 
-    with tab2:
+    elif active_tab == "🔍 Data Quality":
         st.header("Data Quality Analysis")
         
-        # Missing values analysis
-        missing_shoes = filtered_shoes_dim.isnull().sum()
-        missing_pct_shoes = (missing_shoes / len(filtered_shoes_dim)) * 100
+        # One chunked profiling pass feeds every section of this tab
+        quality = views.get('data_quality', dataset, filter_state)
+        missing_shoes = quality.null_counts
         
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("Missing Values Summary")
-            missing_df = pd.DataFrame({
-                'Missing Count': missing_shoes,
-                'Missing Percentage': missing_pct_shoes.round(2)
-            })
-            st.dataframe(missing_df, use_container_width=True)
+            st.dataframe(quality.column_frame(), use_container_width=True)
             
             # Data completeness score
-            completeness = (1 - missing_shoes.sum() / (len(filtered_shoes_dim) * len(filtered_shoes_dim.columns))) * 100
-            st.metric("Data Completeness Score", f"{completeness:.2f}%")
+            st.metric("Data Completeness Score", f"{quality.completeness:.2f}%")
 
         with col2:
-            fig = px.bar(
+            fig = chart(
+                px.bar,
                 x=missing_shoes.index,
                 y=missing_shoes.values,
                 title="Missing Values by Column"
             )
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig)
 
         # Duplicate analysis
         st.subheader("Duplicate Analysis")
-        duplicates = filtered_shoes_dim.duplicated().sum()
-        st.metric("Duplicate Records", duplicates)
+        st.metric(
+            "Duplicate Records",
+            quality.duplicate_rows,
+            help=None if quality.duplicates_exact else "Estimated with a Bloom filter"
+        )
+        
+        # The same model under other ids, names or colorways, clustered with MinHash/LSH
+        near_duplicates = views.get('near_duplicates', dataset, filter_state)
+        variant_summary = near_duplicates['summary']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Models", f"{variant_summary['clusters']:,}",
+                    help="Clusters of shoes sharing an id, an image or a near-identical name")
+        col2.metric("Colorways", f"{variant_summary['variants']:,}")
+        col3.metric("Near-Duplicate Records", f"{variant_summary['duplicate_rows']:,}",
+                    help="Rows repeating a model in a palette already listed")
+        if len(near_duplicates['clusters']) > 0:
+            st.write("Largest model clusters:")
+            st.dataframe(near_duplicates['clusters'], use_container_width=True, hide_index=True)
         
         # Data consistency check
         st.subheader("Data Consistency Check")
         if 'gender' in filtered_shoes_dim.columns:
-            invalid_gender = filtered_shoes_dim[~filtered_shoes_dim['gender'].isin(['M', 'W', 'U', 'K'])]['gender'].unique()
+            invalid_gender = quality.invalid_samples.get('gender', [])
             st.write("Invalid gender values:", invalid_gender if len(invalid_gender) > 0 else "None")
         else:
             st.warning("Gender data not available for consistency check")
+        
+        # Whole-table profiles stream from the columnar store in bounded memory
+        st.subheader("Full Table Profile")
+        profile_tables = {
+            "Shoes Dimension": 'shoes_dim',
+            "Shoes Facts": 'shoes_fact',
+            "Country Dimension": 'country_dim',
+        }
+        profile_choice = st.selectbox("Table to profile", list(profile_tables))
+        if st.button("Run profile"):
+            table_name = profile_tables[profile_choice]
+            table_quality = results.get_or_compute(
+                data_version, 'table_profile', {'table': table_name},
+                lambda: analytics.table_quality_report(table_name),
+                persist=True
+            )
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Rows", f"{table_quality.rows:,}")
+            col2.metric("Completeness", f"{table_quality.completeness:.2f}%")
+            col3.metric(
+                "Duplicate Records",
+                f"{table_quality.duplicate_rows:,}",
+                help=None if table_quality.duplicates_exact else "Estimated with a Bloom filter"
+            )
+            st.dataframe(table_quality.column_frame(), use_container_width=True)
 
-    with tab3:
+    elif active_tab == "💰 Price Analysis":
         st.header("Price Analysis")
+        payload = views.get('price_analysis', dataset, filter_state)
+        error_bounds = payload.get('error_bounds', {})
         
-        if 'price' in filtered_shoes_fact.columns:
+        if 'price' in fact_columns:
             col1, col2 = st.columns(2)
             
             with col1:
-                # Price distribution
-                fig_price = px.histogram(
-                    filtered_shoes_fact,
-                    x='price',
+                # Price distribution, binned server-side from the cube's cent buckets
+                price_hist = payload['price_histogram']
+                fig_price = chart(
+                    px.bar,
+                    price_hist,
+                    x='bin_center',
+                    y='count',
+                    error_y='error' if 'error' in price_hist.columns else None,
                     title="Price Distribution",
-                    nbins=30
+                    labels={'bin_center': 'price', 'count': 'count'},
+                    hover_data={'bin_start': ':.2f', 'bin_end': ':.2f'}
                 )
-                st.plotly_chart(fig_price, use_container_width=True)
+                fig_price.update_layout(bargap=0)
+                show_chart(fig_price)
                 
                 # Price statistics
                 st.write("Price Statistics:")
-                st.dataframe(filtered_shoes_fact['price'].describe().round(2), use_container_width=True)
+                st.dataframe(payload['price_statistics'].round(2), use_container_width=True)
+                if 'rank_error' in error_bounds:
+                    st.caption(
+                        f"Estimated from sketches: quantiles and bin counts are within ±{error_bounds['rank_error']:.1%} "
+                        "of the rows (99% confidence); count, mean and std are exact unless a price range is set."
+                    )
 
             with col2:
                 # Price by category
-                if 'category' in filtered_shoes_fact.columns:
-                    avg_price_cat = filtered_shoes_fact.groupby('category')['price'].mean().sort_values(ascending=False)
-                    fig_price_cat = px.bar(
+                if 'category' in fact_columns:
+                    avg_price_cat = payload['average_price_by_category']
+                    category_errors = error_bounds.get('average_price_by_category')
+                    fig_price_cat = chart(
+                        px.bar,
                         x=avg_price_cat.index,
                         y=avg_price_cat.values,
+                        error_y=None if category_errors is None else category_errors.reindex(avg_price_cat.index).values,
                         title="Average Price by Category"
                     )
-                    st.plotly_chart(fig_price_cat, use_container_width=True)
+                    show_chart(fig_price_cat)
+                    if category_errors is not None:
+                        st.caption("Estimated from stratified samples; bars show 95% confidence intervals.")
         else:
             st.warning("Price data not available in the dataset")
 
-    with tab4:
+    elif active_tab == "🌍 Geographic Analysis":
         st.header("Geographic Analysis")
+        payload = views.get('geographic_analysis', dataset, filter_state)
         
         # Country distribution
         st.subheader("Country Distribution")
-        country_stats = pd.DataFrame({
-            'Currency': country_dim['currency'].value_counts(),
-            'Shoe Metric': country_dim['shoe_metric'].value_counts()
-        })
+        country_stats = payload['country_summary']
         st.dataframe(country_stats, use_container_width=True)
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Currency distribution
-            fig_currency = px.pie(
-                values=country_dim['currency'].value_counts(),
-                names=country_dim['currency'].value_counts().index,
+            fig_currency = chart(
+                px.pie,
+                values=country_stats['Currency'].dropna(),
+                names=country_stats['Currency'].dropna().index,
                 title="Currency Distribution"
             )
-            st.plotly_chart(fig_currency, use_container_width=True)
+            show_chart(fig_currency)
             
         with col2:
             # Shoe metric distribution
-            fig_metric = px.pie(
-                values=country_dim['shoe_metric'].value_counts(),
-                names=country_dim['shoe_metric'].value_counts().index,
+            fig_metric = chart(
+                px.pie,
+                values=country_stats['Shoe Metric'].dropna(),
+                names=country_stats['Shoe Metric'].dropna().index,
                 title="Shoe Metric Distribution"
             )
-            st.plotly_chart(fig_metric, use_container_width=True)
+            show_chart(fig_metric)
+        
+        # Joined view: fact prices by the shoe's gender and the fact's country
+        if 'price_by_gender_country' in payload:
+            st.subheader("Average Price by Gender per Country")
+            price_gender_country = payload['price_by_gender_country']
+            fig_price_country = chart(
+                px.bar,
+                price_gender_country,
+                barmode='group',
+                title="Average Price by Gender per Country",
+                labels={'value': f"Average Price ({price_unit})", 'country_code': 'Country', 'gender': 'Gender'}
+            )
+            show_chart(fig_price_country)
 
-    with tab5:
+    elif active_tab == "🎯 Market Insights":
         st.header("Market Insights")
+        payload = views.get('market_insights', dataset, filter_state)
         
         # Product mix analysis
         st.subheader("Product Mix Analysis")
@@ -488,43 +725,106 @@ try:
         
         with col1:
             if 'gender' in filtered_shoes_dim.columns and 'best_for_wear' in filtered_shoes_dim.columns:
-                gender_usage = pd.crosstab(filtered_shoes_dim['gender'], filtered_shoes_dim['best_for_wear'])
-                fig_gender_usage = px.bar(
+                gender_usage = payload['gender_usage']
+                fig_gender_usage = chart(
+                    px.bar,
                     gender_usage,
                     title="Gender Mix by Usage Category",
                     labels={'value': 'Count', 'gender': 'Gender'}
                 )
-                st.plotly_chart(fig_gender_usage, use_container_width=True)
+                show_chart(fig_gender_usage)
             else:
                 st.warning("Gender or usage category data not available")
 
         with col2:
             if 'dominant_color' in filtered_shoes_dim.columns and 'gender' in filtered_shoes_dim.columns:
-                color_gender = pd.crosstab(filtered_shoes_dim['dominant_color'], filtered_shoes_dim['gender'])
-                fig_color_gender = px.bar(
+                color_gender = payload['color_gender']
+                fig_color_gender = chart(
+                    px.bar,
                     color_gender.head(10),
                     title="Top 10 Colors by Gender",
                     labels={'value': 'Count', 'dominant_color': 'Color'}
                 )
-                st.plotly_chart(fig_color_gender, use_container_width=True)
+                show_chart(fig_color_gender)
             else:
                 st.warning("Color or gender data not available")
 
+        # Palette co-occurrence, precomputed by the color index
+        if 'color_cooccurrence' in payload:
+            st.subheader("Color Combinations")
+            cooccurrence = payload['color_cooccurrence']
+            fig_cooccurrence = chart(
+                px.imshow,
+                cooccurrence,
+                text_auto=True,
+                color_continuous_scale='Blues',
+                title="Shoes Sharing Both Colors (Top 15 Colors)",
+                labels={'x': 'Color', 'y': 'Color', 'color': 'Shoes'}
+            )
+            show_chart(fig_cooccurrence)
+
         # Trend analysis
         st.subheader("Product Categories Over Time")
         if 'release_date' in filtered_shoes_dim.columns and 'best_for_wear' in filtered_shoes_dim.columns:
-            timeline = filtered_shoes_dim.groupby(['release_date', 'best_for_wear']).size().reset_index(name='count')
-            fig_timeline = px.line(
+            timeline = views.get('release_timeline', dataset, filter_state)
+            timeline = chart_data.downsample(timeline, 'release_date', 'count', group='best_for_wear')
+            fig_timeline = chart(
+                px.line,
                 timeline,
                 x='release_date',
                 y='count',
                 color='best_for_wear',
                 title="Product Categories Timeline"
             )
-            st.plotly_chart(fig_timeline, use_container_width=True)
+            show_chart(fig_timeline)
         else:
             st.warning("Release date or usage category data not available")
+    
+    tracer.mark(TABS[active_tab], tab_started)
 
 except Exception as e:
     st.error(f"An error occurred while processing the data: {str(e)}")
     st.info("Please check the data format and try again.")
+
+# Performance panel: this run's spans, cache effectiveness and optional profiles
+profiler.stop()
+st.session_state.pop('active_profiler', None)
+trace_file = os.environ.get(instrumentation.TRACE_FILE_ENV)
+if trace_file:
+    tracer.export_jsonl(trace_file)
+
+with st.sidebar.expander("Performance"):
+    show_timings = st.checkbox("Show timings", key='show_timings')
+    st.checkbox("Profile with cProfile", key='profile_cpu')
+    st.checkbox("Track allocations (tracemalloc)", key='profile_memory')
+    
+    if show_timings:
+        st.write(f"First paint: {first_paint_ms:.0f} ms into this run")
+        process_first_paint = st.session_state.get('process_first_paint')
+        if process_first_paint is not None:
+            st.write(f"Session's first paint: {process_first_paint:.1f} s after the server process started")
+        st.write(f"Memory (RSS): {instrumentation.current_rss() / 2**20:.0f} MB")
+        st.dataframe(tracer.summary().round(1), use_container_width=True)
+        
+        cache_stats = results.stats()
+        st.write(f"Cache entries: {cache_stats['entries']:,} ({cache_stats['bytes'] / 2**20:.1f} of {cache_stats['max_bytes'] / 2**20:.0f} MB)")
+        st.write(f"Cache hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']:,} memory, {cache_stats['disk_hits']:,} disk, {cache_stats['misses']:,} misses)")
+        st.write(f"Cache evictions: {cache_stats['evictions']:,}")
+        
+        view_stats = pd.DataFrame(views.stats()).T
+        st.write("Tab views (memo hits and runs since the server started):")
+        st.dataframe(view_stats, use_container_width=True)
+        
+        st.download_button(
+            "Download trace (JSONL)",
+            tracer.to_jsonl(),
+            file_name=f"trace-{tracer.run}.jsonl",
+            mime="application/jsonl"
+        )
+    
+    if profiler.stats_text:
+        st.text("cProfile (cumulative time)")
+        st.code(profiler.stats_text)
+    if profiler.allocations is not None:
+        st.text(f"Top allocations (peak {profiler.allocations.attrs['peak_kb'] / 1024:.1f} MB)")
+        st.dataframe(profiler.allocations.round(1), use_container_width=True)
@@ -0,0 +1,164 @@
+"""Chunked data-quality profiling for the three tables.
+
+``QualityProfiler`` consumes a table chunk by chunk and keeps only fixed
+or slowly growing state: null counts, row hashes for duplicate detection,
+a HyperLogLog per column for cardinality and a sample of out-of-domain
+values. The resulting ``QualityReport`` backs both the dashboard's Data
+Quality tab and the notebook.
+
+Duplicate rows are counted exactly from 64-bit row hashes until
+``max_exact_rows`` distinct rows have been seen; beyond that the profiler
+switches to a Bloom filter, so memory stays bounded and the count becomes
+an estimate (it can only over-count, by roughly the filter's error rate).
+"""
+import numpy as np
+import pandas as pd
+
+import data_store
+import schema
+import sketches
+
+# Column -> function returning True for valid (or missing) values
+DOMAIN_CHECKS = {
+    'gender': lambda values: values.isin(schema.GENDERS),
+    'price': lambda values: values >= 0,
+    'availability': lambda values: values >= 0,
+}
+
+MAX_EXACT_ROWS = 5_000_000
+BLOOM_CAPACITY = 50_000_000
+BLOOM_ERROR_RATE = 0.01
+MAX_INVALID_SAMPLES = 10
+
+
+class QualityReport:
+    """Result of profiling one table"""
+
+    def __init__(self, rows, null_counts, duplicate_rows, duplicates_exact, distinct_counts,
+                 invalid_counts, invalid_samples):
+        self.rows = rows
+        self.null_counts = null_counts
+        self.duplicate_rows = duplicate_rows
+        self.duplicates_exact = duplicates_exact
+        self.distinct_counts = distinct_counts
+        self.invalid_counts = invalid_counts
+        self.invalid_samples = invalid_samples
+
+    @property
+    def null_percentages(self):
+        if self.rows == 0:
+            return self.null_counts.astype(float)
+        return self.null_counts / self.rows * 100
+
+    @property
+    def completeness(self):
+        """Share of non-missing cells, in percent"""
+        cells = self.rows * len(self.null_counts)
+        return 100.0 if cells == 0 else (1 - self.null_counts.sum() / cells) * 100
+
+    def missing_frame(self):
+        return pd.DataFrame({
+            'Missing Count': self.null_counts,
+            'Missing Percentage': self.null_percentages.round(2),
+        })
+
+    def column_frame(self):
+        """Per-column summary: missing values, cardinality and domain violations"""
+        return pd.DataFrame({
+            'Missing Count': self.null_counts,
+            'Missing Percentage': self.null_percentages.round(2),
+            'Distinct (approx.)': self.distinct_counts,
+            'Invalid Values': pd.Series(self.invalid_counts, dtype='Int64').reindex(self.null_counts.index),
+        })
+
+
+class QualityProfiler:
+    """Accumulates quality statistics over chunks of one table"""
+
+    def __init__(self, max_exact_rows=MAX_EXACT_ROWS, bloom_capacity=BLOOM_CAPACITY,
+                 bloom_error_rate=BLOOM_ERROR_RATE, domain_checks=None):
+        self.max_exact_rows = max_exact_rows
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.domain_checks = DOMAIN_CHECKS if domain_checks is None else domain_checks
+        self.rows = 0
+        self.null_counts = None
+        self.duplicate_rows = 0
+        self.invalid_counts = {}
+        self.invalid_samples = {}
+        self._seen = np.empty(0, dtype=np.uint64)
+        self._bloom = None
+        self._cardinality = {}
+
+    def _count_duplicates(self, hashes):
+        unique = np.unique(hashes)
+        duplicates = len(hashes) - len(unique)
+        if self._bloom is None:
+            duplicates += np.count_nonzero(np.isin(unique, self._seen, assume_unique=True))
+            self._seen = np.union1d(self._seen, unique)
+            if len(self._seen) > self.max_exact_rows:
+                # Too many rows to track exactly; fold them into a Bloom filter
+                self._bloom = sketches.BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+                self._bloom.add(self._seen)
+                self._seen = np.empty(0, dtype=np.uint64)
+        else:
+            duplicates += np.count_nonzero(self._bloom.contains(unique))
+            self._bloom.add(unique)
+        return duplicates
+
+    def update(self, chunk):
+        if len(chunk) == 0:
+            return self
+        self.rows += len(chunk)
+        nulls = chunk.isnull().sum()
+        self.null_counts = nulls if self.null_counts is None else self.null_counts.add(nulls, fill_value=0)
+        self.duplicate_rows += self._count_duplicates(sketches.hash_values(chunk))
+
+        for column in chunk.columns:
+            values = chunk[column]
+            sketch = self._cardinality.setdefault(column, sketches.HyperLogLog())
+            sketch.update(sketches.hash_values(values.dropna()))
+
+            check = self.domain_checks.get(column)
+            if check is None:
+                continue
+            invalid = values[~(check(values) | values.isna()).to_numpy(dtype=bool)]
+            self.invalid_counts[column] = self.invalid_counts.get(column, 0) + len(invalid)
+            samples = self.invalid_samples.setdefault(column, [])
+            for value in pd.unique(invalid.to_numpy()):
+                if len(samples) >= MAX_INVALID_SAMPLES:
+                    break
+                if value not in samples:
+                    samples.append(value)
+        return self
+
+    def report(self):
+        null_counts = self.null_counts if self.null_counts is not None else pd.Series(dtype='int64')
+        return QualityReport(
+            rows=self.rows,
+            null_counts=null_counts.astype('int64'),
+            duplicate_rows=int(self.duplicate_rows),
+            duplicates_exact=self._bloom is None,
+            distinct_counts=pd.Series(
+                {column: sketch.count() for column, sketch in self._cardinality.items()},
+                dtype='int64',
+            ).reindex(null_counts.index),
+            invalid_counts=dict(self.invalid_counts),
+            invalid_samples={column: list(values) for column, values in self.invalid_samples.items()},
+        )
+
+
+def profile_frame(df, chunk_rows=1_000_000, **options):
+    """Profile an in-memory frame, slice by slice"""
+    profiler = QualityProfiler(**options)
+    for start in range(0, len(df), chunk_rows):
+        profiler.update(df.iloc[start:start + chunk_rows])
+    return profiler.report()
+
+
+def profile_table(name, columns=None, batch_size=1_000_000, data_dir='.', **options):
+    """Profile a stored table by streaming it from disk in batches"""
+    profiler = QualityProfiler(**options)
+    for chunk in data_store.iter_batches(name, columns=columns, batch_size=batch_size, data_dir=data_dir):
+        profiler.update(chunk)
+    return profiler.report()
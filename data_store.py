@@ -0,0 +1,396 @@
+"""Columnar storage for the Adidas datasets.
+
+Each CSV is converted once into a compressed Parquet dataset under
+``.columnar/`` and every later load reads from there, optionally projecting
+only the columns a view needs. A manifest records the source file's mtime,
+size and hash, so a replaced CSV is converted again on the next load.
+
+New fact snapshots can be appended to a converted table as extra Parquet
+files (see ``ingest.py``). When the source CSV changes, the table is
+converted again and each snapshot is carried over minus the rows the new
+CSV already holds, so folding snapshots into the CSV does not count them
+twice and editing it does not drop them.
+
+``load_tables`` reads its tables in parallel threads; Parquet decoding and
+decompression release the GIL, so the tables load in about the time of
+the largest one.
+"""
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import schema
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+STORE_DIR = '.columnar'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_LOCK_FILE = 'manifest.lock'
+COMPRESSION = 'zstd'
+
+TABLE_FILES = {
+    'shoes_dim': 'shoes_dim.csv',
+    'shoes_fact': 'shoes_fact.csv',
+    'country_dim': 'country_dim.csv',
+}
+
+# The fact table is split by market so per-country reads skip the other files
+PARTITION_COLUMNS = {
+    'shoes_fact': ['country_code'],
+}
+
+# Serializes manifest updates between the threads of load_tables; the lock
+# file serializes them between processes
+_manifest_lock = threading.Lock()
+
+
+def store_path(data_dir='.'):
+    return os.path.join(data_dir, STORE_DIR)
+
+
+def table_path(name, data_dir='.'):
+    return os.path.join(store_path(data_dir), name)
+
+
+def source_path(name, data_dir='.'):
+    return os.path.join(data_dir, TABLE_FILES[name])
+
+
+def _file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def load_manifest(data_dir='.'):
+    """Read the conversion manifest, empty if nothing was converted yet"""
+    path = os.path.join(store_path(data_dir), MANIFEST_FILE)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest, data_dir='.'):
+    path = os.path.join(store_path(data_dir), MANIFEST_FILE)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{MANIFEST_FILE}.", suffix='.tmp', dir=store_path(data_dir))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+@contextlib.contextmanager
+def _manifest_update(data_dir='.'):
+    """Read-modify-write of the manifest, exclusive across threads and processes.
+
+    Yields the manifest; it is saved when the block exits without an error.
+    """
+    os.makedirs(store_path(data_dir), exist_ok=True)
+    with _manifest_lock, open(os.path.join(store_path(data_dir), MANIFEST_LOCK_FILE), 'a') as lock_file:
+        if fcntl is not None:
+            # Released when the file is closed
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        manifest = load_manifest(data_dir)
+        yield manifest
+        _save_manifest(manifest, data_dir)
+
+
+def is_fresh(name, data_dir='.'):
+    """Check whether the columnar copy of a table still matches its CSV"""
+    entry = load_manifest(data_dir).get(name)
+    if entry is None or not os.path.isdir(table_path(name, data_dir)):
+        return False
+
+    source = source_path(name, data_dir)
+    signature = _source_signature(source)
+    if signature['mtime_ns'] == entry['mtime_ns'] and signature['size'] == entry['size']:
+        return True
+
+    # The file was touched; only a content change needs a new conversion
+    if signature['size'] == entry['size'] and _file_hash(source) == entry['sha1']:
+        with _manifest_update(data_dir) as manifest:
+            manifest[name].update(signature)
+        return True
+    return False
+
+
+def convert_table(name, data_dir='.'):
+    """Convert a table's CSV into its Parquet dataset"""
+    source = source_path(name, data_dir)
+    target = table_path(name, data_dir)
+    os.makedirs(store_path(data_dir), exist_ok=True)
+    # A fresh staging directory per conversion, whichever thread or process runs it
+    tmp_target = tempfile.mkdtemp(prefix=f"{name}.", suffix='.tmp', dir=store_path(data_dir))
+
+    signature = _source_signature(source)
+    # Stream the CSV in blocks so the fact table never has to fit in memory
+    reader = pa_csv.open_csv(source, read_options=pa_csv.ReadOptions(block_size=64 << 20))
+    columns = reader.schema.names
+    partitioning = [c for c in PARTITION_COLUMNS.get(name, []) if c in columns]
+    ds.write_dataset(
+        reader,
+        tmp_target,
+        format='parquet',
+        partitioning=partitioning or None,
+        partitioning_flavor='hive' if partitioning else None,
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+    )
+
+    sha1 = _file_hash(source)
+    # Held until the new table is in place, so no delta lands in the old one meanwhile
+    with _manifest_update(data_dir) as manifest:
+        try:
+            deltas = _carry_deltas(name, manifest.get(name, {}).get('deltas', []), target, tmp_target)
+        except Exception:
+            shutil.rmtree(tmp_target, ignore_errors=True)
+            raise
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp_target, target)
+        manifest[name] = dict(signature, sha1=sha1, columns=columns, deltas=deltas)
+
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+
+
+def _carry_deltas(name, deltas, old_target, new_target):
+    """Copy ingested deltas into a new conversion, minus the rows it already holds.
+
+    Returns the manifest entries of the deltas kept. Raises ValueError when
+    a delta's columns no longer fit the table.
+    """
+    partitioning = 'hive' if PARTITION_COLUMNS.get(name) else None
+    base = ds.dataset(new_target, format='parquet', partitioning=partitioning)
+    date_columns = [c for c in schema.DATE_COLUMNS.get(name, []) if c in base.schema.names]
+    kept = []
+    for delta in deltas:
+        files = sorted(glob.glob(os.path.join(old_target, '**', f"delta-{delta['id']}-*.parquet"), recursive=True))
+        if not files:
+            continue
+        rows = ds.dataset(files, format='parquet', partitioning=partitioning, partition_base_dir=old_target).to_table()
+        missing = [c for c in base.schema.names if c not in rows.column_names]
+        if missing:
+            raise ValueError(
+                f"{TABLE_FILES[name]} changed, but ingested snapshot {delta['id']} has no "
+                f"{', '.join(missing)} column; re-ingest it or delete {STORE_DIR}/ to drop it"
+            )
+        rows = rows.select(base.schema.names).cast(base.schema)
+
+        # Snapshots are dated, so only the new rows of the same dates can repeat them
+        row_filter = None
+        for column in date_columns:
+            values = ds.field(column).isin(pc.unique(rows[column]))
+            row_filter = values if row_filter is None else row_filter & values
+        present = pd.Series(_row_hashes(base.to_table(filter=row_filter).to_pandas())).value_counts()
+        hashes = pd.Series(_row_hashes(rows.to_pandas()))
+        # A row repeated n times in the delta is new beyond the CSV's n-th copy
+        new_rows = (hashes.groupby(hashes).cumcount() >= hashes.map(present).fillna(0)).to_numpy()
+        if not new_rows.any():
+            continue
+
+        ds.write_dataset(
+            rows.filter(pa.array(new_rows)),
+            new_target,
+            format='parquet',
+            partitioning=PARTITION_COLUMNS.get(name) or None,
+            partitioning_flavor='hive' if partitioning else None,
+            basename_template=f"delta-{delta['id']}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+        )
+        kept.append(dict(delta, rows=int(new_rows.sum())))
+    return kept
+
+
+def ensure_converted(name, data_dir='.'):
+    """Convert a table unless its columnar copy is already current"""
+    if not is_fresh(name, data_dir):
+        convert_table(name, data_dir)
+
+
+def table_version(name, data_dir='.'):
+    """Short identifier that changes whenever a table's content changes"""
+    source = source_path(name, data_dir)
+    if not os.path.exists(source):
+        return 'missing'
+    entry = load_manifest(data_dir).get(name)
+    if pa is None or entry is None or not is_fresh(name, data_dir):
+        # Not converted yet: the source signature stands in for the content
+        signature = _source_signature(source)
+        return f"raw-{signature['mtime_ns']}-{signature['size']}"
+    return f"{entry['sha1'][:12]}+{len(entry.get('deltas', []))}"
+
+
+def dataset_version(data_dir='.'):
+    """Combined version of all tables, for keying caches of derived results"""
+    return '/'.join(table_version(name, data_dir) for name in TABLE_FILES)
+
+
+def arrow_dataset(name, data_dir='.'):
+    """The converted table as a pyarrow dataset, for scans that never load it whole.
+
+    Returns None when the source file is missing.
+    """
+    if not os.path.exists(source_path(name, data_dir)):
+        return None
+    ensure_converted(name, data_dir)
+    partitioning = 'hive' if PARTITION_COLUMNS.get(name) else None
+    return ds.dataset(table_path(name, data_dir), format='parquet', partitioning=partitioning)
+
+
+def _stored_schema(name, data_dir='.'):
+    columns = load_manifest(data_dir)[name]['columns']
+    stored = arrow_dataset(name, data_dir).schema
+    return pa.schema([stored.field(column) for column in columns])
+
+
+def coerce_rows(name, df, data_dir='.'):
+    """Cast new rows to a converted table's stored column types.
+
+    ``df`` must carry every column of the table; e.g. ISO date strings
+    become dates. Raises pyarrow's errors for values that don't fit.
+    """
+    ensure_converted(name, data_dir)
+    target_schema = _stored_schema(name, data_dir)
+    table = pa.Table.from_pandas(df[target_schema.names], preserve_index=False)
+    return table.cast(target_schema).to_pandas()
+
+
+def append_rows(name, df, data_dir='.'):
+    """Append rows to a converted table as a new set of Parquet files"""
+    ensure_converted(name, data_dir)
+    path = table_path(name, data_dir)
+    target_schema = _stored_schema(name, data_dir)
+    partitioning = [c for c in PARTITION_COLUMNS.get(name, []) if c in target_schema.names]
+    table = pa.Table.from_pandas(df[target_schema.names], preserve_index=False).cast(target_schema)
+
+    delta_id = uuid.uuid4().hex[:12]
+    # The files and their manifest entry go in under one lock, so a concurrent
+    # conversion cannot replace the table between the two
+    with _manifest_update(data_dir) as manifest:
+        ds.write_dataset(
+            table,
+            path,
+            format='parquet',
+            partitioning=partitioning or None,
+            partitioning_flavor='hive' if partitioning else None,
+            basename_template=f"delta-{delta_id}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+        )
+        manifest[name].setdefault('deltas', []).append({
+            'id': delta_id,
+            'rows': table.num_rows,
+            'ingested_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        })
+    return delta_id
+
+
+def _read_raw(name, columns=None, data_dir='.'):
+    source = source_path(name, data_dir)
+    if not os.path.exists(source):
+        return None
+
+    if pa is None:
+        usecols = (lambda c: c in columns) if columns is not None else None
+        df = pd.read_csv(source, usecols=usecols)
+    else:
+        ensure_converted(name, data_dir)
+        order = load_manifest(data_dir)[name]['columns']
+        if columns is not None:
+            order = [c for c in order if c in columns]
+        # Categorical columns come back dictionary-encoded, never as strings
+        file_format = ds.ParquetFileFormat(
+            read_options=ds.ParquetReadOptions(dictionary_columns=schema.categorical_columns(name))
+        )
+        partitioning = None
+        if PARTITION_COLUMNS.get(name):
+            partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+        dataset = ds.dataset(table_path(name, data_dir), format=file_format, partitioning=partitioning)
+        df = dataset.to_table(columns=order).to_pandas(date_as_object=False)
+
+    if df.empty:
+        return None
+    return df
+
+
+def iter_batches(name, columns=None, batch_size=1_000_000, data_dir='.'):
+    """Yield a table as raw DataFrame chunks of at most ``batch_size`` rows.
+
+    Memory stays bounded by one chunk, so tables larger than RAM can be
+    scanned. Chunks keep the stored types; the schema is not applied.
+    """
+    source = source_path(name, data_dir)
+    if not os.path.exists(source):
+        return
+    if pa is None:
+        usecols = (lambda c: c in columns) if columns is not None else None
+        yield from pd.read_csv(source, usecols=usecols, chunksize=batch_size)
+        return
+
+    dataset = arrow_dataset(name, data_dir)
+    order = load_manifest(data_dir)[name]['columns']
+    if columns is not None:
+        order = [c for c in order if c in columns]
+    for batch in dataset.to_batches(columns=order, batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_table(name, columns=None, data_dir='.'):
+    """Load a table with its declared dtypes, converting the CSV first if needed.
+
+    Only ``columns`` are read when given; names missing from the table are
+    ignored. Returns None when the source file is missing or empty.
+    """
+    return load_tables({name: columns}, data_dir)[name]
+
+
+def load_tables(columns_by_table, data_dir='.'):
+    """Load several tables at once so they share categorical vocabularies.
+
+    ``columns_by_table`` maps table names to column projections (None for
+    every column). Tables are converted and read concurrently. Missing or
+    empty tables come back as None.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(columns_by_table))) as pool:
+        futures = {
+            name: pool.submit(_read_raw, name, columns, data_dir)
+            for name, columns in columns_by_table.items()
+        }
+        tables = {name: future.result() for name, future in futures.items()}
+    return schema.apply_schema(tables)
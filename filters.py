@@ -0,0 +1,100 @@
+"""Filter engine for the dashboard sidebars.
+
+Instead of copying a table and slicing it once per selection, the engine
+combines every selection into one boolean mask, keeps the resulting row
+positions in a small LRU cache keyed by the filter state, and materializes
+only the columns a chart asks for.
+
+A filter state maps column names to one of:
+
+* a list/set of allowed values (``isin``); empty means no filter,
+* a ``(low, high)`` tuple for an inclusive range,
+* a single value (``==``),
+* None, meaning no filter.
+
+An engine can also answer keys that are not columns of its frame through
+an index: any object whose ``mask(values)`` returns a boolean per row for
+a collection of allowed values (e.g. ``color_index.ColorIndex``).
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def state_key(filters):
+    """Hashable, order-independent key for a filter state"""
+    items = []
+    for column, value in sorted(filters.items()):
+        if value is None or (isinstance(value, (list, set, frozenset)) and not value):
+            continue
+        if isinstance(value, (list, set, frozenset)):
+            value = ('in', tuple(sorted(value, key=str)))
+        elif isinstance(value, tuple):
+            value = ('range',) + value
+        else:
+            value = ('in', (value,))
+        items.append((column, value))
+    return tuple(items)
+
+
+class FilterEngine:
+    """Cached row selections over one read-only frame"""
+
+    def __init__(self, df, max_entries=64, indexes=None):
+        self.df = df
+        self.indexes = dict(indexes or {})
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self):
+        """Keys this engine filters on: the frame's columns plus its indexes"""
+        return list(self.df.columns) + [key for key in self.indexes if key not in self.df.columns]
+
+    def _mask(self, key):
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, (kind, *args) in key:
+            if column in self.indexes:
+                if kind != 'in':
+                    raise ValueError(f"{column!r} only takes a collection of values")
+                mask &= self.indexes[column].mask(args[0])
+                continue
+            values = self.df[column]
+            if kind == 'in':
+                mask &= values.isin(args[0]).to_numpy()
+            else:
+                low, high = args
+                mask &= ((values >= low) & (values <= high)).to_numpy(dtype=bool, na_value=False)
+        return mask
+
+    def indices(self, **filters):
+        """Positions of the rows matching the filters, or None for all rows"""
+        columns = self.columns
+        key = state_key({c: v for c, v in filters.items() if c in columns})
+        if not key:
+            return None
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        positions = np.flatnonzero(self._mask(key))
+        with self._lock:
+            self._cache[key] = positions
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return positions
+
+    def count(self, **filters):
+        positions = self.indices(**filters)
+        return len(self.df) if positions is None else len(positions)
+
+    def select(self, columns=None, **filters):
+        """Materialize the matching rows for the given columns only"""
+        df = self.df if columns is None else self.df[list(columns)]
+        positions = self.indices(**filters)
+        return df if positions is None else df.take(positions)
+
+    def column(self, name, **filters):
+        return self.select([name], **filters)[name]
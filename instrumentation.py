@@ -0,0 +1,237 @@
+"""Lightweight timing spans, memory counters and opt-in profiling.
+
+A ``Tracer`` records nested spans: wall time, process CPU time and the
+resident set size before and after each span. The active tracer lives in
+a context variable, so library code (see ``traced``) reports into
+whichever run is being traced and costs almost nothing when none is.
+
+Traces can be summarized per span path, exported as JSON lines, and
+paired with a ``Profiler`` that captures cProfile statistics and
+tracemalloc allocation sites for the same run.
+
+Set ``ADIDAS_TRACE_FILE`` to append every dashboard run's spans to a
+JSON-lines file.
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TRACE_FILE_ENV = 'ADIDAS_TRACE_FILE'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_current = contextvars.ContextVar('tracer', default=None)
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak RSS where unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux and bytes on macOS; either way an upper bound
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+class Tracer:
+    """Collects the spans of one run"""
+
+    def __init__(self, run=None):
+        self.run = run or time.strftime('%Y%m%dT%H%M%S')
+        self.records = []
+        self._stack = []
+
+    @contextmanager
+    def span(self, name, **attrs):
+        path = '/'.join(self._stack + [name])
+        self._stack.append(name)
+        rss_before = current_rss()
+        started, cpu_started = time.perf_counter(), time.process_time()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            rss_after = current_rss()
+            self._stack.pop()
+            record = {
+                'run': self.run,
+                'path': path,
+                'name': name,
+                'depth': len(self._stack),
+                'start': time.time() - duration,
+                'duration_ms': duration * 1000,
+                'cpu_ms': (time.process_time() - cpu_started) * 1000,
+                'rss_mb': rss_after / 2**20,
+                'rss_delta_mb': (rss_after - rss_before) / 2**20,
+            }
+            record.update(attrs)
+            if error is not None:
+                record['error'] = error
+            self.records.append(record)
+
+    def mark(self, name, started, **attrs):
+        """Record a span that began at ``started`` (a ``time.perf_counter()`` value) and ends now.
+
+        For stretches that no with block can wrap, e.g. time to first paint.
+        """
+        duration = time.perf_counter() - started
+        rss = current_rss()
+        record = {
+            'run': self.run,
+            'path': '/'.join(self._stack + [name]),
+            'name': name,
+            'depth': len(self._stack),
+            'start': time.time() - duration,
+            'duration_ms': duration * 1000,
+            'cpu_ms': None,
+            'rss_mb': rss / 2**20,
+            'rss_delta_mb': 0.0,
+        }
+        record.update(attrs)
+        self.records.append(record)
+        return duration * 1000
+
+    @contextmanager
+    def active(self):
+        """Make this the tracer that ``span`` and ``traced`` report into"""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def activate(self):
+        """Like ``active`` for scripts that can't wrap their body in a with block"""
+        _current.set(self)
+        return self
+
+    def summary(self):
+        """Calls and total/max time per span path, slowest first"""
+        if not self.records:
+            return pd.DataFrame(columns=['calls', 'total_ms', 'max_ms', 'rss_delta_mb'])
+        frame = pd.DataFrame(self.records)
+        summary = frame.groupby('path').agg(
+            calls=('duration_ms', 'size'),
+            total_ms=('duration_ms', 'sum'),
+            max_ms=('duration_ms', 'max'),
+            rss_delta_mb=('rss_delta_mb', 'sum'),
+        )
+        return summary.sort_values('total_ms', ascending=False)
+
+    def to_jsonl(self):
+        return ''.join(json.dumps(record, default=str) + '\n' for record in self.records)
+
+    def export_jsonl(self, path):
+        """Append this run's spans to a JSON-lines file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(self.to_jsonl())
+
+
+def current():
+    """The active tracer, or None"""
+    return _current.get()
+
+
+def span(name, **attrs):
+    """A span on the active tracer; a no-op when nothing is being traced"""
+    tracer = _current.get()
+    return nullcontext() if tracer is None else tracer.span(name, **attrs)
+
+
+def traced(name=None):
+    """Decorator recording each call of a function as a span"""
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _current.get()
+            if tracer is None:
+                return func(*args, **kwargs)
+            with tracer.span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Profiler:
+    """Opt-in cProfile and tracemalloc capture around a stretch of code"""
+
+    def __init__(self, cpu=False, memory=False, top=25):
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.stats_text = None
+        self.allocations = None
+        self._profile = None
+        self._started_tracemalloc = False
+
+    def start(self):
+        if self.cpu:
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # Another profiler is already active in this process
+                self._profile = None
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        return self
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats('cumulative').print_stats(self.top)
+            self.stats_text = out.getvalue()
+            self._profile = None
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            self.allocations = pd.DataFrame(
+                [
+                    {
+                        'location': str(stat.traceback[0]),
+                        'size_kb': stat.size / 1024,
+                        'count': stat.count,
+                    }
+                    for stat in snapshot.statistics('lineno')[:self.top]
+                ],
+                columns=['location', 'size_kb', 'count'],
+            )
+            self.allocations.attrs['peak_kb'] = peak / 1024
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
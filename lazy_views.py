@@ -0,0 +1,118 @@
+"""Lazily evaluated, dependency-tracked dashboard views.
+
+A dashboard tab reads a few filters and tables, but a rerun triggered by
+any widget used to recompute every tab. Here each view is a declared
+node: the function computing it, the state keys it reads, the tables it
+reads and the views it builds on. A ``ViewGraph`` computes a node only
+when it is asked for, i.e. when its tab is shown, and memoizes the result
+per node under a key made of exactly those inputs:
+
+* the versions of the tables the node and its dependencies read,
+* the slice of the filter state the node and its dependencies read,
+
+so a change to an unrelated widget, or to a table the view does not
+read, is a memo hit. When a node has to be computed, its dependencies are
+resolved (and memoized) first and passed to its function as keyword
+arguments; a stored result needs none of them.
+
+Memoized results are shared between sessions and must be treated as
+read-only.
+"""
+import threading
+from collections import OrderedDict
+
+import filters
+import instrumentation
+
+# Results kept per node, most recently used first out
+MAX_ENTRIES = 8
+
+
+class ViewNode:
+    """A view: ``compute(dataset, state, **dependencies)`` and the inputs it reads"""
+
+    def __init__(self, name, compute, filters=(), tables=(), depends=()):
+        self.name = name
+        self.compute = compute
+        self.filters = list(filters)
+        self.tables = list(tables)
+        self.depends = list(depends)
+
+
+class ViewGraph:
+    """Views computed on demand and memoized per node.
+
+    ``stored(dataset, name, state)``, when given, is tried before computing
+    a node and returns a stored result or None (see precompute.py).
+    """
+
+    def __init__(self, nodes, stored=None, max_entries=MAX_ENTRIES):
+        self.nodes = {}
+        self.stored = stored
+        self.max_entries = max_entries
+        self._filters = {}
+        self._tables = {}
+        for node in nodes:
+            # Dependencies must be declared first, which also rules out cycles
+            missing = [name for name in node.depends if name not in self.nodes]
+            if missing:
+                raise ValueError(f"View {node.name!r} depends on undeclared views: {', '.join(missing)}")
+            self.nodes[node.name] = node
+            self._filters[node.name] = _union([node.filters] + [self._filters[d] for d in node.depends])
+            self._tables[node.name] = _union([node.tables] + [self._tables[d] for d in node.depends])
+        self._memo = {name: OrderedDict() for name in self.nodes}
+        self._lock = threading.Lock()
+        self.hits = dict.fromkeys(self.nodes, 0)
+        self.runs = dict.fromkeys(self.nodes, 0)
+
+    def inputs(self, name, state):
+        """The slice of ``state`` a view and its dependencies read"""
+        return {k: state[k] for k in self._filters[name] if state.get(k) is not None}
+
+    def key(self, name, dataset, state):
+        """Memo key of a view: its tables' versions and its slice of the state"""
+        if dataset.version is None:
+            # Unversioned data is only known by the object holding it
+            versions = (id(dataset),)
+        else:
+            versions = tuple(dataset.table_version(table) for table in self._tables[name])
+        return versions, filters.state_key(self.inputs(name, state))
+
+    def get(self, name, dataset, state):
+        """A view's result, computed only when its inputs changed"""
+        node = self.nodes[name]
+        params = self.inputs(name, state)
+        key = self.key(name, dataset, state)
+        memo = self._memo[name]
+        with self._lock:
+            if key in memo:
+                memo.move_to_end(key)
+                self.hits[name] += 1
+                return memo[key]
+
+        result = self.stored(dataset, name, params) if self.stored is not None else None
+        if result is None:
+            dependencies = {dependency: self.get(dependency, dataset, state) for dependency in node.depends}
+            with instrumentation.span(f"view {name}"):
+                result = node.compute(dataset, params, **dependencies)
+        with self._lock:
+            self.runs[name] += 1
+            memo[key] = result
+            while len(memo) > self.max_entries:
+                memo.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            for memo in self._memo.values():
+                memo.clear()
+
+    def stats(self):
+        """Memo hits and runs (computed or loaded) per view"""
+        with self._lock:
+            return {name: {'hits': self.hits[name], 'runs': self.runs[name]} for name in self.nodes}
+
+
+def _union(lists):
+    """Items of several lists, first occurrence first"""
+    return list(dict.fromkeys(item for items in lists for item in items))
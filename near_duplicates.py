@@ -0,0 +1,264 @@
+"""Near-duplicate and variant detection for the shoe catalog.
+
+An exact duplicate check only catches identical rows, but the catalog
+lists one model under several ids, in several colorways and under
+localized names ("Laufschuh" vs "Running Shoes"). This module clusters
+those rows:
+
+* names are normalized (see search.py) and product-type words, German or
+  English, are dropped, leaving the model tokens;
+* each distinct token set gets a MinHash signature, computed in chunks
+  on a thread pool; banded LSH turns the signatures into candidate
+  pairs, which are kept when their estimated Jaccard similarity reaches
+  ``THRESHOLD``;
+* rows sharing an id or an image asset (the hash folder of ``image_url``)
+  are linked directly;
+* the connected components of these links are the model clusters.
+  Within a cluster, rows with the same palette are near-duplicates and
+  the other palettes are colorways (variants).
+
+Signatures are computed once per distinct name, and the LSH buckets,
+exact-key groups and components come from sorts and vectorized passes,
+so the cost grows about linearly with the catalog.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import schema
+import search
+import sketches
+
+# MinHash signature length, split into LSH bands of equal width
+NUM_HASHES = 64
+BANDS = 16
+
+# Estimated Jaccard similarity of the model tokens for two names to be linked
+THRESHOLD = 0.8
+
+# Distinct names per signature chunk
+CHUNK_SIZE = 50_000
+
+# Product-type words; German compounds ending in "schuh" are dropped as well
+TYPE_WORDS = {
+    'shoe', 'shoes', 'schuh', 'schuhe', 'boot', 'boots', 'cleats', 'sneaker', 'sneakers',
+    'running', 'hiking', 'soccer', 'football', 'tennis', 'golf', 'basketball',
+    'skateboarding', 'cycling', 'training', 'strength', 'weightlifting', 'climbing',
+}
+
+_RAW_SPLIT = re.compile(r'[\W_]+')
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def is_model_token(token):
+    return token not in TYPE_WORDS and not token.endswith(('schuh', 'schuhe'))
+
+
+def model_keys(names):
+    """Model key of each distinct name: its model tokens, sorted and space-separated.
+
+    Names repeat few distinct words, so each word is normalized once
+    rather than once per name.
+    """
+    words = {}
+    keys = {}
+    for name in pd.unique(pd.Series(names, dtype=object).dropna()):
+        tokens = set()
+        for word in _RAW_SPLIT.split(str(name).lower()):
+            if word not in words:
+                words[word] = [token for token in search.tokenize(word) if is_model_token(token)]
+            tokens.update(words[word])
+        keys[name] = ' '.join(sorted(tokens))
+    return keys
+
+
+def _mix(values):
+    """splitmix64 finalizer; wraps around like the C original"""
+    values = (values ^ (values >> np.uint64(30))) * _MIX1
+    values = (values ^ (values >> np.uint64(27))) * _MIX2
+    return values ^ (values >> np.uint64(31))
+
+
+def minhash(token_sets, num_hashes=NUM_HASHES, seed=0, workers=None):
+    """MinHash signatures (32-bit) of non-empty token sets, one row per set.
+
+    Every distinct token is hashed ``num_hashes`` ways once; a set's
+    signature is then the column-wise minimum over its tokens' rows.
+    Chunks of sets are reduced on a thread pool; numpy releases the GIL
+    for the array operations.
+    """
+    seeds = np.random.default_rng(seed).integers(0, 2**63, num_hashes, dtype=np.uint64)
+    lengths = np.fromiter(map(len, token_sets), dtype=np.int64, count=len(token_sets))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    token_ids, vocabulary = pd.factorize(pd.Series([t for tokens in token_sets for t in tokens], dtype=object))
+    hashes = sketches.hash_values(pd.Series(vocabulary, dtype=object))
+    token_hashes = (_mix(hashes[:, None] ^ seeds[None, :]) >> np.uint64(32)).astype(np.uint32)
+    signatures = np.empty((len(token_sets), num_hashes), dtype=np.uint32)
+
+    def fill(start):
+        stop = min(start + CHUNK_SIZE, len(token_sets))
+        rows = token_hashes[token_ids[offsets[start]:offsets[stop]]]
+        signatures[start:stop] = np.minimum.reduceat(rows, offsets[start:stop] - offsets[start], axis=0)
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fill, range(0, len(token_sets), CHUNK_SIZE)))
+    return signatures
+
+
+def candidate_pairs(signatures, bands=BANDS):
+    """Pairs of rows sharing a band of their signatures; neighbours within each bucket.
+
+    Linking each row to the next one in its bucket keeps the candidates
+    linear in the number of rows; connected components recover the rest.
+    """
+    width = signatures.shape[1] // bands
+    pairs = []
+    for band in range(bands):
+        keys = sketches.hash_values(pd.DataFrame(signatures[:, band * width:(band + 1) * width]))
+        order = np.argsort(keys, kind='stable')
+        same = keys[order[1:]] == keys[order[:-1]]
+        pairs.append(np.column_stack([order[:-1][same], order[1:][same]]))
+    pairs = np.concatenate(pairs).astype(np.int64) if pairs else np.empty((0, 2), dtype=np.int64)
+    # Pairs found by several bands count once
+    codes = np.unique(pairs[:, 0] * len(signatures) + pairs[:, 1])
+    return np.column_stack([codes // max(len(signatures), 1), codes % max(len(signatures), 1)])
+
+
+def _key_links(keys):
+    """Links from every row to the first row with the same non-missing key"""
+    codes, _ = pd.factorize(keys)
+    rows = np.flatnonzero(codes >= 0)
+    first = np.full(codes.max() + 1 if len(rows) else 0, -1, dtype=np.int64)
+    # Reversed, so the first row with a key wins
+    first[codes[rows][::-1]] = rows[::-1]
+    return np.column_stack([rows, first[codes[rows]]])
+
+
+def components(size, links):
+    """Connected component labels (0..k-1, in order of first row) of ``size`` nodes"""
+    labels = np.arange(size)
+    first, second = links[:, 0], links[:, 1]
+    while True:
+        a, b = labels[first], labels[second]
+        differ = a != b
+        if not differ.any():
+            break
+        # Hook the larger root under the smaller, then compress the paths
+        np.minimum.at(labels, np.maximum(a[differ], b[differ]), np.minimum(a[differ], b[differ]))
+        while True:
+            parents = labels[labels]
+            if np.array_equal(parents, labels):
+                break
+            labels = parents
+    return pd.factorize(labels)[0]
+
+
+def asset_keys(shoes_dim):
+    """Image asset folder of each row, None where there is no image"""
+    if schema.IMAGE_SUFFIX_COLUMN in shoes_dim.columns:
+        paths = shoes_dim[schema.IMAGE_SUFFIX_COLUMN].astype(object)
+    elif schema.IMAGE_URL_COLUMN in shoes_dim.columns:
+        paths = shoes_dim[schema.IMAGE_URL_COLUMN].astype(object).str.rsplit('/', n=2).str[-2:].str.join('/')
+    else:
+        return None
+    return paths.str.split('/', n=1).str[0]
+
+
+class VariantClusters:
+    """Model cluster and variant (cluster plus palette) of every shoe row"""
+
+    def __init__(self, clusters, palettes):
+        self.clusters = np.asarray(clusters)
+        self.palettes = np.asarray(palettes)
+        palette_count = int(self.palettes.max()) + 1 if len(self.palettes) else 1
+        self.variants = pd.factorize(self.clusters.astype(np.int64) * palette_count + self.palettes)[0]
+
+    def __len__(self):
+        return len(self.clusters)
+
+    @classmethod
+    def build(cls, shoes_dim, palettes=None, threshold=THRESHOLD, num_hashes=NUM_HASHES,
+              bands=BANDS, seed=0, workers=None):
+        """Cluster a shoe table; ``palettes`` holds one palette (row of ints) per shoe"""
+        links = []
+        if 'name' in shoes_dim.columns:
+            names = shoes_dim['name'].astype(object)
+            # Signatures per distinct model, not per row
+            row_keys = names.map(model_keys(names)).to_numpy(dtype=object)
+            row_keys[pd.isna(row_keys) | (row_keys == '')] = None
+            links.append(_key_links(row_keys))
+
+            models = pd.unique(row_keys[pd.notna(row_keys)])
+            signatures = minhash([model.split(' ') for model in models], num_hashes, seed, workers)
+            pairs = candidate_pairs(signatures, bands)
+            similar = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1) >= threshold
+            # Link the first row of each model to the first row of the other
+            first_rows = pd.Series(np.arange(len(row_keys))).groupby(row_keys, sort=False).first()
+            model_rows = first_rows.reindex(models).to_numpy()
+            links.append(model_rows[pairs[similar]])
+        if 'id' in shoes_dim.columns:
+            links.append(_key_links(shoes_dim['id'].astype(object).to_numpy()))
+        assets = asset_keys(shoes_dim)
+        if assets is not None:
+            links.append(_key_links(assets.to_numpy()))
+
+        links = np.concatenate(links) if links else np.empty((0, 2), dtype=np.int64)
+        clusters = components(len(shoes_dim), links.astype(np.int64))
+        if palettes is None:
+            palette_codes = np.zeros(len(shoes_dim), dtype=np.int64)
+        else:
+            palette_hashes = sketches.hash_values(pd.DataFrame(np.asarray(palettes)))
+            palette_codes = pd.factorize(palette_hashes)[0]
+        return cls(clusters, palette_codes)
+
+    def _select(self, labels, positions):
+        return labels if positions is None else labels[positions]
+
+    def summary(self, positions=None):
+        """Rows, model clusters, variants and near-duplicate rows among ``positions``"""
+        clusters = self._select(self.clusters, positions)
+        variants = self._select(self.variants, positions)
+        cluster_count, variant_count = len(np.unique(clusters)), len(np.unique(variants))
+        return {
+            'rows': len(clusters),
+            'clusters': cluster_count,
+            'variants': variant_count,
+            # Rows repeating a model in a palette already listed
+            'duplicate_rows': len(variants) - variant_count,
+            # Rows of clusters holding more than one row
+            'clustered_rows': int(np.count_nonzero(np.bincount(clusters)[clusters] > 1)) if len(clusters) else 0,
+        }
+
+    def cluster_frame(self, shoes_dim, positions=None, top=None):
+        """Clusters with more than one row, largest first: a name, rows, ids and colorways"""
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions)
+        rows = pd.DataFrame({
+            'cluster': self.clusters[positions],
+            'variant': self.variants[positions],
+            'name': shoes_dim['name'].astype(object).to_numpy()[positions]
+            if 'name' in shoes_dim.columns else None,
+            'id': shoes_dim['id'].astype(object).to_numpy()[positions] if 'id' in shoes_dim.columns else None,
+        })
+        frame = rows.groupby('cluster', sort=False).agg(
+            name=('name', 'first'),
+            rows=('cluster', 'size'),
+            ids=('id', 'nunique'),
+            colorways=('variant', 'nunique'),
+        )
+        frame = frame[frame['rows'] > 1].sort_values(['rows', 'colorways'], ascending=False, kind='stable')
+        frame['duplicate_rows'] = rows.groupby('cluster', sort=False)['variant'].size().reindex(frame.index) \
+            - frame['colorways']
+        return frame if top is None else frame.head(top)
+
+    def collapse(self, positions):
+        """First of ``positions`` in each cluster, and the rows each stands for"""
+        positions = np.asarray(positions)
+        clusters = pd.Series(self.clusters[positions])
+        keep = ~clusters.duplicated().to_numpy()
+        counts = clusters.map(clusters.value_counts()).to_numpy()
+        return positions[keep], counts[keep]
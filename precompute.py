@@ -0,0 +1,167 @@
+"""Precompute dashboard payloads for the common sidebar states.
+
+Most sessions look at a handful of views: everything, one gender, one
+category, one usage category, or a combination of those. This job
+enumerates those filter states, computes the payload views
+(``analytics.dashboard_views``) for each in a process pool and pickles
+the results under the columnar store, keyed by a hash of the canonical
+filter state and by the dataset version. The dashboard's view graph reads
+a stored view when there is one and computes the view live otherwise.
+A view depends only on its slice of the state, so a stored product-only
+view also serves states that add, say, a price range.
+
+The parent exports the shared Arrow tables (see shared_data.py) and
+persists the fact cube before starting the pool, so every worker
+memory-maps the same tables and loads the same cube instead of rebuilding
+them, and each worker then handles a contiguous share of the states with
+no further coordination.
+
+Usage:
+    python precompute.py [--workers N] [--top-wear N]
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import pickle
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import analytics
+import data_store
+import filters
+
+PRECOMPUTE_DIR = 'precomputed'
+
+# Usage categories enumerated by default, most common first
+TOP_WEAR = 5
+
+# Bump when the payload views' contents change, to discard stored payloads
+PAYLOAD_FORMAT = 6
+
+_worker_dataset = None
+
+
+def state_hash(state):
+    """Stable hash of an (already canonical) filter state"""
+    return hashlib.sha1(repr(filters.state_key(state)).encode()).hexdigest()
+
+
+def version_path(version, data_dir='.'):
+    version_key = hashlib.sha1(f"{version}:{PAYLOAD_FORMAT}".encode()).hexdigest()[:16]
+    return os.path.join(data_store.store_path(data_dir), PRECOMPUTE_DIR, version_key)
+
+
+def payload_path(version, key, data_dir='.'):
+    return os.path.join(version_path(version, data_dir), f"{key}.pkl")
+
+
+def common_states(dataset, top_wear=TOP_WEAR):
+    """Canonical filter states for every gender x category x usage combination.
+
+    Each dimension is either unfiltered or a single value; only the
+    ``top_wear`` most common usage categories are enumerated.
+    """
+    genders = [None] + dataset.column_values('gender')
+    categories = [None] + dataset.column_values('category')
+    wear_counts = analytics.distribution(dataset, 'best_for_wear', {})
+    wears = [None] + wear_counts.index[:top_wear].tolist()
+    states = []
+    for gender, category, wear in itertools.product(genders, categories, wears):
+        state = {'gender': gender, 'category': category, 'best_for_wear': wear}
+        states.append({k: [v] for k, v in state.items() if v is not None})
+    return [analytics.canonical_state(dataset, state) for state in states]
+
+
+def save_payload(payload, version, key, data_dir='.'):
+    path = payload_path(version, key, data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_payload(dataset, state):
+    """Stored views for a filter state by view name, or None if it was not precomputed"""
+    if dataset.version is None:
+        return None
+    key = state_hash(analytics.canonical_state(dataset, state))
+    try:
+        with open(payload_path(dataset.version, key, dataset.data_dir), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def load_view(dataset, name, state):
+    """One stored view for a filter state, or None; the ``stored`` hook of a ViewGraph"""
+    payload = load_payload(dataset, state)
+    return None if payload is None else payload.get(name)
+
+
+def _init_worker(data_dir, version):
+    global _worker_dataset
+    _worker_dataset = analytics.Dataset.load(analytics.DASHBOARD_COLUMNS, data_dir=data_dir, version=version)
+
+
+def _compute(state):
+    dataset = _worker_dataset
+    key = state_hash(state)
+    save_payload(analytics.dashboard_views(dataset, state), dataset.version, key, dataset.data_dir)
+    return key
+
+
+def prune(version, data_dir='.'):
+    """Remove payloads stored for other dataset versions"""
+    root = os.path.dirname(version_path(version, data_dir))
+    keep = os.path.basename(version_path(version, data_dir))
+    if not os.path.isdir(root):
+        return
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.name != keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def precompute(data_dir='.', workers=None, top_wear=TOP_WEAR):
+    """Compute and store payloads for the common states; returns their keys"""
+    version = data_store.dataset_version(data_dir)
+    dataset = analytics.Dataset.load(analytics.DASHBOARD_COLUMNS, data_dir=data_dir, version=version)
+    missing = dataset.missing_tables()
+    if missing:
+        raise FileNotFoundError(f"Missing or empty data files: {', '.join(missing)}")
+    # Export the shared tables and persist the fact cube once, before the workers look for them
+    dataset.fact_cube
+    states = common_states(dataset, top_wear)
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(states) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(data_dir, version)) as executor:
+        keys = list(executor.map(_compute, states, chunksize=chunksize))
+    prune(version, data_dir)
+    return keys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute dashboard payloads for common filter states")
+    parser.add_argument('--data-dir', default='.', help="Directory holding the dataset CSVs")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per core)")
+    parser.add_argument('--top-wear', type=int, default=TOP_WEAR,
+                        help="Number of usage categories to enumerate")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        keys = precompute(args.data_dir, args.workers, args.top_wear)
+    except (OSError, ValueError) as e:
+        print(f"Precomputation failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Stored {len(keys)} payloads in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
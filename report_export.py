@@ -0,0 +1,411 @@
+"""Export the dashboard's tabs as static HTML and JSON reports.
+
+Many readers only look at a few fixed views of data_cleaner.py. This job
+renders the five tabs' metrics, tables and figures for a filter state
+once and writes them under ``<output>/<report name>/``:
+
+* ``index.html``: one self-contained page (plotly.js is inlined) with
+  interactive figures,
+* ``report.json``: the metrics, tables and chart data,
+* ``manifest.json``: the dataset version and request it was built from,
+  plus the FX table version when it converts prices.
+
+The views come from the dashboard's view graph, so states stored by
+precompute.py are read instead of computed. Figures are built in a
+process pool. An export whose manifest already matches the current
+dataset (and exchange rate) versions is skipped, so the job can run on a
+schedule and only rebuilds after the data changes. Serve the output directory with any
+static file server, e.g. ``python -m http.server --directory reports``;
+a reader then costs a file read instead of a Python rerun.
+
+Usage:
+    python report_export.py --output reports --gender M --category shoes
+    python report_export.py --output reports --common [--top-wear N] [--workers N]
+"""
+import argparse
+import html
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import adidas_cli
+import analytics
+import backends
+import chart_data
+import currency
+import data_store
+import lazy_views
+import precompute
+import startup
+
+# Plotly is only needed to render figures, mostly in the worker processes
+px = startup.LazyModule('plotly.express')
+plotly_offline = startup.LazyModule('plotly.offline')
+
+# Bump when the layout of the exported files changes, to rebuild every report
+EXPORT_FORMAT = 1
+
+MANIFEST_FILE = 'manifest.json'
+
+# Every column of the shoe table, for the Data Quality profile
+REPORT_COLUMNS = {
+    'shoes_dim': None,
+    'shoes_fact': ['id', 'price', 'category', 'availability', 'date', 'country_code'],
+    'country_dim': ['country_code', 'currency', 'shoe_metric'],
+}
+
+MAX_NAME_LENGTH = 80
+
+PAGE_STYLE = """
+body { font-family: sans-serif; max-width: 1200px; margin: 0 auto; padding: 1rem; }
+nav a { margin-right: 1rem; }
+.metrics { display: flex; flex-wrap: wrap; gap: 1rem; }
+.metric { border: 1px solid #ddd; border-radius: 4px; padding: 0.5rem 1rem; }
+.metric .value { font-size: 1.4rem; }
+table { border-collapse: collapse; margin: 0.5rem 0; }
+td, th { border: 1px solid #ddd; padding: 2px 6px; text-align: right; }
+"""
+
+
+def report_name(state):
+    """Directory name of a state's report, readable and safe on any file system"""
+    parts = []
+    for column, value in sorted(state.items()):
+        if column == analytics.FX_VERSION:
+            continue
+        if isinstance(value, tuple):
+            value = f"{value[0]:g}-{value[1]:g}"
+        elif isinstance(value, (list, set, frozenset)):
+            value = '+'.join(map(str, value))
+        parts.append(f"{column}={value}")
+    name = re.sub(r'[^0-9A-Za-z=+._-]+', '-', '_'.join(parts)) or 'all'
+    if len(name) > MAX_NAME_LENGTH:
+        name = f"{name[:MAX_NAME_LENGTH]}-{precompute.state_hash(state)[:8]}"
+    return name
+
+
+def figure(chart, *args, palette=None, traces=None, layout=None, **kwargs):
+    """A figure to build in a worker: a Plotly Express function name and its arguments"""
+    return {'chart': chart, 'args': args, 'kwargs': kwargs, 'palette': palette, 'traces': traces, 'layout': layout}
+
+
+def render_figure(spec):
+    """HTML fragment of one figure, without plotly.js"""
+    kwargs = dict(spec['kwargs'])
+    if spec['palette']:
+        kwargs['color_discrete_sequence'] = getattr(px.colors.qualitative, spec['palette'])
+    fig = getattr(px, spec['chart'])(*spec['args'], **kwargs)
+    if spec['traces']:
+        fig.update_traces(**spec['traces'])
+    if spec['layout']:
+        fig.update_layout(**spec['layout'])
+    return fig.to_html(full_html=False, include_plotlyjs=False)
+
+
+# Tabs: each returns its metrics, tables, figures and the data behind them
+
+def basic_statistics_tab(dataset, state, views):
+    view = views.get('basic_statistics', dataset, state)
+    summary = view['summary']
+    metrics = {
+        "Total Products": f"{summary['total_products']:,}",
+        "Total Countries": f"{summary['total_countries']:,}",
+    }
+    if 'avg_price' in summary:
+        metrics["Average Price"] = currency.format_price(summary['avg_price'], analytics.reporting_currency(state))
+    if 'available' in summary:
+        metrics["Available Products"] = f"{summary['available']:,}"
+    if 'distinct_products' in view:
+        metrics["Products in Stock"] = f"{'≈ ' if view['approximate'] else ''}{view['distinct_products']:,}"
+    figures, data = [], {'summary': summary}
+    for key, title in [('gender_distribution', "Gender Distribution"), ('category_distribution', "Category Distribution")]:
+        if key in view:
+            counts = view[key]
+            figures.append(figure('pie', values=counts.values, names=counts.index, title=title,
+                                  hole=0.4, palette='Set3', traces={'textinfo': 'percent+label'}))
+            data[key] = counts
+    if 'stocked_colors' in view:
+        colors = view['stocked_colors']
+        figures.append(figure('bar', x=colors.index, y=colors.values,
+                              title="Top Colors in Stock", labels={'x': 'Color', 'y': 'Fact Rows'}))
+        data['stocked_colors'] = colors
+    if 'daily_counts' in view:
+        series = view['daily_counts']
+        periods = chart_data.downsample(analytics.period_counts(series, series.auto_resolution()), 'date', 'count')
+        figures.append(figure('line', periods, x='date', y='count', title="Products Over Time",
+                              labels={'count': 'Number of Products', 'date': 'Date'}))
+        daily_stats = analytics.daily_statistics(series)
+        metrics["Average Daily Products"] = f"{daily_stats['average_daily']:.0f}"
+        metrics["Maximum Daily Products"] = f"{daily_stats['maximum_daily']:.0f}"
+        data['periods'] = periods
+    return {'title': "Basic Statistics", 'metrics': metrics, 'tables': {}, 'figures': figures, 'data': data}
+
+
+def data_quality_tab(dataset, state, views):
+    quality = views.get('data_quality', dataset, state)
+    near_duplicates = views.get('near_duplicates', dataset, state)
+    variant_summary = near_duplicates['summary']
+    metrics = {
+        "Data Completeness Score": f"{quality.completeness:.2f}%",
+        "Duplicate Records": f"{quality.duplicate_rows:,}",
+        "Models": f"{variant_summary['clusters']:,}",
+        "Colorways": f"{variant_summary['variants']:,}",
+        "Near-Duplicate Records": f"{variant_summary['duplicate_rows']:,}",
+    }
+    missing = quality.null_counts
+    figures = [figure('bar', x=missing.index, y=missing.values,
+                      title="Missing Values by Column")]
+    tables = {
+        "Missing Values Summary": quality.column_frame(),
+        "Largest Model Clusters": near_duplicates['clusters'],
+    }
+    return {'title': "Data Quality", 'metrics': metrics, 'tables': tables, 'figures': figures,
+            'data': {'near_duplicates': variant_summary}}
+
+
+def price_analysis_tab(dataset, state, views):
+    view = views.get('price_analysis', dataset, state)
+    figures, tables = [], {}
+    if 'price_histogram' in view:
+        histogram = view['price_histogram']
+        figures.append(figure('bar', histogram, x='bin_center', y='count',
+                              error_y='error' if 'error' in histogram.columns else None,
+                              title="Price Distribution", labels={'bin_center': 'price', 'count': 'count'},
+                              layout={'bargap': 0}))
+    if 'price_statistics' in view:
+        tables["Price Statistics"] = view['price_statistics'].round(2)
+    if 'average_price_by_category' in view:
+        averages = view['average_price_by_category']
+        figures.append(figure('bar', x=averages.index, y=averages.values,
+                              title="Average Price by Category"))
+    data = {k: v for k, v in view.items() if k in ['price_histogram', 'average_price_by_category', 'error_bounds']}
+    return {'title': "Price Analysis", 'metrics': {}, 'tables': tables, 'figures': figures, 'data': data}
+
+
+def geographic_analysis_tab(dataset, state, views):
+    view = views.get('geographic_analysis', dataset, state)
+    countries = view['country_summary']
+    figures = [
+        figure('pie', values=countries[column].dropna(),
+               names=countries[column].dropna().index, title=f"{column} Distribution")
+        for column in ['Currency', 'Shoe Metric']
+    ]
+    data = {}
+    if 'price_by_gender_country' in view:
+        prices = view['price_by_gender_country']
+        unit = currency.SYMBOLS.get(analytics.reporting_currency(state), analytics.reporting_currency(state) or "listed")
+        figures.append(figure('bar', prices, barmode='group',
+                              title="Average Price by Gender per Country",
+                              labels={'value': f"Average Price ({unit})", 'country_code': 'Country',
+                                      'gender': 'Gender'}))
+        data['price_by_gender_country'] = prices
+    return {'title': "Geographic Analysis", 'metrics': {}, 'tables': {"Country Distribution": countries},
+            'figures': figures, 'data': data}
+
+
+def market_insights_tab(dataset, state, views):
+    view = views.get('market_insights', dataset, state)
+    figures = []
+    if 'gender_usage' in view:
+        figures.append(figure('bar', view['gender_usage'],
+                              title="Gender Mix by Usage Category", labels={'value': 'Count', 'gender': 'Gender'}))
+    if 'color_gender' in view:
+        figures.append(figure('bar', view['color_gender'].head(10),
+                              title="Top 10 Colors by Gender", labels={'value': 'Count', 'dominant_color': 'Color'}))
+    if 'color_cooccurrence' in view:
+        figures.append(figure('imshow', view['color_cooccurrence'], text_auto=True,
+                              color_continuous_scale='Blues', title="Shoes Sharing Both Colors (Top 15 Colors)",
+                              labels={'x': 'Color', 'y': 'Color', 'color': 'Shoes'}))
+    data = dict(view)
+    if 'release_date' in dataset.shoes_dim.columns and 'best_for_wear' in dataset.shoes_dim.columns:
+        timeline = views.get('release_timeline', dataset, state)
+        timeline = chart_data.downsample(timeline, 'release_date', 'count', group='best_for_wear')
+        figures.append(figure('line', timeline, x='release_date', y='count',
+                              color='best_for_wear', title="Product Categories Timeline"))
+        data['release_timeline'] = timeline
+    return {'title': "Market Insights", 'metrics': {}, 'tables': {}, 'figures': figures, 'data': data}
+
+
+TABS = [basic_statistics_tab, data_quality_tab, price_analysis_tab, geographic_analysis_tab, market_insights_tab]
+
+
+def render_page(title, subtitle, tabs, fragments):
+    """The report as one HTML page"""
+    anchors = [re.sub(r'\W+', '-', tab['title'].lower()) for tab in tabs]
+    parts = [
+        "<!DOCTYPE html>", "<html><head><meta charset=\"utf-8\">",
+        f"<title>{html.escape(title)}</title>",
+        f"<style>{PAGE_STYLE}</style>",
+        f"<script>{plotly_offline.get_plotlyjs()}</script>",
+        "</head><body>",
+        f"<h1>{html.escape(title)}</h1>", f"<p>{html.escape(subtitle)}</p>",
+        "<nav>" + ''.join(f"<a href=\"#{a}\">{html.escape(t['title'])}</a>" for a, t in zip(anchors, tabs)) + "</nav>",
+    ]
+    fragments = iter(fragments)
+    for anchor, tab in zip(anchors, tabs):
+        parts.append(f"<h2 id=\"{anchor}\">{html.escape(tab['title'])}</h2>")
+        if tab['metrics']:
+            parts.append("<div class=\"metrics\">" + ''.join(
+                f"<div class=\"metric\"><div>{html.escape(label)}</div>"
+                f"<div class=\"value\">{html.escape(value)}</div></div>"
+                for label, value in tab['metrics'].items()
+            ) + "</div>")
+        for table_title, table in tab['tables'].items():
+            parts.append(f"<h3>{html.escape(table_title)}</h3>")
+            parts.append(pd.DataFrame(table).to_html(border=0))
+        for _ in tab['figures']:
+            parts.append(next(fragments))
+    parts.append("</body></html>")
+    return '\n'.join(parts)
+
+
+def _write(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_for(version, request, data_dir='.'):
+    """What a report is built from; a reporting currency adds the FX table's version"""
+    manifest = {'format': EXPORT_FORMAT, 'version': version, 'request': analytics.to_jsonable(request)}
+    if request.get(analytics.REPORTING_CURRENCY):
+        fx = currency.load_rates(data_dir)
+        manifest['fx_version'] = None if fx is None else fx.version
+    return manifest
+
+
+def is_current(path, manifest):
+    """Whether the report at ``path`` was built from the same versions and request"""
+    stored = read_manifest(path)
+    return stored is not None and all(stored.get(k) == v for k, v in manifest.items())
+
+
+def export_report(dataset, state, path, views, executor, manifest):
+    """Write one state's report into ``path``; figures are built by ``executor``"""
+    tabs = [build(dataset, state, views) for build in TABS]
+    fragments = executor.map(render_figure, [spec for tab in tabs for spec in tab['figures']])
+    subtitle = f"Filters: {json.dumps(analytics.to_jsonable(state)) if state else 'none'} · data version {dataset.version}"
+    page = render_page("Adidas Data Analysis Report", subtitle, tabs, list(fragments))
+    report = {
+        tab['title']: {
+            'metrics': tab['metrics'],
+            'tables': tab['tables'],
+            'charts': tab['data'],
+        }
+        for tab in tabs
+    }
+    os.makedirs(path, exist_ok=True)
+    _write(os.path.join(path, 'index.html'), page)
+    _write(os.path.join(path, 'report.json'),
+           json.dumps(analytics.to_jsonable({'state': state, 'version': dataset.version, 'tabs': report}),
+                      indent=2, default=str))
+    # Written last: a report is only current once all of its files are
+    _write(os.path.join(path, MANIFEST_FILE), json.dumps({**manifest, 'exported_at': time.time()}))
+
+
+def write_index(output_dir):
+    """Top-level page listing the exported reports"""
+    names = sorted(
+        entry.name for entry in os.scandir(output_dir)
+        if entry.is_dir() and read_manifest(entry.path) is not None
+    )
+    links = ''.join(f"<li><a href=\"{html.escape(name)}/index.html\">{html.escape(name)}</a></li>" for name in names)
+    _write(os.path.join(output_dir, 'index.html'),
+           f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Reports</title></head>"
+           f"<body><h1>Reports</h1><ul>{links}</ul></body></html>")
+
+
+def export(output_dir, requests, data_dir='.', workers=None, force=False, common=False, top_wear=precompute.TOP_WEAR,
+           backend=None):
+    """Export reports for filter requests (or the common states); returns (built, current) names.
+
+    A request is a dict of adidas_cli filter options, or a canonical
+    state in ``common`` mode. Reports already built from the current
+    dataset and FX versions are left alone unless ``force`` is set.
+    """
+    version = data_store.dataset_version(data_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    built, current = [], []
+    if not common and not force:
+        # Requests carry their own names, so current reports are found without loading anything
+        pending = []
+        for name, request in requests:
+            path = os.path.join(output_dir, name) if name else None
+            if path is not None and is_current(path, manifest_for(version, request, data_dir)):
+                current.append(name)
+            else:
+                pending.append((name, request))
+        requests = pending
+        if not requests:
+            return built, current
+
+    backend = backend or backends.default_backend(data_dir)
+    dataset = analytics.Dataset.load(REPORT_COLUMNS, data_dir=data_dir, version=version, backend=backend)
+    missing = dataset.missing_tables()
+    if missing:
+        raise FileNotFoundError(f"Missing or empty data files: {', '.join(missing)}")
+    if common:
+        requests = [(None, state) for state in precompute.common_states(dataset, top_wear)]
+
+    views = lazy_views.ViewGraph(analytics.DASHBOARD_VIEWS, stored=precompute.load_view)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        for name, request in requests:
+            state = request if common else adidas_cli.filter_state(argparse.Namespace(**request), dataset)
+            name = name or report_name(state)
+            path = os.path.join(output_dir, name)
+            manifest = manifest_for(version, request, data_dir)
+            if not force and is_current(path, manifest):
+                current.append(name)
+                continue
+            export_report(dataset, state, path, views, executor, manifest)
+            built.append(name)
+    write_index(output_dir)
+    return built, current
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the dashboard tabs as static HTML and JSON reports")
+    parser.add_argument('--output', default='reports', help="Directory to write the reports to")
+    parser.add_argument('--name', help="Report directory name (default: derived from the filters)")
+    parser.add_argument('--common', action='store_true',
+                        help="Export every common state enumerated by precompute.py instead of one filter state")
+    parser.add_argument('--top-wear', type=int, default=precompute.TOP_WEAR,
+                        help="Number of usage categories to enumerate with --common")
+    parser.add_argument('--data-dir', default='.', help="Directory holding the dataset CSVs")
+    filter_options = adidas_cli.add_filter_arguments(parser)
+    parser.add_argument('--backend', choices=list(backends.BACKENDS), help="Fact table execution backend")
+    parser.add_argument('--workers', type=int, help="Figure worker processes (default: one per core)")
+    parser.add_argument('--force', action='store_true', help="Rebuild reports even if they are current")
+    args = parser.parse_args(argv)
+
+    request = {option: getattr(args, option) for option in filter_options}
+    # Without --name, the name follows from the canonical state and needs the data
+    name = args.name or (None if any(v is not None for v in request.values()) else 'all')
+    started = time.perf_counter()
+    try:
+        built, current = export(args.output, [(name, request)], args.data_dir, args.workers, args.force,
+                                args.common, args.top_wear, args.backend)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Exported {len(built)} reports ({len(current)} already current) to {args.output} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Bounded two-level cache for computed views.
+
+Results are keyed by (dataset version, view name, filter state). The
+memory tier is an LRU with a byte budget: each entry's size is estimated
+when it is stored, and the least recently used entries are evicted until
+the total fits. An optional disk tier keeps pickled results under the
+columnar store with the same policy, so they survive restarts and are
+shared between worker processes.
+
+The dataset version comes from ``data_store.dataset_version``, which
+tracks the source files' mtimes and sizes. When a request arrives for a
+new version, entries for older versions are dropped from memory. The disk
+tier is shared with other processes that may still serve an older
+version, so it keeps the ``MAX_DISK_VERSIONS`` most recently written
+versions and prunes older ones as new results are stored.
+
+Cached values are shared between sessions and must be treated as
+read-only.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import filters
+import instrumentation
+
+DISK_DIR = os.path.join(data_store.STORE_DIR, 'cache')
+MAX_MEMORY_BYTES = 256 << 20
+MAX_DISK_BYTES = 1 << 30
+
+# Version directories kept in the disk tier, most recently written first
+MAX_DISK_VERSIONS = 4
+
+
+def estimate_size(value):
+    """Approximate memory footprint of a cached value, in bytes"""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return sys.getsizeof(value)
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + estimate_size(vars(value))
+    return sys.getsizeof(value)
+
+
+def cache_key(version, view, state):
+    return (version, view, filters.state_key(state or {}))
+
+
+class ResultCache:
+    """LRU result cache with a memory byte budget and an optional disk tier"""
+
+    def __init__(self, max_bytes=MAX_MEMORY_BYTES, disk_dir=None, max_disk_bytes=MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    # Memory tier
+
+    def _store(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    # Disk tier
+
+    def _version_dir(self, version):
+        return os.path.join(self.disk_dir, hashlib.sha1(str(version).encode()).hexdigest()[:16])
+
+    def _disk_path(self, key):
+        name = hashlib.sha1(repr(key[1:]).encode()).hexdigest()
+        return os.path.join(self._version_dir(key[0]), f"{name}.pkl")
+
+    def _disk_load(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _disk_store(self, key, value):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            return
+        self._disk_prune_versions()
+        self._disk_evict()
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith('.pkl'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _disk_prune_versions(self):
+        """Remove the version directories beyond the most recently written few"""
+        keep = os.path.basename(self._version_dir(self._version))
+        try:
+            directories = [entry for entry in os.scandir(self.disk_dir) if entry.is_dir()]
+            directories.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        except OSError:
+            return
+        for entry in directories[MAX_DISK_VERSIONS:]:
+            if entry.name != keep:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _disk_evict(self):
+        """Drop the least recently used files until the disk tier fits its budget"""
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._count('disk_evictions')
+
+    # Invalidation
+
+    def _set_version(self, version):
+        """Forget in-memory results computed for any other dataset version"""
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            self._version = version
+            stale = [key for key in self._entries if key[0] != version]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # Public API
+
+    def get_or_compute(self, version, view, state, compute, persist=False):
+        """Cached result of ``compute()`` for this version, view and filter state.
+
+        ``persist`` also writes the result to the disk tier (when enabled),
+        for views that are expensive to recompute after a restart.
+        """
+        if version is None:
+            version = data_store.dataset_version()
+        self._set_version(version)
+        key = cache_key(version, view, state)
+
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[0]
+        if self.disk_dir is not None:
+            value = self._disk_load(key)
+            if value is not None:
+                self._count('disk_hits')
+                self._store(key, value)
+                return value
+
+        self._count('misses')
+        with instrumentation.span(f"compute {view}"):
+            value = compute()
+        self._store(key, value)
+        if persist and self.disk_dir is not None:
+            self._disk_store(key, value)
+        return value
+
+    def stats(self):
+        """Hit/miss/eviction counters and current usage"""
+        requests = self.hits + self.disk_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'disk_evictions': self.disk_evictions,
+        }
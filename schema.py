@@ -0,0 +1,139 @@
+"""Declared dtypes for the Adidas datasets.
+
+Low-cardinality text columns become pandas categoricals. Columns holding the
+same kind of value share one vocabulary, e.g. the three color columns or
+``country_code`` in the fact and country tables, so their codes compare
+directly. Numeric fact columns are downcast, dates are parsed once at load,
+and ``image_url`` is split into a categorical prefix plus a per-row suffix.
+"""
+import pandas as pd
+
+GENDERS = ['M', 'W', 'U', 'K']
+
+# Vocabulary name -> the (table, column) pairs that share it
+VOCABULARIES = {
+    'gender': [('shoes_dim', 'gender')],
+    'best_for_wear': [('shoes_dim', 'best_for_wear')],
+    'color': [
+        ('shoes_dim', 'dominant_color'),
+        ('shoes_dim', 'sub_color1'),
+        ('shoes_dim', 'sub_color2'),
+    ],
+    'category': [('shoes_fact', 'category')],
+    'country_code': [('shoes_fact', 'country_code'), ('country_dim', 'country_code')],
+    'currency': [('country_dim', 'currency')],
+    'shoe_metric': [('country_dim', 'shoe_metric')],
+}
+
+# Values that always come first in a vocabulary, whether present or not
+FIXED_VALUES = {
+    'gender': GENDERS,
+}
+
+# Target kind for pd.to_numeric(downcast=...)
+NUMERIC_COLUMNS = {
+    'shoes_fact': {'price': 'float', 'availability': 'integer'},
+}
+
+# Calendar dates, parsed from ISO strings at load
+DATE_COLUMNS = {
+    'shoes_fact': ['date'],
+}
+DATE_FORMAT = '%Y-%m-%d'
+
+IMAGE_URL_COLUMN = 'image_url'
+IMAGE_PREFIX_COLUMN = 'image_url_prefix'
+IMAGE_SUFFIX_COLUMN = 'image_url_suffix'
+
+
+def categorical_columns(table):
+    """Columns of a table that are stored as categoricals"""
+    return [column for pairs in VOCABULARIES.values() for t, column in pairs if t == table]
+
+
+def build_vocabularies(tables):
+    """Build one CategoricalDtype per vocabulary from the loaded tables"""
+    dtypes = {}
+    for name, pairs in VOCABULARIES.items():
+        observed = set()
+        for table, column in pairs:
+            df = tables.get(table)
+            if df is None or column not in df.columns:
+                continue
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                observed.update(values.cat.categories)
+            else:
+                observed.update(values.dropna().unique())
+        fixed = FIXED_VALUES.get(name, [])
+        extra = sorted(str(v) for v in observed if v not in fixed)
+        dtypes[name] = pd.CategoricalDtype(list(fixed) + extra)
+    return dtypes
+
+
+def split_image_urls(urls):
+    """Split URLs into a shared prefix and a per-image suffix.
+
+    The last two path segments (asset folder and file name) form the suffix;
+    everything before them repeats across the catalog. A URL with fewer
+    than two slashes gets an empty prefix and is kept whole as the suffix.
+    """
+    parts = urls.str.extract(r'^(.*/)([^/]*/[^/]*)$')
+    split = parts[1].notna()
+    prefix = parts[0].where(split, '').where(urls.notna()).astype('category')
+    suffix = parts[1].where(split, urls)
+    return prefix, suffix
+
+
+def image_urls(df):
+    """Rebuild full image URLs for the rows of a frame"""
+    if IMAGE_URL_COLUMN in df.columns:
+        return df[IMAGE_URL_COLUMN]
+    return df[IMAGE_PREFIX_COLUMN].astype(object).fillna('') + df[IMAGE_SUFFIX_COLUMN]
+
+
+def apply_table_schema(df, table, vocabularies):
+    """Cast one table's columns to their declared dtypes"""
+    df = df.copy(deep=False)
+    for name, pairs in VOCABULARIES.items():
+        for t, column in pairs:
+            if t == table and column in df.columns:
+                values = df[column]
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    df[column] = values.cat.set_categories(vocabularies[name].categories)
+                else:
+                    df[column] = values.astype(vocabularies[name])
+
+    for column, kind in NUMERIC_COLUMNS.get(table, {}).items():
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], downcast=kind)
+
+    for column in DATE_COLUMNS.get(table, []):
+        if column in df.columns:
+            values = df[column]
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                values = pd.to_datetime(values, format=DATE_FORMAT)
+            # Second resolution is the coarsest unit pandas supports
+            df[column] = values.astype('datetime64[s]')
+
+    if IMAGE_URL_COLUMN in df.columns:
+        position = df.columns.get_loc(IMAGE_URL_COLUMN)
+        prefix, suffix = split_image_urls(df.pop(IMAGE_URL_COLUMN))
+        df.insert(position, IMAGE_PREFIX_COLUMN, prefix)
+        df.insert(position + 1, IMAGE_SUFFIX_COLUMN, suffix)
+    return df
+
+
+def apply_schema(tables):
+    """Cast every loaded table, sharing vocabularies across tables"""
+    vocabularies = build_vocabularies(tables)
+    return {
+        table: None if df is None else apply_table_schema(df, table, vocabularies)
+        for table, df in tables.items()
+    }
+
+
+def value_counts(values):
+    """value_counts() restricted to values that actually occur"""
+    counts = values.value_counts()
+    return counts[counts > 0]
@@ -0,0 +1,160 @@
+"""Inverted index for searching the shoe catalog by name or id.
+
+Names are normalized (case, accents, German umlauts and ``ß``) and split
+into tokens. Each token is indexed under all of its suffixes, so a query
+term finds tokens that start with it and also tokens that contain it:
+"schuh" matches "Laufschuh" and "boost" matches "Ultraboost". A query's
+terms are combined with AND, and results are ranked by match quality.
+"""
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Suffixes shorter than this are not indexed; shorter terms only match token prefixes
+MIN_INFIX = 3
+
+# English query terms that also look for the German catalog wording
+SYNONYMS = {
+    'shoe': ['schuh'],
+    'shoes': ['schuh'],
+    'running': ['lauf'],
+    'boot': ['stiefel'],
+    'boots': ['stiefel'],
+    'sandal': ['sandale'],
+    'sandals': ['sandale'],
+}
+
+# Match quality per term, highest wins
+EXACT, PREFIX, INFIX = 3, 2, 1
+
+_GERMAN_FOLDS = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'})
+_TOKEN_SPLIT = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Lowercase, fold umlauts and strip the remaining accents"""
+    text = str(text).lower().translate(_GERMAN_FOLDS)
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_SPLIT.split(normalize(text)) if token]
+
+
+class SearchIndex:
+    """Token inverted index over one text column (plus optional ids)"""
+
+    def __init__(self, tokens, postings, suffixes, suffix_tokens, name_lengths):
+        self.tokens = tokens
+        self.postings = postings
+        self._suffixes = suffixes
+        self._suffix_tokens = suffix_tokens
+        self._name_lengths = name_lengths
+
+    @classmethod
+    def build(cls, names, ids=None):
+        names = pd.Series(names, dtype=object).reset_index(drop=True)
+        ids = pd.Series([None] * len(names) if ids is None else list(ids), dtype=object)
+        # Catalog rows repeat names and ids (one row per colorway), so each
+        # distinct pair is tokenized once and its rows are posted together
+        pairs = pd.MultiIndex.from_arrays([names, ids])
+        codes, uniques = pd.factorize(pairs)
+        order = np.argsort(codes, kind='stable').astype(np.int32)
+        pair_rows = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1) if len(order) else []
+
+        token_pairs = {}
+        pair_lengths = np.zeros(len(uniques), dtype=np.int32)
+        for pair, (name, shoe_id) in enumerate(uniques):
+            pair_tokens = tokenize(name) if isinstance(name, str) else []
+            pair_lengths[pair] = len(pair_tokens)
+            if isinstance(shoe_id, str):
+                pair_tokens.append(normalize(shoe_id))
+            for token in set(pair_tokens):
+                token_pairs.setdefault(token, []).append(pair)
+
+        tokens = sorted(token_pairs)
+        # One sorted array of row positions per token
+        postings = [np.sort(np.concatenate([pair_rows[pair] for pair in token_pairs[token]]))
+                    for token in tokens]
+        name_lengths = pair_lengths[codes] if len(codes) else np.zeros(0, dtype=np.int32)
+        entries = []
+        for token_id, token in enumerate(tokens):
+            entries.append((token, token_id))
+            for start in range(1, len(token) - MIN_INFIX + 1):
+                entries.append((token[start:], token_id))
+        entries.sort()
+        suffixes = [suffix for suffix, _ in entries]
+        suffix_tokens = np.asarray([token_id for _, token_id in entries], dtype=np.int32)
+        return cls(tokens, postings, suffixes, suffix_tokens, name_lengths)
+
+    def __len__(self):
+        return len(self._name_lengths)
+
+    def _term_matches(self, term):
+        """Token ids matching a term, with their match quality"""
+        matches = {}
+        for variant in [term] + SYNONYMS.get(term, []):
+            start = bisect.bisect_left(self._suffixes, variant)
+            end = bisect.bisect_left(self._suffixes, variant + '\uffff')
+            for token_id in self._suffix_tokens[start:end]:
+                token = self.tokens[token_id]
+                if token == variant:
+                    quality = EXACT
+                elif token.startswith(variant):
+                    quality = PREFIX
+                elif len(variant) >= MIN_INFIX:
+                    quality = INFIX
+                else:
+                    continue
+                matches[token_id] = max(quality, matches.get(token_id, 0))
+        return matches
+
+    def _term_rows(self, matches):
+        """Sorted row positions holding one of the matched tokens, with the best quality of each"""
+        if not matches:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int8)
+        postings = [self.postings[token_id] for token_id in matches]
+        rows = np.concatenate(postings)
+        quality = np.repeat(np.fromiter(matches.values(), dtype=np.int8, count=len(matches)),
+                            [len(posting) for posting in postings])
+        if len(postings) > 1:
+            # A row can hold several matching tokens; sort by row, best quality
+            # first, as one integer key and keep each row's first entry
+            keys = np.sort(rows.astype(np.int64) * 4 + (EXACT - quality))
+            first = np.ones(len(keys), dtype=bool)
+            first[1:] = keys[1:] >> 2 != keys[:-1] >> 2
+            keys = keys[first]
+            rows, quality = (keys >> 2).astype(np.int32), (EXACT - (keys & 3)).astype(np.int8)
+        return rows, quality
+
+    def search(self, query, limit=None):
+        """Row positions matching every term of the query, best first"""
+        terms = tokenize(query)
+        if not terms:
+            return np.arange(len(self), dtype=np.int32)[:limit]
+
+        # Intersect the terms' sorted posting lists, summing their qualities
+        rows, score = None, None
+        for term in terms:
+            term_rows, quality = self._term_rows(self._term_matches(term))
+            if rows is None:
+                rows, score = term_rows, quality.astype(np.int32)
+            elif len(term_rows):
+                at = np.minimum(np.searchsorted(term_rows, rows), len(term_rows) - 1)
+                found = term_rows[at] == rows
+                rows, score = rows[found], score[found] + quality[at[found]]
+            else:
+                rows, score = term_rows, score[:0]
+            if not len(rows):
+                break
+
+        # Best score, then shortest name, then position, packed into one sort key
+        keys = ((EXACT * len(terms) - score.astype(np.int64)) << 48
+                | self._name_lengths[rows].astype(np.int64) << 32 | rows)
+        if limit is not None and limit < len(keys):
+            keys = np.partition(keys, max(limit - 1, 0))[:limit]
+        return (np.sort(keys) & 0xFFFFFFFF).astype(np.int32)
@@ -0,0 +1,124 @@
+"""Host-wide memory-mapped copies of the typed tables.
+
+The tables, with ``schema.apply_schema`` already applied, are written once
+per dataset version as uncompressed Arrow IPC files under
+``.columnar/shared/``. Every session and worker process then memory-maps
+those files instead of decoding Parquet into private memory. Converting
+single-chunk IPC columns with ``to_pandas(split_blocks=True)`` yields
+views into the mapping: numeric and date columns, categorical codes and
+Arrow-backed strings all share the same pages. The OS page cache
+therefore holds one copy of the data per host, however many processes
+read it.
+
+The mapped frames are read-only; pandas copies on write as usual. The
+tables are exported and mapped in parallel threads.
+"""
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+import data_store
+import schema
+
+SHARED_DIR = 'shared'
+
+
+def _shared_root(data_dir='.'):
+    return os.path.join(data_store.store_path(data_dir), SHARED_DIR)
+
+
+def version_path(version, data_dir='.'):
+    return os.path.join(_shared_root(data_dir), hashlib.sha1(version.encode()).hexdigest()[:16])
+
+
+def _write_ipc(df, path):
+    # One chunk per column, so every column maps back as a single view
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _prune(version, data_dir='.'):
+    """Remove exports of other versions; open mappings stay valid on POSIX"""
+    keep = os.path.basename(version_path(version, data_dir))
+    for entry in os.scandir(_shared_root(data_dir)):
+        if entry.is_dir() and entry.name != keep and not entry.name.endswith('.tmp'):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def export_tables(version, data_dir='.'):
+    """Write the typed tables for ``version`` unless another process already did"""
+    target = version_path(version, data_dir)
+    if os.path.isdir(target):
+        return target
+    tables = data_store.load_tables(dict.fromkeys(data_store.TABLE_FILES), data_dir)
+    tmp_dir = f"{target}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+        writes = [
+            pool.submit(_write_ipc, df, os.path.join(tmp_dir, f"{name}.arrow"))
+            for name, df in tables.items()
+            if df is not None
+        ]
+        for write in writes:
+            write.result()
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        # Another process published the same version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _prune(version, data_dir)
+    return target
+
+
+def _projection(column_names, columns):
+    """Stored columns to read for a projection on the source columns"""
+    if columns is None:
+        return column_names
+    wanted = set(columns)
+    if schema.IMAGE_URL_COLUMN in wanted:
+        wanted.update((schema.IMAGE_PREFIX_COLUMN, schema.IMAGE_SUFFIX_COLUMN))
+    return [c for c in column_names if c in wanted]
+
+
+def map_table(name, columns=None, version=None, data_dir='.'):
+    """Zero-copy DataFrame over a table's shared IPC file, or None if it has none"""
+    if version is None:
+        version = data_store.dataset_version(data_dir)
+    path = os.path.join(export_tables(version, data_dir), f"{name}.arrow")
+    if not os.path.exists(path):
+        return None
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    table = table.select(_projection(table.column_names, columns))
+    return table.to_pandas(split_blocks=True)
+
+
+def load_tables(columns_by_table, version=None, data_dir='.'):
+    """Drop-in for ``data_store.load_tables`` that serves the shared mapped tables.
+
+    Falls back to a private load when pyarrow is missing or the export
+    cannot be written.
+    """
+    if pa is None:
+        return data_store.load_tables(columns_by_table, data_dir)
+    if version is None:
+        version = data_store.dataset_version(data_dir)
+    try:
+        # Export once up front, so the threads only map files
+        export_tables(version, data_dir)
+        with ThreadPoolExecutor(max_workers=max(1, len(columns_by_table))) as pool:
+            futures = {
+                name: pool.submit(map_table, name, columns, version, data_dir)
+                for name, columns in columns_by_table.items()
+            }
+            return {name: future.result() for name, future in futures.items()}
+    except (OSError, pa.ArrowException):
+        return data_store.load_tables(columns_by_table, data_dir)
@@ -0,0 +1,326 @@
+"""Fixed-size probabilistic sketches.
+
+The set and frequency sketches take arrays of ``uint64`` hashes (see
+``hash_values``); the quantile sketch and the sample take numeric values.
+All of them update vectorized per chunk and can be merged, so a table can
+be profiled chunk by chunk or partition by partition in bounded memory.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def hash_values(values):
+    """64-bit hashes of a Series' values, or of a frame's rows"""
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+    """Distinct-count estimator with ~1.04/sqrt(2**precision) relative error"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+        # Hashes added, duplicates included: no estimate can exceed it
+        self.n = 0
+
+    def update(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        self.n += len(hashes)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        rest = hashes << np.uint64(self.precision)
+        # Rank = position of the first set bit in the remaining bits
+        _, exponent = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, 64 - self.precision + 1, 65 - exponent).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.n += other.n
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            estimate = m * math.log(m / zeros)
+        return min(int(round(estimate)), self.n)
+
+
+class BloomFilter:
+    """Set-membership sketch with no false negatives"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_bits = bits
+        self.num_hashes = max(1, round(bits / capacity * math.log(2)))
+        self.words = np.zeros((bits + 63) // 64, dtype=np.uint64)
+
+    def _positions(self, hashes):
+        # Double hashing: position_i = h1 + i * h2 (mod m)
+        h1 = hashes & _MASK32
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def contains(self, hashes):
+        """Boolean array: True where a hash was (probably) added before"""
+        positions = self._positions(np.asarray(hashes, dtype=np.uint64))
+        words = self.words[(positions >> np.uint64(6)).astype(np.intp)]
+        bits = (words >> (positions & np.uint64(63))) & np.uint64(1)
+        return bits.all(axis=1)
+
+    def add(self, hashes):
+        positions = self._positions(np.asarray(hashes, dtype=np.uint64)).ravel()
+        masks = np.left_shift(np.uint64(1), positions & np.uint64(63))
+        np.bitwise_or.at(self.words, (positions >> np.uint64(6)).astype(np.intp), masks)
+
+    def merge(self, other):
+        np.bitwise_or(self.words, other.words, out=self.words)
+        return self
+
+
+class KllSketch:
+    """Mergeable quantile sketch (Karnin-Lang-Liberty).
+
+    Values are kept in levels of compactors: a full level is sorted and
+    every other value moves up with twice the weight. About ``3 * k``
+    values are retained however many were added.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels = [np.empty(0)]
+        # Exact moments for the mean and standard deviation; None once restricted
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        # Weight the rank error bound applies to; restricting a sketch keeps its parent's
+        self.span = 0
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Capacities shrink by 2/3 per level below the top one
+        return max(8, int(self.k * (2 / 3) ** (len(self.levels) - level - 1)))
+
+    def _compress(self):
+        # Lazy compaction: only when the sketch as a whole is over capacity
+        while sum(map(len, self.levels)) > sum(map(self._capacity, range(len(self.levels)))):
+            level = next(level for level, items in enumerate(self.levels) if len(items) > self._capacity(level))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd value stays behind so the rest pairs up
+            odd = len(items) % 2
+            promoted = items[odd + self._rng.integers(2)::2]
+            self.levels[level] = items[:odd]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.span += len(values)
+        if self.sum is not None:
+            self.sum += float(values.sum())
+            self.sum_sq += float(np.dot(values, values))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        self.levels.extend(np.empty(0) for _ in range(len(other.levels) - len(self.levels)))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.span += other.span
+        if self.sum is None or other.sum is None:
+            self.sum = self.sum_sq = None
+        else:
+            self.sum += other.sum
+            self.sum_sq += other.sum_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _derived(self, levels, low, high):
+        sketch = KllSketch(self.k, seed=self._rng.integers(1 << 32))
+        sketch.levels = levels
+        sketch.n = int(sum(len(items) << level for level, items in enumerate(levels)))
+        sketch.span = self.span
+        sketch.sum = sketch.sum_sq = None
+        if sketch.n:
+            sketch.min, sketch.max = max(self.min, low), min(self.max, high)
+        return sketch
+
+    def scaled(self, factor):
+        """Sketch of every value times a positive ``factor``"""
+        scaled = self._derived([items * factor for items in self.levels], -math.inf, math.inf)
+        scaled.min, scaled.max = self.min * factor, self.max * factor
+        if self.sum is not None:
+            scaled.sum, scaled.sum_sq = self.sum * factor, self.sum_sq * factor ** 2
+        return scaled
+
+    def restricted(self, low, high):
+        """Sketch of the values within ``[low, high]``"""
+        levels = [items[(items >= low) & (items <= high)] for items in self.levels]
+        sketch = self._derived(levels, low, high)
+        if sketch.n:
+            # The tracked extremes are exact when they fall in the range
+            retained = np.concatenate(levels)
+            sketch.min = self.min if low <= self.min else float(retained.min())
+            sketch.max = self.max if self.max <= high else float(retained.max())
+        return sketch
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(values), 2.0 ** level) for level, values in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantiles(self, fractions):
+        """Values at the given rank fractions; 0 and 1 give the exact min and max"""
+        fractions = np.asarray(fractions, dtype=np.float64)
+        if self.n == 0:
+            return np.full(len(fractions), np.nan)
+        items, weights = self._weighted()
+        cumulative = np.cumsum(weights)
+        positions = np.searchsorted(cumulative, fractions * cumulative[-1], side='left')
+        values = items[np.minimum(positions, len(items) - 1)]
+        return np.where(fractions <= 0, self.min, np.where(fractions >= 1, self.max, values))
+
+    def cdf(self, points):
+        """Estimated fraction of the values at or below each point"""
+        if self.n == 0:
+            return np.zeros(len(points))
+        items, weights = self._weighted()
+        cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+        return cumulative[np.searchsorted(items, points, side='right')] / cumulative[-1]
+
+    def mean(self):
+        """Exact unless the sketch was restricted to a range"""
+        if self.n == 0:
+            return math.nan
+        if self.sum is not None:
+            return self.sum / self.n
+        items, weights = self._weighted()
+        return float(np.average(items, weights=weights))
+
+    def std(self):
+        if self.n < 2:
+            return math.nan
+        if self.sum is not None:
+            return math.sqrt(max(0.0, self.sum_sq - self.sum ** 2 / self.n) / (self.n - 1))
+        items, weights = self._weighted()
+        variance = np.average((items - np.average(items, weights=weights)) ** 2, weights=weights)
+        return float(math.sqrt(variance * self.n / (self.n - 1)))
+
+    def rank_error(self, pmf=False):
+        """Normalized rank error at 99% confidence, 0 while nothing was compacted.
+
+        Uses the DataSketches bounds for KLL; ``pmf`` gives the bound for
+        the mass between two points (histogram bins).
+        """
+        if self.n == 0 or len(self.levels) == 1:
+            return 0.0
+        epsilon = 2.446 / self.k ** 0.9433 if pmf else 2.296 / self.k ** 0.9723
+        return min(1.0, epsilon * self.span / self.n)
+
+
+class CountMinSketch:
+    """Frequency estimator; overcounts by at most ``error()`` with probability 1 - exp(-depth)"""
+
+    def __init__(self, width=512, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, hashes):
+        # Row i uses h1 + i * h2, like the Bloom filter
+        h1 = hashes & _MASK32
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)
+        return ((h1[None, :] + rows[:, None] * h2[None, :]) % np.uint64(self.width)).astype(np.intp)
+
+    def update(self, hashes):
+        columns = self._columns(np.asarray(hashes, dtype=np.uint64))
+        for row in range(self.depth):
+            self.table[row] += np.bincount(columns[row], minlength=self.width)
+        self.total += columns.shape[1]
+
+    def estimate(self, hashes):
+        columns = self._columns(np.asarray(hashes, dtype=np.uint64))
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def error(self):
+        """Bound on the overcount of any estimate"""
+        return math.e / self.width * self.total
+
+
+class Reservoir:
+    """Uniform sample of at most ``size`` values, mergeable.
+
+    Every value gets a random priority and the ``size`` lowest are kept
+    (bottom-k sampling), so the union of two samples is a sample of the
+    union.
+    """
+
+    def __init__(self, size=512, seed=None):
+        self.size = size
+        self.n = 0
+        self.values = np.empty(0)
+        self.priorities = np.empty(0)
+        self._rng = np.random.default_rng(seed)
+
+    def _keep(self, values, priorities):
+        if len(values) > self.size:
+            kept = np.argpartition(priorities, self.size - 1)[:self.size]
+            values, priorities = values[kept], priorities[kept]
+        self.values, self.priorities = values, priorities
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self._keep(np.concatenate([self.values, values]),
+                   np.concatenate([self.priorities, self._rng.random(len(values))]))
+
+    def merge(self, other):
+        self.n += other.n
+        self._keep(np.concatenate([self.values, other.values]),
+                   np.concatenate([self.priorities, other.priorities]))
+        return self
+
+    def _derived(self, values, priorities, n):
+        sample = Reservoir(self.size, seed=self._rng.integers(1 << 32))
+        sample.values, sample.priorities, sample.n = values, priorities, n
+        return sample
+
+    def scaled(self, factor):
+        """Sample of every value times ``factor``"""
+        return self._derived(self.values * factor, self.priorities, self.n)
+
+    def restricted(self, low, high, n):
+        """Sample of the values within ``[low, high]``, out of about ``n`` such values"""
+        keep = (self.values >= low) & (self.values <= high)
+        return self._derived(self.values[keep], self.priorities[keep], n)
@@ -0,0 +1,169 @@
+"""Star-schema joins from the fact table to its two dimensions.
+
+``shoes_fact`` references ``shoes_dim`` through ``id`` and ``country_dim``
+through ``country_code``. The join engine resolves both references once:
+the distinct keys of each dimension get integer surrogate keys, fact
+values are looked up in a hash index (``pd.Index.get_indexer``), and the
+result is kept as one array per dimension holding the dimension row of
+every fact row (-1 when a fact has no match). A shoe id can repeat in
+``shoes_dim`` (one row per colorway); like the fact cube, a fact row joins
+to the id's first row.
+
+After that, no join ever runs again. A filter on a dimension is evaluated
+on the (small) dimension table, turned into a boolean per dimension row,
+and carried to the facts with one vectorized ``take`` through the row
+array; dimension columns are fetched for fact rows the same way.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+import filters
+
+
+def _surrogate_keys(keys):
+    """Distinct keys in first-seen order and the first row holding each"""
+    first = ~pd.Series(keys).duplicated().to_numpy()
+    return pd.Index(np.asarray(keys)[first]), np.flatnonzero(first)
+
+
+def _rows_for(fact_keys, dim_keys):
+    """Surrogate key and dimension row of every fact key, -1 where the dimension lacks the key"""
+    index, rows = _surrogate_keys(dim_keys)
+    # Hash each distinct fact key once, then broadcast through the factorized codes
+    codes, distinct = pd.factorize(fact_keys)
+    # Position -1 picks the appended sentinel, so missing and unmatched keys stay -1
+    surrogates = np.append(index.get_indexer(distinct), -1).astype(np.int32)[codes]
+    rows = np.append(rows, -1).astype(np.int32)
+    return index, surrogates, rows[surrogates]
+
+
+class StarJoin:
+    """Fact rows joined to shoes_dim and country_dim through integer keys.
+
+    Takes the ``FilterEngine`` of each table, so dimension and fact filters
+    reuse the engines' cached selections.
+    """
+
+    def __init__(self, fact_engine, dim_engine, country_engine, max_entries=64):
+        self.fact_engine = fact_engine
+        self.dim_engine = dim_engine
+        self.country_engine = country_engine
+        facts, shoes, countries = fact_engine.df, dim_engine.df, country_engine.df
+        self.product_ids, self.product_keys, self.product_rows = _rows_for(facts['id'], shoes['id'])
+        self.country_codes, self.country_keys, self.country_rows = _rows_for(
+            facts['country_code'], countries['country_code']
+        )
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.fact_engine.df)
+
+    def _split(self, state):
+        """Filters per table; a column in several tables is filtered on the facts"""
+        fact_columns, dim_columns = self.fact_engine.df.columns, self.dim_engine.columns
+        split = {'facts': {}, 'shoes': {}, 'countries': {}}
+        for column, value in state.items():
+            if column in fact_columns:
+                split['facts'][column] = value
+            elif column in dim_columns:
+                split['shoes'][column] = value
+            elif column in self.country_engine.df.columns:
+                split['countries'][column] = value
+        return split
+
+    @staticmethod
+    def _propagate(mask, rows, dimension_rows, dimension_size):
+        """Restrict a fact mask to facts whose dimension row is selected"""
+        selected = np.zeros(dimension_size + 1, dtype=bool)
+        selected[rows] = True
+        # Row -1 reads the trailing False, so unmatched facts drop out
+        return mask & selected[dimension_rows]
+
+    def fact_indices(self, **state):
+        """Positions of the fact rows matching filters on any of the three tables.
+
+        Returns None when nothing is filtered.
+        """
+        split = self._split(state)
+        key = tuple(filters.state_key(split[table]) for table in ('facts', 'shoes', 'countries'))
+        if not any(key):
+            return None
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        mask = np.ones(len(self), dtype=bool)
+        fact_positions = self.fact_engine.indices(**split['facts'])
+        if fact_positions is not None:
+            mask = np.zeros(len(self), dtype=bool)
+            mask[fact_positions] = True
+        dim_positions = self.dim_engine.indices(**split['shoes'])
+        if dim_positions is not None:
+            mask = self._propagate(mask, dim_positions, self.product_rows, len(self.dim_engine.df))
+        country_positions = self.country_engine.indices(**split['countries'])
+        if country_positions is not None:
+            mask = self._propagate(mask, country_positions, self.country_rows, len(self.country_engine.df))
+        positions = np.flatnonzero(mask)
+
+        with self._lock:
+            self._cache[key] = positions
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return positions
+
+    def column(self, name, positions=None):
+        """A column of any table, one value per (selected) fact row"""
+        facts = self.fact_engine.df
+        if name == 'price_bucket' and 'price' in facts.columns:
+            return aggregates.price_buckets(self.column('price', positions)).rename(name)
+        if name in facts.columns:
+            values = facts[name]
+            return values if positions is None else values.take(positions)
+        if name in self.dim_engine.df.columns:
+            values, rows = self.dim_engine.df[name], self.product_rows
+        elif name in self.country_engine.df.columns:
+            values, rows = self.country_engine.df[name], self.country_rows
+        else:
+            raise KeyError(name)
+        if positions is not None:
+            rows = rows[positions]
+        index = facts.index if positions is None else facts.index.take(positions)
+        # -1 rows become missing values instead of wrapping around
+        return pd.Series(values.array.take(rows, allow_fill=True), index=index, name=name)
+
+    def rows(self, columns, positions=None):
+        """Columns of any table for the fact rows at ``positions`` (None for all)"""
+        return pd.DataFrame({name: self.column(name, positions) for name in columns})
+
+    def select(self, columns=None, **state):
+        """Matching fact rows with columns from any of the three tables"""
+        positions = self.fact_indices(**state)
+        if columns is None:
+            facts = self.fact_engine.df
+            return facts if positions is None else facts.take(positions)
+        return self.rows(columns, positions)
+
+    def rollup(self, by=(), measures=aggregates.FACT_MEASURES, **state):
+        """Roll-up of the matching facts in the fact cube's layout, by columns of any table"""
+        return self.rollup_rows(by, self.fact_indices(**state), measures)
+
+    def rollup_rows(self, by, positions, measures=aggregates.FACT_MEASURES):
+        """Roll-up of the fact rows at ``positions`` (None for all)"""
+        measures = [m for m in measures if m in self.fact_engine.df.columns]
+        frame = self.rows(list(by) + measures, positions)
+        if 'price' in frame.columns:
+            # Sum in float64, like the fact cube
+            frame['price'] = frame['price'].astype('float64')
+        dimensions = list(by)
+        if not dimensions:
+            frame['all'] = 0
+            dimensions = ['all']
+        cube = aggregates.AggregateCube.build(frame, dimensions, measures)
+        return cube.rollup(list(by))
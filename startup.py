@@ -0,0 +1,57 @@
+"""Startup helpers for the Streamlit dashboards.
+
+A cold dashboard pays for importing its plotting libraries, loading the
+tables and fetching remote assets before anything is drawn. The helpers
+here let a page draw its header first and pay for the rest afterwards:
+
+* ``LazyModule`` stands in for a module and imports it on first attribute
+  access, so plotly is only imported when the first chart is built.
+* ``LOGO_PATH`` is the logo shipped with the repository, served by the
+  Streamlit server instead of fetched from a remote site on every load.
+* ``process_uptime`` gives the age of the process, so the first run of a
+  freshly started server can report its time to first paint.
+"""
+import importlib
+import os
+import threading
+
+import instrumentation
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+LOGO_PATH = os.path.join(ASSET_DIR, 'adidas_logo.svg')
+
+
+class LazyModule:
+    """A module imported on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                with instrumentation.span(f"import {self._name}"):
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attribute):
+        return getattr(self._module or self._load(), attribute)
+
+
+def process_uptime():
+    """Seconds since this process started, None where unknown"""
+    try:
+        with open('/proc/self/stat') as f:
+            # The process name may hold spaces; the fields after it are plain
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
@@ -0,0 +1,233 @@
+"""Generate schema-faithful synthetic datasets at any scale.
+
+The shoe catalog is bootstrapped from the real ``shoes_dim.csv``: each
+synthetic product copies every listing of one real product id. In the
+real file an id is one colorway, listed up to four times with localized
+names (e.g. a German and an English one) and the same colors and image
+asset, and only occasionally another usage category or gender. Copying
+whole ids keeps that structure, the rows per id and the value
+frequencies. Products get fresh ids in the real format and image URLs
+follow the real prefix/suffix layout. Beyond the real catalog's size,
+products repeat as later editions with a number appended to their names.
+
+Fact rows are store snapshots: a product (with a skewed popularity), a
+country from ``country_dim.csv``, a snapshot date, stock and a price
+derived from the product's list price with occasional markdowns. They
+are generated and written in chunks, so 100M rows need no more memory
+than one chunk. The same seed always produces the same files.
+
+Usage:
+    python synthetic_data.py bench_data --facts 1000000
+    python synthetic_data.py bench_data --facts 100000000 --shoes 50000 --seed 7
+"""
+import argparse
+import os
+import shutil
+import string
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv
+except ImportError:
+    pa = None
+
+import currency
+import schema
+
+SOURCE_DIM = 'shoes_dim.csv'
+SOURCE_COUNTRIES = 'country_dim.csv'
+
+DEFAULT_FACTS = 1_000_000
+CHUNK_ROWS = 1_000_000
+
+IMAGE_PREFIX = 'https://assets.adidas.com/images/w_600,f_auto,q_auto/'
+IMAGE_PREFIX_TAG = '_9366/'
+
+# Webstore categories and their share of products
+CATEGORIES = {
+    'Running': 0.30,
+    'Originals': 0.25,
+    'Football': 0.15,
+    'Tennis': 0.10,
+    'Outdoor': 0.08,
+    'Basketball': 0.06,
+    'Training': 0.04,
+    'Golf': 0.02,
+}
+
+# List prices are whole multiples of this, within LIST_PRICE_RANGE
+PRICE_STEP = 10
+LIST_PRICE_RANGE = (30, 300)
+MARKDOWNS = [0.2, 0.3, 0.4, 0.5]
+MARKDOWN_SHARE = 0.15
+
+MAX_AVAILABILITY = 30
+START_DATE = '2023-01-01'
+DAYS = 200
+
+# Zipf exponent of product popularity in the fact table
+POPULARITY_SKEW = 0.8
+
+
+def _product_ids(count, rng):
+    """``count`` distinct ids of two capital letters and four or more digits"""
+    digits = 4
+    while 26 * 26 * 10 ** digits < count:
+        digits += 1
+    codes = rng.choice(26 * 26 * 10 ** digits, size=count, replace=False)
+    letters = np.array(list(string.ascii_uppercase))
+    prefix, number = np.divmod(codes, 10 ** digits)
+    first, second = np.divmod(prefix, 26)
+    return (
+        pd.Series(letters[first]) + pd.Series(letters[second])
+        + pd.Series(number).astype(str).str.zfill(digits)
+    )
+
+
+def _image_hashes(count, rng):
+    words = rng.integers(0, np.iinfo(np.int64).max, size=(count, 2), dtype=np.int64)
+    return pd.Series([f"{a:016x}{b:016x}" for a, b in words])
+
+
+def generate_shoes_dim(rows, real, rng):
+    """Synthetic catalog of ``rows`` listings bootstrapped from the real catalog's products"""
+    codes, real_ids = pd.factorize(real['id'])
+    order = np.argsort(codes, kind='stable')
+    starts = np.searchsorted(codes[order], np.arange(len(real_ids) + 1))
+    sizes = np.diff(starts)
+
+    # Draw real products, all of their listings at once, until the rows are filled
+    picks = rng.integers(0, len(real_ids), size=max(1, round(rows / sizes.mean())))
+    while sizes[picks].sum() < rows:
+        picks = np.concatenate([picks, rng.integers(0, len(real_ids), size=max(1, len(picks) // 10))])
+    picks = picks[:np.searchsorted(np.cumsum(sizes[picks]), rows) + 1]
+    counts = sizes[picks]
+    product = np.repeat(np.arange(len(picks)), counts)
+    listing = np.arange(len(product)) - np.repeat(np.cumsum(counts) - counts, counts)
+    product, source = product[:rows], order[np.repeat(starts[picks], counts) + listing][:rows]
+    shoes = real.iloc[source].reset_index(drop=True)
+
+    # Products past the real catalog's count are later editions, numbered in their names
+    edition = product // len(real_ids)
+    shoes['name'] = shoes['name'].where(edition == 0, shoes['name'] + ' ' + (edition + 1).astype(str))
+    new_ids = _product_ids(len(picks), rng)[product].reset_index(drop=True)
+
+    # Real suffixes end in "<Name>_<Color>_<id>_<view>.jpg"; swap in the new id.
+    # Listings sharing a real image asset share a new one
+    old_ids = shoes['id']
+    suffixes = shoes['image_url'].str.rsplit('/', n=1).str[-1]
+    suffixes = pd.Series([s.replace(old, new) for s, old, new in zip(suffixes, old_ids, new_ids)])
+    assets = shoes['image_url'].str.rsplit('/', n=1).str[0]
+    asset_codes, asset_keys = pd.factorize(pd.MultiIndex.from_arrays([product, assets]))
+    hashes = _image_hashes(len(asset_keys), rng)[asset_codes].reset_index(drop=True)
+    shoes['image_url'] = IMAGE_PREFIX + hashes + IMAGE_PREFIX_TAG + suffixes
+    shoes['id'] = new_ids
+    return shoes[real.columns.tolist()]
+
+
+def product_profile(shoes_dim, rng):
+    """Per-product category, list price and popularity used to draw fact rows"""
+    ids = shoes_dim['id'].drop_duplicates().to_numpy()
+    names = list(CATEGORIES)
+    shares = np.array(list(CATEGORIES.values()))
+    low, high = LIST_PRICE_RANGE
+    list_prices = np.clip(np.round(rng.lognormal(np.log(110), 0.45, size=len(ids)) / PRICE_STEP) * PRICE_STEP, low, high)
+    popularity = 1 / np.arange(1, len(ids) + 1) ** POPULARITY_SKEW
+    return pd.DataFrame({
+        'id': ids,
+        'category': np.array(names)[rng.choice(len(names), size=len(ids), p=shares / shares.sum())],
+        'list_price': list_prices,
+        'weight': rng.permutation(popularity / popularity.sum()),
+    })
+
+
+def generate_fact_chunk(rows, products, country_codes, rng, start_date=START_DATE, days=DAYS):
+    """``rows`` fact rows drawn from a product profile"""
+    picks = rng.choice(len(products), size=rows, p=products['weight'].to_numpy())
+    prices = products['list_price'].to_numpy()[picks]
+    marked_down = rng.random(rows) < MARKDOWN_SHARE
+    discounts = np.where(marked_down, rng.choice(MARKDOWNS, size=rows), 0.0)
+    # Markdowns end in .95, like the store's sale prices
+    prices = np.where(marked_down, np.floor(prices * (1 - discounts)) - 0.05, prices)
+    dates = np.datetime64(start_date, 'D') + rng.integers(0, days, size=rows)
+    return pd.DataFrame({
+        'id': products['id'].to_numpy()[picks],
+        'price': prices.round(2),
+        'category': products['category'].to_numpy()[picks],
+        'availability': rng.integers(0, MAX_AVAILABILITY, size=rows),
+        'date': pd.Series(dates).dt.strftime(schema.DATE_FORMAT),
+        'country_code': country_codes[rng.integers(0, len(country_codes), size=rows)],
+    })
+
+
+def _write_csv(df, path, append):
+    if pa is not None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        options = pa.csv.WriteOptions(include_header=not append)
+        with open(path, 'ab' if append else 'wb') as f:
+            pa.csv.write_csv(table, f, write_options=options)
+    else:
+        df.to_csv(path, mode='a' if append else 'w', header=not append, index=False)
+
+
+def generate(output_dir, facts=DEFAULT_FACTS, shoes=None, seed=0, source_dir='.',
+             start_date=START_DATE, days=DAYS, chunk_rows=CHUNK_ROWS):
+    """Write shoes_dim.csv, shoes_fact.csv and country_dim.csv (plus the FX rates) to ``output_dir``.
+
+    ``shoes`` defaults to the size of the real catalog. Returns the row
+    count of each table.
+    """
+    rng = np.random.default_rng(seed)
+    real = pd.read_csv(os.path.join(source_dir, SOURCE_DIM))
+    countries = pd.read_csv(os.path.join(source_dir, SOURCE_COUNTRIES))
+    os.makedirs(output_dir, exist_ok=True)
+
+    shoes_dim = generate_shoes_dim(shoes or len(real), real, rng)
+    _write_csv(shoes_dim, os.path.join(output_dir, 'shoes_dim.csv'), append=False)
+    _write_csv(countries, os.path.join(output_dir, 'country_dim.csv'), append=False)
+    # The exchange rates travel with the data they convert
+    rates = os.path.join(source_dir, currency.FX_FILE)
+    if os.path.exists(rates):
+        shutil.copyfile(rates, os.path.join(output_dir, currency.FX_FILE))
+
+    products = product_profile(shoes_dim, rng)
+    country_codes = countries['country_code'].to_numpy()
+    fact_path = os.path.join(output_dir, 'shoes_fact.csv')
+    # An empty fact table still gets its header
+    for start in range(0, facts, chunk_rows) if facts else [0]:
+        chunk = generate_fact_chunk(min(chunk_rows, facts - start), products, country_codes, rng,
+                                    start_date, days)
+        _write_csv(chunk, fact_path, append=start > 0)
+    return {'shoes_dim': len(shoes_dim), 'shoes_fact': facts, 'country_dim': len(countries)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Adidas datasets")
+    parser.add_argument('output_dir', help="Directory to write the three CSVs to")
+    parser.add_argument('--facts', type=int, default=DEFAULT_FACTS, help="Fact rows to generate")
+    parser.add_argument('--shoes', type=int, help="Catalog rows (default: size of the real catalog)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--source-dir', default='.', help="Directory holding the real CSVs")
+    parser.add_argument('--start-date', default=START_DATE, help="First snapshot date")
+    parser.add_argument('--days', type=int, default=DAYS, help="Number of snapshot days")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        counts = generate(args.output_dir, args.facts, args.shoes, args.seed, args.source_dir,
+                          args.start_date, args.days)
+    except (OSError, ValueError) as e:
+        print(f"Generation failed: {e}", file=sys.stderr)
+        return 1
+    rows = ', '.join(f"{name} {count:,}" for name, count in counts.items())
+    print(f"Wrote {rows} rows to {args.output_dir} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
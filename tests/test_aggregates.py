@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+import aggregates
+
+
+def fact_tables(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    shoes_dim = pd.DataFrame({'id': np.arange(40), 'gender': rng.choice(['M', 'W', 'U', 'K'], 40)})
+    shoes_fact = pd.DataFrame({
+        'id': rng.integers(0, 40, rows),
+        'category': rng.choice(['Running', 'Originals', 'Football'], rows),
+        'country_code': rng.choice(['US', 'DE', 'UK'], rows),
+        'price': np.round(rng.uniform(20, 200, rows), 2).astype('float32'),
+        'availability': rng.integers(0, 50, rows),
+        'date': pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 30, rows), unit='D'),
+    })
+    return shoes_fact, shoes_dim
+
+
+def test_fact_cube_cells_stay_below_the_fact_rows():
+    shoes_fact, shoes_dim = fact_tables(200_000)
+    cube = aggregates.build_fact_cube(shoes_fact, shoes_dim)
+    assert len(cube) <= aggregates.MAX_CELL_SHARE * len(shoes_fact)
+    # Prices by the cent would not fit next to the dates; they are left to scans
+    assert cube.cube_for(['date']) is not None
+    assert cube.cube_for(['date', 'price']) is None
+
+
+def test_fact_cube_set_matches_a_full_cube():
+    shoes_fact, shoes_dim = fact_tables(20_000)
+    cube = aggregates.build_fact_cube(shoes_fact, shoes_dim, max_share=None)
+    facts = shoes_fact.assign(
+        gender=shoes_fact['id'].map(shoes_dim.set_index('id')['gender']),
+        price=shoes_fact['price'].astype('float64'),
+        price_bucket=aggregates.price_buckets(shoes_fact['price']),
+    )
+    full = aggregates.AggregateCube.build(facts, aggregates.FACT_DIMENSIONS, aggregates.FACT_MEASURES)
+    for by, filters in [
+        (['date'], {'gender': ['M']}),
+        (['price_bucket', 'country_code'], {'price': (50.0, 120.0), 'category': ['Running']}),
+        (['category'], {}),
+    ]:
+        pd.testing.assert_frame_equal(cube.rollup(by, **filters), full.rollup(by, **filters))
@@ -0,0 +1,35 @@
+import pandas as pd
+
+import analytics
+
+
+def write_tables(data_dir):
+    pd.DataFrame({
+        'id': ['A1', 'B2', 'C3', 'D4'],
+        'name': ['Shoe A', 'Shoe B', 'Shoe C', 'Shoe D'],
+        'gender': ['M', 'W', 'M', 'K'],
+        'best_for_wear': ['Running', 'Urban', 'Urban', 'Running'],
+        'dominant_color': ['Black', 'White', 'Black', 'Red'],
+        'category': ['shoes'] * 4,
+    }).to_csv(data_dir / 'shoes_dim.csv', index=False)
+    pd.DataFrame({
+        'id': ['A1', 'B2', 'C3', 'D4', 'A1', 'C3'],
+        'price': [100.0, 80.0, 60.0, 40.0, 110.0, 65.0],
+        'date': ['2023-01-01'] * 6,
+        'country_code': ['US', 'UK', 'US', 'DE', 'UK', 'US'],
+        'category': ['Running', 'Originals', 'Originals', 'Running', 'Running', 'Originals'],
+    }).to_csv(data_dir / 'shoes_fact.csv', index=False)
+    pd.DataFrame({'country_code': ['US', 'UK', 'DE'], 'country': ['USA', 'UK', 'Germany']}).to_csv(
+        data_dir / 'country_dim.csv', index=False)
+
+
+def test_scalar_filters_match_single_value_lists(tmp_path):
+    write_tables(tmp_path)
+    dataset = analytics.Dataset.load(data_dir=str(tmp_path))
+    for column, state in [('gender', {'gender': 'M'}), ('best_for_wear', {'best_for_wear': 'Urban'}),
+                          ('category', {'gender': 'M'})]:
+        scalar = analytics.distribution(dataset, column, state)
+        listed = analytics.distribution(dataset, column, {key: [value] for key, value in state.items()})
+        pd.testing.assert_series_equal(scalar, listed)
+    assert analytics.distribution(dataset, 'gender', {'gender': 'M'}).to_dict() == {'M': 2}
+    assert analytics.distribution(dataset, 'category', {'gender': 'M'}).to_dict() == {'Running': 2, 'Originals': 2}
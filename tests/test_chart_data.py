@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+import chart_data
+
+
+def timeline(groups, days=30):
+    dates = pd.date_range('2024-01-01', periods=days)
+    return pd.DataFrame({
+        'date': np.tile(dates, len(groups)),
+        'count': np.arange(len(groups) * days) % 7 + 1,
+        'wear': pd.Categorical(np.repeat(groups, days)),
+    })
+
+
+def test_downsample_sums_groups_beyond_the_budget_into_other():
+    df = timeline([f"g{number}" for number in range(10)])
+    thinned = chart_data.downsample(df, 'date', 'count', max_points=12, group='wear')
+    traces = thinned['wear'].unique().tolist()
+    assert len(traces) == 4 and chart_data.OTHER_GROUP in traces
+    assert len(thinned) <= 12
+    full = chart_data.downsample(df, 'date', 'count', max_points=10_000, group='wear')
+    assert full is df
+
+
+def test_downsample_other_trace_keeps_the_dropped_totals():
+    df = timeline(['a', 'b', 'c'], days=4)
+    thinned = chart_data.downsample(df, 'date', 'count', max_points=6, group='wear')
+    other = thinned[thinned['wear'] == chart_data.OTHER_GROUP]
+    assert thinned['wear'].nunique() == 2
+    dropped = df[df['wear'] != 'a'].groupby('date')['count'].sum()
+    assert other.set_index('date')['count'].isin(dropped).all()
@@ -0,0 +1,71 @@
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+import data_store
+
+pytest.importorskip('pyarrow')
+
+
+def write_tables(data_dir, facts=20):
+    pd.DataFrame({
+        'id': ['A1', 'B2'],
+        'name': ['Shoe A', 'Shoe B'],
+        'gender': ['M', 'W'],
+    }).to_csv(data_dir / 'shoes_dim.csv', index=False)
+    pd.DataFrame({
+        'id': ['A1', 'B2'] * (facts // 2),
+        'price': [100.0, 80.0] * (facts // 2),
+        'date': ['2023-01-01'] * facts,
+        'country_code': ['US', 'UK'] * (facts // 2),
+    }).to_csv(data_dir / 'shoes_fact.csv', index=False)
+
+
+def snapshot(rows, price):
+    return pd.DataFrame({
+        'id': ['A1'] * rows,
+        'price': [price] * rows,
+        'date': ['2024-01-01'] * rows,
+        'country_code': ['US'] * rows,
+    })
+
+
+def append(data_dir, rows, price):
+    data_store.append_rows('shoes_fact', data_store.coerce_rows('shoes_fact', snapshot(rows, price), data_dir),
+                           data_dir)
+
+
+def test_concurrent_appends_keep_every_delta(tmp_path):
+    write_tables(tmp_path)
+    data_dir = str(tmp_path)
+    data_store.ensure_converted('shoes_fact', data_dir)
+
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=append, args=(data_dir, rows, price)) for rows, price in [(3, 1.0), (5, 2.0)]]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0, 0]
+
+    deltas = data_store.load_manifest(data_dir)['shoes_fact']['deltas']
+    assert sorted(delta['rows'] for delta in deltas) == [3, 5]
+    assert len(data_store.read_table('shoes_fact', data_dir=data_dir)) == 28
+
+
+def test_changed_csv_keeps_deltas_not_in_it(tmp_path):
+    write_tables(tmp_path)
+    data_dir = str(tmp_path)
+    append(data_dir, 4, 1.0)
+
+    # Folding the snapshot into the CSV must not count it twice
+    facts = pd.read_csv(tmp_path / 'shoes_fact.csv')
+    pd.concat([facts, snapshot(4, 1.0)]).to_csv(tmp_path / 'shoes_fact.csv', index=False)
+    assert len(data_store.read_table('shoes_fact', data_dir=data_dir)) == 24
+    assert data_store.load_manifest(data_dir)['shoes_fact']['deltas'] == []
+
+    # An unrelated edit keeps the snapshot
+    append(data_dir, 2, 3.0)
+    pd.read_csv(tmp_path / 'shoes_fact.csv').iloc[1:].to_csv(tmp_path / 'shoes_fact.csv', index=False)
+    assert len(data_store.read_table('shoes_fact', data_dir=data_dir)) == 25
@@ -0,0 +1,27 @@
+import pandas as pd
+
+import schema
+
+
+def test_image_urls_round_trip():
+    urls = pd.Series([
+        'https://assets.adidas.com/images/w_600/abc_9366/Shoe_01.jpg',
+        'https://assets.adidas.com/images/w_600/def_9366/Shoe_02.jpg',
+        'x/y',
+        'noslash',
+        '',
+        None,
+    ])
+    prefix, suffix = schema.split_image_urls(urls)
+    frame = pd.DataFrame({schema.IMAGE_PREFIX_COLUMN: prefix, schema.IMAGE_SUFFIX_COLUMN: suffix})
+    rebuilt = schema.image_urls(frame)
+    assert rebuilt.iloc[:5].tolist() == urls.iloc[:5].tolist()
+    assert pd.isna(rebuilt.iloc[5])
+    assert len(prefix.cat.categories) == 2
+
+
+def test_image_urls_round_trip_without_full_urls():
+    urls = pd.Series(['a/b', 'c'])
+    prefix, suffix = schema.split_image_urls(urls)
+    frame = pd.DataFrame({schema.IMAGE_PREFIX_COLUMN: prefix, schema.IMAGE_SUFFIX_COLUMN: suffix})
+    assert schema.image_urls(frame).tolist() == ['a/b', 'c']
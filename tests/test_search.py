@@ -0,0 +1,23 @@
+import numpy as np
+
+import search
+
+
+def test_search_intersects_terms_and_ranks_best_first():
+    names = ['Ultraboost 22 Laufschuh', 'Samba OG', 'Ultraboost Light', None, 'Samba OG', 'Boost Sandale']
+    ids = ['HQ4201', 'B75806', 'HQ6351', 'X1', 'B75806', 'GZ1234']
+    index = search.SearchIndex.build(names, ids=ids)
+    assert index.search('samba og').tolist() == [1, 4]
+    assert index.search('boost').tolist() == [5, 2, 0]
+    assert index.search('running shoes').tolist() == [0]
+    assert index.search('ultraboost light', limit=1).tolist() == [2]
+    assert index.search('hq42').tolist() == [0]
+    assert index.search('zzz').tolist() == []
+    assert index.search('').tolist() == list(range(6))
+
+
+def test_search_postings_are_sorted_row_positions():
+    index = search.SearchIndex.build(['a b', 'b', 'a', 'b a'] * 3)
+    for posting in index.postings:
+        assert np.all(np.diff(posting) > 0)
+    assert len(search.SearchIndex.build([]).search('a')) == 0
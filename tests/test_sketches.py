@@ -0,0 +1,18 @@
+import pandas as pd
+
+import sketches
+
+
+def test_distinct_count_never_exceeds_the_rows_added():
+    for rows in range(1, 40):
+        hll = sketches.HyperLogLog(precision=4)
+        hll.update(sketches.hash_values(pd.Series(range(rows))))
+        assert hll.count() <= rows
+
+
+def test_distinct_count_bound_survives_merges():
+    left, right = sketches.HyperLogLog(precision=4), sketches.HyperLogLog(precision=4)
+    left.update(sketches.hash_values(pd.Series([1, 2])))
+    right.update(sketches.hash_values(pd.Series([3])))
+    assert left.merge(right).n == 3
+    assert left.count() <= 3
@@ -0,0 +1,105 @@
+"""Bounded on-disk cache of downsized catalog images.
+
+Product images are fetched once, shrunk to thumbnail size and stored as
+JPEG files named by the URL's hash. The cache evicts the least recently
+used files once it grows past its byte budget. Fetches run in a thread
+pool, so the next page of the catalog can be prefetched while the current
+one is on screen.
+"""
+import hashlib
+import io
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+import data_store
+
+CACHE_DIR = os.path.join(data_store.STORE_DIR, 'thumbnails')
+THUMBNAIL_SIZE = (200, 200)
+MAX_CACHE_BYTES = 256 << 20
+FETCH_TIMEOUT = 10
+MAX_WORKERS = 8
+
+
+class ThumbnailCache:
+    """Thumbnail files on disk with least-recently-used eviction"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES,
+                 size=THUMBNAIL_SIZE, max_workers=MAX_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thumbnail')
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(nbytes for _, nbytes, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest() + '.jpg')
+
+    def _download(self, url, path):
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+            data = response.read()
+        image = Image.open(io.BytesIO(data)).convert('RGB')
+        image.thumbnail(self.size)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, 'JPEG', quality=85)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def _evict(self):
+        """Drop the least recently used files until the cache fits its budget"""
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            self._total_bytes = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._total_bytes -= size
+
+    def get(self, url):
+        """Local thumbnail path for an image URL, or None if it can't be fetched"""
+        if Image is None or not isinstance(url, str):
+            return None
+        path = self.path(url)
+        if os.path.exists(path):
+            # Touch the file so eviction sees it as recently used
+            os.utime(path)
+            return path
+        try:
+            size = self._download(url, path)
+        except Exception:
+            return None
+        with self._lock:
+            self._total_bytes += size
+        self._evict()
+        # A budget smaller than one page can evict the file just written
+        return path if os.path.exists(path) else None
+
+    def get_many(self, urls):
+        """Thumbnail paths for several URLs, fetched in parallel"""
+        return list(self._executor.map(self.get, urls))
+
+    def prefetch(self, urls):
+        """Start fetching thumbnails in the background without waiting"""
+        return [self._executor.submit(self.get, url) for url in urls]
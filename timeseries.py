@@ -0,0 +1,124 @@
+"""Dense daily series for the "Products Over Time" charts.
+
+Counts live in a numpy array with one slot per calendar day, starting at
+``start`` (a ``datetime64[D]``). Moving averages and trailing-window totals
+come from one cumulative sum, and wide ranges can be down-sampled to
+weekly or monthly periods with ``np.add.reduceat``. None of these touch
+the raw fact rows.
+"""
+import numpy as np
+import pandas as pd
+
+# Trailing windows offered by the range selector, in days
+WINDOWS = {'1w': 7, '1m': 30, '3m': 91}
+
+# Spans (in days) up to which each resolution is used automatically
+AUTO_RESOLUTION = [(366, 'D'), (3 * 366, 'W')]
+
+
+def _as_days(dates):
+    return np.asarray(pd.to_datetime(dates), dtype='datetime64[D]')
+
+
+class DailySeries:
+    """Per-day counts on a contiguous calendar grid"""
+
+    def __init__(self, start, counts):
+        self.start = np.datetime64(start, 'D')
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self._cumsum = np.concatenate([[0], np.cumsum(self.counts)])
+
+    @classmethod
+    def from_dates(cls, dates):
+        """Count raw per-row dates into daily bins"""
+        days = _as_days(dates)
+        days = days[~np.isnat(days)]
+        if len(days) == 0:
+            return cls(np.datetime64('1970-01-01'), [])
+        start = days.min()
+        return cls(start, np.bincount((days - start).astype(np.int64)))
+
+    @classmethod
+    def from_counts(cls, dates, counts):
+        """Spread pre-aggregated (date, count) pairs onto the daily grid"""
+        days = _as_days(dates)
+        valid = ~np.isnat(days)
+        days, counts = days[valid], np.asarray(counts)[valid]
+        if len(days) == 0:
+            return cls(np.datetime64('1970-01-01'), [])
+        start = days.min()
+        offsets = (days - start).astype(np.int64)
+        return cls(start, np.bincount(offsets, weights=counts).astype(np.int64))
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def days(self):
+        return self.start + np.arange(len(self.counts))
+
+    @property
+    def active_days(self):
+        """Number of days with at least one product"""
+        return int(np.count_nonzero(self.counts))
+
+    def moving_average(self, window):
+        """Trailing calendar-day mean; the first ``window - 1`` days are NaN"""
+        averages = np.full(len(self.counts), np.nan)
+        if len(self.counts) >= window:
+            averages[window - 1:] = (self._cumsum[window:] - self._cumsum[:-window]) / window
+        return averages
+
+    def window_total(self, days):
+        """Total count over the trailing ``days`` days"""
+        days = min(days, len(self.counts))
+        return int(self._cumsum[-1] - self._cumsum[-1 - days])
+
+    def window_totals(self):
+        """Totals for each range-selector window"""
+        return {label: self.window_total(days) for label, days in WINDOWS.items()}
+
+    def slice(self, first=None, last=None):
+        """Sub-series between two dates, inclusive"""
+        lo = 0 if first is None else max(0, int((np.datetime64(first, 'D') - self.start).astype(int)))
+        hi = len(self.counts) if last is None else int((np.datetime64(last, 'D') - self.start).astype(int)) + 1
+        hi = min(max(hi, lo), len(self.counts))
+        return DailySeries(self.start + lo, self.counts[lo:hi])
+
+    def _period_starts(self, freq):
+        days = self.days.astype(np.int64)
+        if freq == 'W':
+            # 1970-01-01 was a Thursday; shift so weeks start on Monday
+            periods = (days + 3) // 7
+        elif freq == 'M':
+            periods = self.days.astype('datetime64[M]').astype(np.int64)
+        else:
+            return np.arange(len(days))
+        return np.flatnonzero(np.diff(periods, prepend=periods[0] - 1))
+
+    def resample(self, freq, values=None, how='sum'):
+        """Aggregate daily values into 'D', 'W' or 'M' periods.
+
+        Returns (period start dates, aggregated values). ``values`` defaults
+        to the counts; ``how='mean'`` averages over the days in each period,
+        ignoring NaN.
+        """
+        values = self.counts if values is None else np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self.days, values
+        starts = self._period_starts(freq)
+        if how == 'mean':
+            present = ~np.isnan(values)
+            totals = np.add.reduceat(np.where(present, values, 0), starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                aggregated = totals / np.add.reduceat(present.astype(np.int64), starts)
+        else:
+            aggregated = np.add.reduceat(values, starts)
+        return self.days[starts], aggregated
+
+    def auto_resolution(self):
+        """Daily for short ranges, weekly or monthly as the span grows"""
+        for max_days, freq in AUTO_RESOLUTION:
+            if len(self.counts) <= max_days:
+                return freq
+        return 'M'